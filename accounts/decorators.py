@@ -0,0 +1,27 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.shortcuts import resolve_url
+
+
+def async_login_required(view_func=None, login_url=None):
+    """
+    ``login_required`` for ``async def`` views.
+
+    The session user is loaded in a worker thread, so the view can read
+    ``request.user`` afterwards without touching the database on the event loop.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+            if not is_authenticated:
+                return redirect_to_login(request.get_full_path(), resolve_url(login_url or settings.LOGIN_URL))
+            return await view(request, *args, **kwargs)
+        return wrapper
+
+    if view_func is not None:
+        return decorator(view_func)
+    return decorator
@@ -1,3 +1,134 @@
+from decimal import Decimal
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+
+from accounts.models import CustomUser
+from stock.models import Product
+from stock.services import checkout
+from tenants.models import Client
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tenant = Client.objects.create(name="Test Shop")
+        self.manager = CustomUser.objects.create_user(
+            username='manager',
+            password='testpass',
+            role='manager',
+            company=self.tenant
+        )
+        self.product = Product.objects.create(
+            tenant=self.tenant,
+            name='Stout',
+            quantity=50,
+            price=Decimal('700.00')
+        )
+
+    def test_sales_summary_reads_rollup(self):
+        checkout(self.tenant, self.manager, [(self.product.pk, 3)])
+
+        self.client.login(username='manager', password='testpass')
+        response = self.client.get(reverse('accounts:dashboard'), {'period': 'daily'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_revenue'], Decimal('2100.00'))
+        self.assertEqual(response.context['total_quantity'], 3)
+        self.assertEqual(response.context['transactions_count'], 1)
+
+    def test_summary_is_cached_until_stock_changes(self):
+        self.client.login(username='manager', password='testpass')
+        url = reverse('accounts:dashboard')
+
+        self.client.get(url, {'period': 'daily'})
+        response = self.client.get(url, {'period': 'daily'})
+        self.assertEqual(response.context['total_quantity'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            checkout(self.tenant, self.manager, [(self.product.pk, 2)])
+
+        response = self.client.get(url, {'period': 'daily'})
+        self.assertEqual(response.context['total_quantity'], 2)
+
+    def test_inventory_status_is_annotated_and_paginated(self):
+        from stock.models import Category
+        drinks = Category.objects.create(tenant=self.tenant, name='Drinks')
+        for i in range(30):
+            Product.objects.create(
+                tenant=self.tenant,
+                name=f'Item {i:02d}',
+                category=drinks,
+                quantity=i,
+                price=Decimal('10.00'),
+                low_stock_threshold=5
+            )
+
+        self.client.login(username='manager', password='testpass')
+        response = self.client.get(reverse('accounts:dashboard'))
+
+        page = response.context['current_stock']
+        self.assertEqual(len(page.object_list), 25)
+        first = page.object_list[0]
+        self.assertEqual(first.name, 'Item 00')
+        self.assertEqual(first.stock_status, 'Out of Stock')
+        self.assertEqual(page.object_list[3].stock_status, 'Low Stock')
+        self.assertEqual(page.object_list[10].stock_status, 'In Stock')
+        self.assertEqual(page.object_list[10].inventory_value, Decimal('100.00'))
+        # 30 products at 10.00 * (0..29) plus Stout (50 * 700)
+        self.assertEqual(response.context['total_inventory_value'], Decimal('39350.00'))
+        self.assertContains(response, 'Drinks')
+
+
+class ChartDataTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tenant = Client.objects.create(name="Test Shop")
+        self.manager = CustomUser.objects.create_user(
+            username='manager',
+            password='testpass',
+            role='manager',
+            company=self.tenant
+        )
+        self.product = Product.objects.create(
+            tenant=self.tenant,
+            name='Stout',
+            quantity=50,
+            price=Decimal('700.00')
+        )
+        self.client.login(username='manager', password='testpass')
+        self.url = reverse('chart_data')
+
+    def test_returns_sales_for_requested_window(self):
+        checkout(self.tenant, self.manager, [(self.product.pk, 4)])
+
+        response = self.client.get(self.url, {'period': 'custom', 'range': '7'})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['top_products']['labels'], ['Stout'])
+        self.assertEqual(data['top_products']['sales'], [4])
+        self.assertEqual(data['sales_trend']['revenues'], [2800.0])
+        self.assertEqual(data['inventory_by_category']['labels'], ['Uncategorized'])
+
+    def test_unchanged_data_returns_304(self):
+        response = self.client.get(self.url, {'period': 'daily'})
+        etag = response['ETag']
+
+        response = self.client.get(self.url, {'period': 'daily'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            checkout(self.tenant, self.manager, [(self.product.pk, 1)])
+
+        response = self.client.get(self.url, {'period': 'daily'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
 
-# Create your tests here.
+    def test_etag_does_not_depend_on_cache_state(self):
+        etag = self.client.get(self.url, {'period': 'daily'})['ETag']
+        # A worker with a cold or different cache computes the same validator
+        cache.clear()
+        response = self.client.get(self.url, {'period': 'daily'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
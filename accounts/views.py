@@ -2,7 +2,6 @@ from django.shortcuts import redirect, render
 from django.contrib.auth import authenticate, login, logout # Import the logout function
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect
-from django.contrib.auth.decorators import login_required
 from django.db import transaction as db_transaction
 from django.contrib import messages
 from decimal import Decimal
@@ -10,6 +9,11 @@ from django.db.models import ExpressionWrapper, DecimalField, F, Sum, Count
 from django.db.models.functions import Coalesce
 from django.core.paginator import Paginator
 from django.utils import timezone
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from asgiref.sync import sync_to_async
+import hashlib
 import json
 
 from rest_framework.views import APIView
@@ -18,9 +22,11 @@ from rest_framework.response import Response
 from rest_framework.renderers import TemplateHTMLRenderer, JSONRenderer
 
 from stock.models import Category, Product, Transaction
+from stock.reports import dashboard_summary, inventory_status, resolve_period
 from stock.serializers import CategorySerializer, ProductSerializer, TransactionSerializer
 from stock.forms import CategoryForm, ProductForm, SalesTransactionForm, RestockTransactionForm
 from accounts.models import CustomUser
+from accounts.decorators import async_login_required
 from django.db.models.functions import TruncDate
 from datetime import datetime, timedelta, time
 
@@ -62,172 +68,50 @@ def custom_logout(request):
 
 @login_required(login_url='accounts:login')
 def dashboard(request):
-    # --- Date Filtering Logic (REFINED & FIXED) ---
-    period = request.GET.get('period', 'monthly')
-    now = timezone.now()
-    
-    # Use the server's current timezone for conversions
-    tz = timezone.get_current_timezone()
-
-    start_date_str = request.GET.get('start_date')
-    end_date_str = request.GET.get('end_date')
-
-    if period == 'custom' and start_date_str and end_date_str:
-        try:
-            # Parse the date strings into date objects
-            start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-            end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-
-            # Create timezone-aware datetime objects for the beginning of the start day
-            # and the beginning of the day AFTER the end day.
-            start_datetime = datetime.combine(start_date, time.min).replace(tzinfo=tz)
-            end_datetime = datetime.combine(end_date + timedelta(days=1), time.min).replace(tzinfo=tz)
-
-        except (ValueError, TypeError):
-            # If parsing fails, fall back to the default (monthly)
-            period = 'monthly'
-            start_datetime = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    
-    # If not custom, calculate the range
-    if period != 'custom':
-        if period == 'daily':
-            start_datetime = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            end_datetime = start_datetime + timedelta(days=1)
-        
-        elif period == 'quarterly':
-            current_quarter_start_month = 3 * ((now.month - 1) // 3) + 1
-            start_datetime = now.replace(month=current_quarter_start_month, day=1, hour=0, minute=0, second=0, microsecond=0)
-            
-            # Calculate end of quarter
-            if start_datetime.month <= 9:
-                end_datetime = start_datetime.replace(month=start_datetime.month + 3)
-            else:
-                end_datetime = start_datetime.replace(year=start_datetime.year + 1, month=1)
-
-        else: # Default to 'monthly'
-            start_datetime = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            # Calculate end of month
-            if start_datetime.month == 12:
-                end_datetime = start_datetime.replace(year=start_datetime.year + 1, month=1)
-            else:
-                end_datetime = start_datetime.replace(month=start_datetime.month + 1)
-
-    # Filter transactions using the calculated timezone-aware datetime range
-    transactions = Transaction.objects.filter(
-        tenant=request.user.company,
-        timestamp__gte=start_datetime,
-        timestamp__lt=end_datetime,
-        transaction_type='sale'
-    )
-
-    # --- Sales Performance Metrics ---
-    revenue_expr = ExpressionWrapper(
-        F('quantity') * F('product__price'),
-        output_field=DecimalField()
-    )
-    
-    sales_summary = transactions.aggregate(
-        total_revenue=Coalesce(Sum(revenue_expr), Decimal(0)),
-        total_quantity=Coalesce(Sum('quantity'), 0),
-        transactions_count=Count('id')
-    )
+    # --- Date Filtering Logic ---
+    period, start_datetime, end_datetime = resolve_period(request.GET)
 
-    # --- Current Inventory Status ---
-    products = Product.objects.filter(tenant=request.user.company).order_by('name')
-    current_stock_list = []
-    total_inventory_value = Decimal(0)
-
-    for product in products:
-        inventory_value = product.quantity * product.price
-        total_inventory_value += inventory_value
-        status_info = 'In Stock'
-        if product.quantity <= 0:
-            status_info = 'Out of Stock'
-        elif product.quantity <= product.low_stock_threshold:
-            status_info = 'Low Stock'
-
-        current_stock_list.append({
-            'name': product.name,
-            'quantity': product.quantity,
-            'category': product.category.name if product.category else '-',
-            'reorder_level': product.low_stock_threshold,
-            'stock_status': status_info,
-            'inventory_value': inventory_value,
-            'last_updated': product.last_updated,
-        })
-
-    # --- Chart Data Preparation ---
-    # 1. Sales Trend
-    sales_trend_data = (
-        transactions
-        .annotate(date=TruncDate('timestamp', tzinfo=tz))  # Use current timezone
-        .values('date')
-        .annotate(
-            total_sales=Coalesce(Sum('quantity'), 0),
-            total_revenue=Coalesce(Sum(revenue_expr), Decimal(0))
-        )
-        .order_by('date')
-    )
-
-    sales_trend = {
-        'dates': [item['date'].strftime('%b %d') for item in sales_trend_data],
-        'quantities': [item['total_sales'] for item in sales_trend_data],
-        'revenues': [float(item['total_revenue']) for item in sales_trend_data]
-    }
+    # Sales summary and chart data are cached per tenant and period
+    summary = dashboard_summary(request.user.company, start_datetime, end_datetime)
 
-    # 2. Inventory Value by Category
-    value_expr = ExpressionWrapper(
-        F('quantity') * F('price'),
-        output_field=DecimalField()
-    )
-    
-    category_value = (
-        Product.objects.filter(tenant=request.user.company)
-        .values('category__name')
-        .annotate(total_value=Coalesce(Sum(value_expr), Decimal(0)))
-        .order_by('-total_value')
-    )
-    
-    inventory_by_category = {
-        'labels': [item['category__name'] or 'Uncategorized' for item in category_value],
-        'values': [float(item['total_value']) for item in category_value]
-    }
+    # --- Current Inventory Status ---
+    paginator = Paginator(inventory_status(request.user.company), 25)
+    page_obj = paginator.get_page(request.GET.get('page'))
 
-    # 3. Top Selling Products - FIXED QUERY
-    top_products_data = (
-        transactions
-        .values('product__name', 'product__id')
-        .annotate(
-            total_sold=Coalesce(Sum('quantity'), 0),
-            total_revenue=Coalesce(Sum(revenue_expr), Decimal(0))
-        )
-        .order_by('-total_sold')[:5]
-    )
-
-    # Format top products data for chart
-    top_products = {
-        'labels': [item['product__name'] for item in top_products_data],
-        'sales': [item['total_sold'] for item in top_products_data],
-        'revenues': [float(item['total_revenue']) for item in top_products_data]
+    context = {
+        'period': period,
+        'current_stock': page_obj,
+        'page_obj': page_obj,
+        'total_inventory_value': summary['total_inventory_value'],
+        'total_revenue': summary['total_revenue'],
+        'total_quantity': summary['total_quantity'],
+        'transactions_count': summary['transactions_count'],
+        'chart_data': summary['chart_data'],
     }
+    return render(request, 'accounts/dashboard.html', context)
 
-    # Debug: Print top products to console
-    print("Top Products Data:", list(top_products_data))
-    print("Top Products Formatted:", top_products)
 
-    chart_data = {
-        'sales_trend': sales_trend,
-        'inventory_by_category': inventory_by_category,
-        'top_products': top_products  # Use the formatted dict instead of raw queryset
-    }
+@async_login_required(login_url='accounts:login')
+async def chart_data(request):
+    """
+    Dashboard chart data for the requested period as JSON.
 
-    context = {
-        'period': period,
-        'current_stock': current_stock_list,
-        'total_inventory_value': total_inventory_value,
-        'total_revenue': sales_summary['total_revenue'],
-        'total_quantity': sales_summary['total_quantity'],
-        'transactions_count': sales_summary['transactions_count'],
-        'chart_data': json.dumps(chart_data, default=str)  # Safe serialization
-    }
-    return render(request, 'accounts/dashboard.html', context)
\ No newline at end of file
+    The ETag is a hash of the chart data itself, so every worker hands out the
+    same validator for the same data; polling clients send If-None-Match and
+    get a 304 until the numbers change. The summary normally comes from the
+    shared cache. The view is async so a poll waiting on the database does not
+    hold a worker under ASGI.
+    """
+    period, start_datetime, end_datetime = resolve_period(request.GET)
+    summary = await sync_to_async(
+        lambda: dashboard_summary(request.user.company, start_datetime, end_datetime)
+    )()
+    etag = quote_etag(hashlib.sha256(summary['chart_data'].encode()).hexdigest()[:32])
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(summary['chart_data'], content_type='application/json')
+
+    response.headers.setdefault('ETag', etag)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,18 @@
+# Gunicorn settings shared by the Procfile, render.yaml and start.sh.
+#
+# SERVE_ASGI=true runs the ASGI application under uvicorn workers, so slow
+# clients and the async read views wait on the event loop instead of each
+# holding a sync worker. Otherwise the WSGI application runs on sync workers.
+import os
+
+SERVE_ASGI = os.environ.get("SERVE_ASGI", "False").lower() == "true"
+
+if SERVE_ASGI:
+    wsgi_app = "inventory_systems.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "inventory_systems.wsgi:application"
+
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+timeout = 120
+errorlog = "-"
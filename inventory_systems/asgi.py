@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'inventory_systems.settings')
 
 application = get_asgi_application()
+
+from inventory_systems.startup import log_database_settings  # noqa: E402
+
+log_database_settings()
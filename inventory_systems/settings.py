@@ -90,6 +90,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.humanize',
+    'django.contrib.postgres',
     'corsheaders',
     'pwa',
     'rest_framework',
@@ -147,14 +148,30 @@ WSGI_APPLICATION = 'inventory_systems.wsgi.application'
 
 import dj_database_url
 
+# Set by gunicorn.conf.py's SERVE_ASGI switch when running under uvicorn workers.
+SERVE_ASGI = env.bool("SERVE_ASGI", default=False)
+
+# Connections are kept open between requests (one per gunicorn worker) so a
+# request does not pay a fresh TCP+TLS handshake; health checks drop a
+# connection the server has closed before it is reused. DB_CONN_MAX_AGE=0
+# restores a connection per request. Under ASGI each request runs its ORM
+# calls on a fresh thread, so persistent connections would pile up and are
+# off by default there.
 DATABASES = {
     "default": dj_database_url.config(
         default=os.environ.get("DATABASE_URL"),
-        conn_max_age=0,
+        conn_max_age=env.int("DB_CONN_MAX_AGE", default=0 if SERVE_ASGI else 600),
         ssl_require=True,
     )
 }
-DATABASES["default"]["OPTIONS"] = {"sslmode": "require", "keepalives": 1, "keepalives_idle": 30}
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = env.bool("DB_CONN_HEALTH_CHECKS", default=True)
+if "postgresql" in DATABASES["default"].get("ENGINE", ""):
+    DATABASES["default"]["OPTIONS"] = {
+        "sslmode": "require",
+        "connect_timeout": env.int("DB_CONNECT_TIMEOUT", default=10),
+        "keepalives": 1,
+        "keepalives_idle": 30,
+    }
 
 
 RUNNING_LOCALLY = env.bool("RUNNING_LOCALLY", default=False)
@@ -283,16 +300,71 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    "DEFAULT_PAGINATION_CLASS": "stock.pagination.StockPageNumberPagination",
     "PAGE_SIZE": 20,
 }
 
+# Cache used for per-tenant read models (dashboard summaries) and
+# the tenant version keys that invalidate them. Every gunicorn worker must see
+# the same version keys, so the default is the database cache (create its table
+# with `manage.py createcachetable`); Redis works too. A per-process backend
+# such as LocMemCache is only allowed with a single worker.
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.db.DatabaseCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "django_cache"),
+    }
+}
+# Mirrors gunicorn.conf.py
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", 2))
+PER_PROCESS_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+if WEB_CONCURRENCY > 1 and CACHES["default"]["BACKEND"] in PER_PROCESS_CACHE_BACKENDS:
+    from django.core.exceptions import ImproperlyConfigured
+
+    raise ImproperlyConfigured(
+        f"CACHE_BACKEND {CACHES['default']['BACKEND']} is per-process; with WEB_CONCURRENCY="
+        f"{WEB_CONCURRENCY} workers a write in one would not invalidate the others' cached data. "
+        "Use a shared backend (database or Redis) or run a single worker."
+    )
+DASHBOARD_CACHE_TIMEOUT = int(os.environ.get("DASHBOARD_CACHE_TIMEOUT", 300))
+
+
+# How long idempotency keys for sale/restock writes are kept before
+# `manage.py purge_idempotency_keys` removes them.
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.environ.get("IDEMPOTENCY_KEY_TTL_HOURS", 72))
+
 SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('JWT',),
 }
 
 CORS_ALLOW_ALL_ORIGINS = True
 
+# Audit events are queued and written by a background thread (see stock/audit.py):
+# JSON lines to stdout, to AUDIT_LOG_FILE (rotated at AUDIT_LOG_MAX_BYTES) when
+# set, and AuditEvent rows when AUDIT_DB_SINK is on. The file is off by default
+# outside DEBUG since hosted disks are ephemeral; stdout keeps every field.
+AUDIT_LOG_FILE = os.environ.get("AUDIT_LOG_FILE", os.path.join(BASE_DIR, 'audit.log') if DEBUG else "")
+AUDIT_LOG_MAX_BYTES = int(os.environ.get("AUDIT_LOG_MAX_BYTES", 10 * 1024 * 1024))
+AUDIT_LOG_BACKUP_COUNT = int(os.environ.get("AUDIT_LOG_BACKUP_COUNT", 5))
+AUDIT_DB_SINK = os.environ.get("AUDIT_DB_SINK", "False").lower() == "true"
+
+AUDIT_HANDLER = {
+    '()': 'stock.audit.AuditQueueHandler',
+    'filename': AUDIT_LOG_FILE or None,
+    'max_bytes': AUDIT_LOG_MAX_BYTES,
+    'backup_count': AUDIT_LOG_BACKUP_COUNT,
+    'console': True,
+    'database': AUDIT_DB_SINK,
+}
+AUDIT_LOGGER = {
+    'handlers': ['audit'],
+    'level': 'INFO',
+    'propagate': False,
+}
+
 # Logging configuration for audit logging
 LOGGING = {
     'version': 1,
@@ -301,17 +373,10 @@ LOGGING = {
         'console': {
             'class': 'logging.StreamHandler',
         },
-        'audit_file': {
-            'class': 'logging.FileHandler',
-            'filename': os.path.join(BASE_DIR, 'audit.log'),
-        },
+        'audit': AUDIT_HANDLER,
     },
     'loggers': {
-        'audit': {
-            'handlers': ['console', 'audit_file'],
-            'level': 'INFO',
-            'propagate': False,
-        },
+        'audit': AUDIT_LOGGER,
     },
 }
 
@@ -327,6 +392,10 @@ if not DEBUG:
                 'class': 'logging.StreamHandler',
                 'stream': sys.stdout,
             },
+            'audit': AUDIT_HANDLER,
+        },
+        'loggers': {
+            'audit': AUDIT_LOGGER,
         },
         'root': {
             'handlers': ['console'],
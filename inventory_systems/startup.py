@@ -1,5 +1,12 @@
+import logging
+
+from django.conf import settings
+from django.db import connections
+
 from tenants.models import Client
 
+logger = logging.getLogger(__name__)
+
 def ensure_afam_tenant():
     try:
         if not Client.objects.filter(name="Afam Drinks").exists():
@@ -8,4 +15,22 @@ def ensure_afam_tenant():
         else:
             print("✅ Tenant 'Afam Drinks' already exists.")
     except Exception as e:
-        print(f"⚠️ Tenant check failed: {e}")
\ No newline at end of file
+        print(f"⚠️ Tenant check failed: {e}")
+
+
+def log_database_settings():
+    """Log the effective connection settings once per worker process."""
+    for alias in connections:
+        db = settings.DATABASES[alias]
+        options = db.get("OPTIONS", {})
+        logger.info(
+            "Database %r: engine=%s host=%s conn_max_age=%s health_checks=%s sslmode=%s",
+            alias,
+            db.get("ENGINE"),
+            db.get("HOST") or "local",
+            "persistent" if db.get("CONN_MAX_AGE") is None else f"{db.get('CONN_MAX_AGE')}s",
+            db.get("CONN_HEALTH_CHECKS", False),
+            options.get("sslmode", "-"),
+        )
+        if db.get("CONN_MAX_AGE") == 0:
+            logger.warning("Database %r opens a new connection for every request", alias)
@@ -19,15 +19,11 @@ from django.contrib import admin
 from django.urls import path, include
 from django.shortcuts import render
 from django.views.generic import TemplateView, RedirectView
-from django.http import JsonResponse
+from accounts.views import chart_data
 
 def homepage(request):
     return render(request, "stock/homepage.html")
 
-def chart_data(request):
-    data = {"labels": ["Jan", "Feb", "Mar"], "values": [10, 20, 15]}
-    return JsonResponse(data)
-
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("", homepage, name="home"),
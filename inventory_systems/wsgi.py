@@ -13,3 +13,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'inventory_systems.settings')
 
 application = get_wsgi_application()
+
+from inventory_systems.startup import log_database_settings  # noqa: E402
+
+log_database_settings()
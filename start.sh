@@ -4,7 +4,8 @@
 
 echo "--- Running database migrations and tenant setup ---"
 python manage.py setup_tenants
+python manage.py createcachetable
 
 echo "--- Starting Gunicorn web server ---"
-gunicorn inventory_systems.wsgi --log-file -
+gunicorn
 
@@ -25,6 +25,12 @@ function getCSRFToken() {
     return document.querySelector('[name=csrfmiddlewaretoken]')?.value || '';
 }
 
+// Idempotency key sent with each queued operation so a replayed sync never applies it twice
+function newSyncKey() {
+    if (window.crypto?.randomUUID) return crypto.randomUUID();
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`;
+}
+
 async function updatePendingSalesBadge() {
     const count = await db.sales_to_sync.count();
     const badge = document.getElementById('pending-sales-badge');
@@ -86,6 +92,7 @@ async function saveOfflineSale(productId, quantity) {
 
         const csrftoken = getCSRFToken();
         await db.sales_to_sync.add({
+            key: newSyncKey(),
             type: "sale",
             product_id: productId,
             quantity,
@@ -113,6 +120,7 @@ async function saveOfflineReturn(productId, quantity) {
 
         const csrftoken = getCSRFToken();
         await db.sales_to_sync.add({
+            key: newSyncKey(),
             type: "return",
             product_id: productId,
             quantity,
@@ -141,6 +149,7 @@ async function saveOfflineRestock(productId, quantity) {
 
         const csrftoken = getCSRFToken();
         await db.restocks_to_sync.add({
+            key: newSyncKey(),
             product_id: productId,
             quantity,
             timestamp: new Date().toISOString(),
@@ -181,75 +190,91 @@ async function syncProducts() {
     await populateProductSelect();
 }
 
-async function syncSales() {
-    console.log('[SYNC] Sales/Returns...');
-    const pending = await db.sales_to_sync.toArray();
-    for (const tx of pending) {
-        try {
-            let url = tx.type === "return" ? "/api/stock/returns/" : "/api/transactions/";
-            const response = await fetch(url, {
-                method: "POST",
-                headers: {
-                    "Content-Type": "application/json",
-                    "X-CSRFToken": tx.csrf_token,
-                },
-                body: JSON.stringify({
-                    product: tx.product_id,
-                    quantity: tx.quantity,
-                    timestamp: tx.timestamp
-                }),
-            });
-            if (response.ok) {
-                await db.sales_to_sync.delete(tx.id);
-                console.log(`[SYNC] ${tx.type} ${tx.id} synced.`);
-            }
-        } catch (error) {
-            console.error('[SYNC] Sale error:', error);
-        }
-    }
-    updatePendingSalesBadge();
-    await cacheProductsForOfflineUsage();
-    await populateProductSelect();
-}
+// Sales, returns and restocks are sent to the server in batch requests of at
+// most SYNC_BATCH_SIZE operations (the server's SYNC_MAX_OPERATIONS)
+const SYNC_BATCH_SIZE = 500;
 
-async function syncRestocks() {
-    console.log('[SYNC] Restocks...');
-    const pending = await db.restocks_to_sync.toArray();
-    for (const tx of pending) {
-        try {
-            const response = await fetch("/api/stock/restock/", {
+async function syncStockQueue() {
+    console.log('[SYNC] Sales/Returns/Restocks...');
+    const sales = await db.sales_to_sync.toArray();
+    const restocks = await db.restocks_to_sync.toArray();
+    if (!sales.length && !restocks.length) return;
+
+    // Entries queued before keys were introduced get a stable key from their local id
+    const queued = [
+        ...sales.map(tx => ({ table: db.sales_to_sync, tx, type: tx.type === "return" ? "return" : "sale" })),
+        ...restocks.map(tx => ({ table: db.restocks_to_sync, tx, type: "restock" })),
+    ].map(entry => ({ ...entry, key: entry.tx.key || `legacy-${entry.type}-${entry.tx.id}-${entry.tx.timestamp}` }));
+
+    try {
+        // The server takes at most SYNC_BATCH_SIZE operations per request
+        for (let start = 0; start < queued.length; start += SYNC_BATCH_SIZE) {
+            const batch = queued.slice(start, start + SYNC_BATCH_SIZE);
+            const response = await fetch("/api/stock/api/sync/", {
                 method: "POST",
                 headers: {
                     "Content-Type": "application/json",
-                    "X-CSRFToken": tx.csrf_token,
+                    "X-CSRFToken": getCSRFToken() || batch[0].tx.csrf_token,
                 },
                 body: JSON.stringify({
-                    product: tx.product_id,
-                    quantity: tx.quantity,
-                    timestamp: tx.timestamp
+                    operations: batch.map(entry => ({
+                        key: entry.key,
+                        type: entry.type,
+                        product: parseInt(entry.tx.product_id),
+                        quantity: entry.tx.quantity,
+                        timestamp: entry.tx.timestamp
+                    })),
                 }),
             });
-            if (response.ok) {
-                await db.restocks_to_sync.delete(tx.id);
-                console.log(`[SYNC] Restock ${tx.id} synced.`);
+            if (!response.ok) break;
+
+            const { results } = await response.json();
+            for (const [index, result] of results.entries()) {
+                const entry = batch[index];
+                if (result.status === "applied" || result.status === "duplicate") {
+                    await entry.table.delete(entry.tx.id);
+                } else {
+                    console.warn(`[SYNC] ${entry.type} ${entry.tx.id} rejected:`, result.detail);
+                }
             }
-        } catch (error) {
-            console.error('[SYNC] Restock error:', error);
+            console.log(`[SYNC] ${results.length} queued operation(s) processed.`);
         }
+    } catch (error) {
+        console.error('[SYNC] Batch error:', error);
     }
+    updatePendingSalesBadge();
     updatePendingRestocksBadge();
     await cacheProductsForOfflineUsage();
     await populateProductSelect();
 }
 
 // --- Product Cache ---
+// Only products changed since the stored cursor are fetched; the first run takes a full snapshot
+const PRODUCTS_CURSOR_KEY = 'products_cache_cursor';
+
 async function cacheProductsForOfflineUsage() {
     try {
-        const response = await fetch('/api/stock/products/');
-        if (!response.ok) return;
-        const products = await response.json();
-        await db.products_cache.clear();
-        await db.products_cache.bulkAdd(products);
+        let cursor = localStorage.getItem(PRODUCTS_CURSOR_KEY);
+        if (!cursor) await db.products_cache.clear();
+
+        let hasMore = true;
+        while (hasMore) {
+            const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+            const response = await fetch(`/api/stock/apiproducts/changes/${query}`);
+            if (response.status === 400) {
+                // Unknown cursor: fall back to a full snapshot next time
+                localStorage.removeItem(PRODUCTS_CURSOR_KEY);
+                return;
+            }
+            if (!response.ok) return;
+            const changes = await response.json();
+
+            await db.products_cache.bulkPut(changes.products);
+            await db.products_cache.bulkDelete(changes.deleted);
+            cursor = changes.cursor;
+            localStorage.setItem(PRODUCTS_CURSOR_KEY, cursor);
+            hasMore = changes.has_more;
+        }
         console.log('[CACHE] Products updated.');
     } catch (error) {
         console.warn('[CACHE] Product caching failed:', error);
@@ -305,14 +330,12 @@ document.addEventListener('DOMContentLoaded', async () => {
 
     window.addEventListener('online', () => {
         syncProducts();
-        syncSales();
-        syncRestocks();
+        syncStockQueue();
     });
 
     if (navigator.onLine) {
         syncProducts();
-        syncSales();
-        syncRestocks();
+        syncStockQueue();
     }
 
     updatePendingProductsBadge();
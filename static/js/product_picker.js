@@ -0,0 +1,36 @@
+// static/js/product_picker.js
+// Turns a product <select> into a Select2 typeahead backed by the product search
+// endpoint, so pages no longer render every product of the tenant as an <option>.
+//
+// `filters` are extra query parameters (e.g. { in_stock: 1 }); `label` formats a
+// result; `dataAttributes` maps option attributes to result fields so page
+// scripts reading e.g. data-price from the selected option keep working.
+function attachProductPicker(select, { filters = {}, label = p => p.name, dataAttributes = {} } = {}) {
+    if (!select || !window.jQuery || !jQuery.fn.select2) return;
+
+    jQuery(select).select2({
+        width: '100%',
+        placeholder: select.dataset.placeholder || 'Search products by name or SKU...',
+        allowClear: true,
+        ajax: {
+            url: '/api/stock/api/products/search/',
+            delay: 250,
+            data: params => ({ q: params.term || '', ...filters }),
+            processResults: response => ({
+                results: response.results.map(product => ({ ...product, text: label(product) })),
+            }),
+        },
+    });
+
+    jQuery(select).on('select2:select select2:clear', event => {
+        const product = event.params && event.params.data;
+        if (product && product.id) {
+            const option = select.querySelector(`option[value="${product.id}"]`);
+            Object.entries(dataAttributes).forEach(([attribute, field]) => {
+                if (option && product[field] !== undefined) option.setAttribute(attribute, product[field]);
+            });
+        }
+        // Select2 only fires jQuery events; page scripts listen for the native one
+        select.dispatchEvent(new Event('change', { bubbles: true }));
+    });
+}
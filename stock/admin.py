@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Category, Product, Transaction, Sale, SaleItem
+from .models import Category, Delivery, Product, Transaction, Sale, SaleItem, DailyProductSales
+from .forms import TransactionAdminForm
+from .services import delete_sales, record_transaction, void_sales
+from tenants.models import Client
 
 class TenantAdminMixin:
     def get_queryset(self, request):
@@ -28,17 +31,48 @@ class ProductAdmin(TenantAdminMixin, admin.ModelAdmin):
 
 @admin.register(Sale)
 class SaleAdmin(TenantAdminMixin, admin.ModelAdmin):
-    list_display = ('id', 'timestamp', 'total_amount', 'payment_method', 'tenant')
+    list_display = ('id', 'timestamp', 'total_amount', 'payment_method', 'voided_at', 'tenant')
     search_fields = ('id',)
-    list_filter = ('payment_method',)
+    list_filter = ('payment_method', 'voided_at')
+    actions = ['void_selected']
+
+    @admin.action(description='Void selected sales')
+    def void_selected(self, request, queryset):
+        voided = 0
+        for tenant in Client.objects.filter(pk__in=queryset.values('tenant_id')):
+            voided += void_sales(tenant, queryset.filter(tenant=tenant).values('pk'), user=request.user)
+        self.message_user(request, f"Voided {voided} sale(s).")
+
+    def delete_queryset(self, request, queryset):
+        delete_sales(queryset)
 
 @admin.register(SaleItem)
 class SaleItemAdmin(admin.ModelAdmin):
     list_display = ('sale', 'product', 'quantity', 'subtotal')
     search_fields = ('sale__id', 'product__name')
 
+@admin.register(Delivery)
+class DeliveryAdmin(TenantAdminMixin, admin.ModelAdmin):
+    list_display = ('received_at', 'reference', 'supplier', 'created_by', 'tenant')
+    list_filter = ('received_at', 'tenant')
+    search_fields = ('reference', 'supplier')
+
 @admin.register(Transaction)
 class TransactionAdmin(TenantAdminMixin, admin.ModelAdmin):
-    list_display = ('transaction_type', 'product', 'quantity', 'amount', 'timestamp', 'tenant')
+    form = TransactionAdminForm
+    list_display = ('transaction_type', 'product', 'quantity', 'amount', 'timestamp', 'delivery', 'tenant')
     list_filter = ('transaction_type', 'timestamp', 'tenant')
-    search_fields = ('product__name', 'notes')
\ No newline at end of file
+    search_fields = ('product__name', 'notes')
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            return super().save_model(request, obj, form, change)
+        if not obj.tenant_id:
+            obj.tenant = request.user.company
+        record_transaction(obj)
+
+@admin.register(DailyProductSales)
+class DailyProductSalesAdmin(TenantAdminMixin, admin.ModelAdmin):
+    list_display = ('date', 'product', 'quantity', 'revenue', 'deposit', 'transactions_count', 'tenant')
+    list_filter = ('date', 'tenant')
+    search_fields = ('product__name',)
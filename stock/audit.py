@@ -0,0 +1,215 @@
+"""
+Structured audit events, written off the request path.
+
+``audit()`` logs an event through the ``audit`` logger with its fields
+attached. ``AuditQueueHandler`` (wired up in ``settings.LOGGING``) only puts
+the record on an in-memory queue; a background thread drains the queue in
+batches and hands each batch to the sinks: rotating JSON-lines files, JSON
+lines on the console, and optionally the ``AuditEvent`` table via one
+``bulk_create``.
+
+Callers pass ids rather than model instances so building an event never
+runs a query.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone as dt_timezone
+from logging.handlers import QueueHandler, RotatingFileHandler
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+audit_logger = logging.getLogger('audit')
+
+AUDIT_BATCH_SIZE = 200
+AUDIT_FLUSH_INTERVAL = 1.0
+
+
+def audit(event, message, **fields):
+    """
+    Record audit ``event`` (e.g. ``'sale'``) with a human-readable ``message``
+    and JSON-serializable ``fields`` such as ``tenant_id`` and ``user_id``.
+    """
+    audit_logger.info(message, extra={'audit_event': event, 'audit_fields': fields})
+
+
+class JSONLinesFormatter(logging.Formatter):
+    """One JSON object per record: time, event, message and the event's fields."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, tz=dt_timezone.utc).isoformat(),
+            'event': getattr(record, 'audit_event', None),
+            'message': record.getMessage(),
+            **getattr(record, 'audit_fields', {}),
+        }
+        return json.dumps(entry, cls=DjangoJSONEncoder)
+
+
+class FileSink:
+    """Rotating JSON-lines file."""
+
+    def __init__(self, filename, max_bytes, backup_count):
+        self.handler = RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True
+        )
+        self.handler.setFormatter(JSONLinesFormatter())
+
+    def write(self, records):
+        for record in records:
+            self.handler.handle(record)
+
+    def close(self):
+        self.handler.close()
+
+
+class ConsoleSink:
+    """JSON lines on stdout, for platforms that collect process output."""
+
+    def __init__(self):
+        self.formatter = JSONLinesFormatter()
+
+    def write(self, records):
+        sys.stdout.write(''.join(f"{self.formatter.format(record)}\n" for record in records))
+        sys.stdout.flush()
+
+    def close(self):
+        pass
+
+
+class DatabaseSink:
+    """``AuditEvent`` rows, one ``bulk_create`` per batch."""
+
+    def write(self, records):
+        from .models import AuditEvent
+
+        AuditEvent.objects.bulk_create([audit_event_row(record) for record in records])
+
+    def close(self):
+        from django.db import connection
+        connection.close()
+
+
+def audit_event_row(record):
+    """Build an unsaved ``AuditEvent`` from a queued audit record."""
+    from .models import AuditEvent
+
+    fields = dict(getattr(record, 'audit_fields', {}))
+    return AuditEvent(
+        created_at=datetime.fromtimestamp(record.created, tz=dt_timezone.utc),
+        event=getattr(record, 'audit_event', None) or '',
+        tenant_id=fields.pop('tenant_id', None),
+        user_id=fields.pop('user_id', None),
+        message=record.getMessage(),
+        data=json.loads(json.dumps(fields, cls=DjangoJSONEncoder)),
+    )
+
+
+class AuditWriter(threading.Thread):
+    """Drains the audit queue, passing up to ``batch_size`` records at a time to each sink."""
+
+    def __init__(self, records, sinks, batch_size, flush_interval):
+        super().__init__(name='audit-writer', daemon=True)
+        self.records = records
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not (self.stopping.is_set() and self.records.empty()):
+            try:
+                batch = [self.records.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.records.get_nowait())
+                except queue.Empty:
+                    break
+            self.write(batch)
+        for sink in self.sinks:
+            sink.close()
+
+    def write(self, batch):
+        if any(isinstance(sink, DatabaseSink) for sink in self.sinks):
+            # The writer is long-lived; drop its connection once CONN_MAX_AGE passes
+            from django.db import close_old_connections
+            close_old_connections()
+        for sink in self.sinks:
+            try:
+                sink.write(batch)
+            except Exception:
+                # A failing sink must not lose the batch for the others
+                logging.getLogger(__name__).exception(
+                    "Audit sink %s dropped %d event(s)", type(sink).__name__, len(batch)
+                )
+
+    def stop(self):
+        self.stopping.set()
+        self.join()
+
+
+class AuditQueueHandler(QueueHandler):
+    """
+    Queue audit records for the background ``AuditWriter``.
+
+    The writer thread is started on first use in each process, so gunicorn
+    workers forked from a preloaded master each get their own.
+    """
+
+    def __init__(self, filename=None, max_bytes=10 * 1024 * 1024, backup_count=5,
+                 console=False, database=False,
+                 batch_size=AUDIT_BATCH_SIZE, flush_interval=AUDIT_FLUSH_INTERVAL):
+        super().__init__(queue.SimpleQueue())
+        self.sink_options = {
+            'filename': filename, 'max_bytes': max_bytes, 'backup_count': backup_count,
+            'console': console, 'database': database,
+        }
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.writer = None
+        self.writer_pid = None
+        self.writer_lock = threading.Lock()
+
+    def build_sinks(self):
+        options = self.sink_options
+        sinks = []
+        if options['filename']:
+            sinks.append(FileSink(options['filename'], options['max_bytes'], options['backup_count']))
+        if options['console']:
+            sinks.append(ConsoleSink())
+        if options['database']:
+            sinks.append(DatabaseSink())
+        return sinks
+
+    def start_writer(self):
+        with self.writer_lock:
+            if self.writer_pid == os.getpid():
+                return
+            self.queue = queue.SimpleQueue()
+            self.writer = AuditWriter(self.queue, self.build_sinks(), self.batch_size, self.flush_interval)
+            self.writer.start()
+            self.writer_pid = os.getpid()
+            atexit.register(self.flush_and_stop)
+
+    def enqueue(self, record):
+        if self.writer_pid != os.getpid():
+            self.start_writer()
+        super().enqueue(record)
+
+    def flush_and_stop(self):
+        """Write everything still queued and stop the writer thread."""
+        with self.writer_lock:
+            if self.writer is not None and self.writer_pid == os.getpid():
+                self.writer.stop()
+            self.writer = None
+            self.writer_pid = None
+
+    def close(self):
+        self.flush_and_stop()
+        super().close()
@@ -0,0 +1,46 @@
+"""
+Per-tenant cache versioning for derived read models such as the dashboard.
+
+Cached entries embed the tenant's current version in their key. Writes bump
+the version instead of deleting keys, so every stale entry is skipped at once
+and simply ages out of the cache. The version is the time of the last change
+in nanoseconds, so it only ever moves forward.
+
+The version keys only invalidate across gunicorn workers when the cache is
+shared between them; settings refuses a per-process backend with more than
+one worker.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _version_key(tenant_id):
+    return f"tenant:{tenant_id}:version"
+
+
+def tenant_cache_version(tenant_id):
+    """Return the current cache version for a tenant."""
+    key = _version_key(tenant_id)
+    version = cache.get(key)
+    if version is None:
+        # A version evicted from the cache restarts at the current time, which
+        # is newer than anything older entries were stored under.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_tenant_cache_version(tenant_id):
+    """Invalidate every cached entry for a tenant once the current transaction commits."""
+    def bump():
+        cache.set(_version_key(tenant_id), time.time_ns(), timeout=None)
+
+    transaction.on_commit(bump)
+
+
+def tenant_cache_key(tenant_id, name, *parts):
+    """Build a cache key scoped to the tenant's current version."""
+    suffix = ':'.join(str(part) for part in parts)
+    return f"tenant:{tenant_id}:{tenant_cache_version(tenant_id)}:{name}:{suffix}"
@@ -0,0 +1,197 @@
+"""
+Streaming CSV/NDJSON exports of a tenant's transactions, sales and stock.
+
+Rows are read in keyset pages of ``EXPORT_CHUNK_SIZE`` (one bounded query
+per page, no server-side cursor, so it works behind a transaction pooler) and
+written out in chunks as they arrive, so an export runs in constant memory
+however much history it covers.
+"""
+import csv
+import io
+import json
+from datetime import datetime, time, timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .ledger import stock_as_of
+from .models import Product, SaleItem, Transaction
+from .reports import _inventory_value
+
+EXPORT_CHUNK_SIZE = 2000
+ROWS_PER_WRITE = 500
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def export_window(params):
+    """
+    Parse optional ``start_date``/``end_date`` (YYYY-MM-DD, inclusive) into an
+    aware ``(start, end)`` range with an exclusive end; either may be ``None``.
+    Raises ``ValueError`` for malformed dates.
+    """
+    tz = timezone.get_current_timezone()
+    start = end = None
+    if params.get('start_date'):
+        start_date = datetime.strptime(params['start_date'], '%Y-%m-%d').date()
+        start = datetime.combine(start_date, time.min).replace(tzinfo=tz)
+    if params.get('end_date'):
+        end_date = datetime.strptime(params['end_date'], '%Y-%m-%d').date()
+        end = datetime.combine(end_date + timedelta(days=1), time.min).replace(tzinfo=tz)
+    return start, end
+
+
+def _in_window(queryset, field, start, end):
+    if start:
+        queryset = queryset.filter(**{f'{field}__gte': start})
+    if end:
+        queryset = queryset.filter(**{f'{field}__lt': end})
+    return queryset
+
+
+def _after(order, values):
+    # (a, b, c) > (x, y, z) spelled out so the database can seek on the (a, b, c) index
+    condition = Q()
+    for depth, field in enumerate(order):
+        condition |= Q(**dict(zip(order[:depth], values[:depth])), **{f'{field}__gt': values[depth]})
+    return condition
+
+
+def _keyset_rows(queryset, order, fields):
+    """
+    Yield ``fields`` of ``queryset`` in ``order``, one bounded query per
+    ``EXPORT_CHUNK_SIZE`` rows, each page starting after the last row seen.
+    ``order`` must be unique per row and ascending.
+    """
+    queryset = queryset.order_by(*order).values_list(*order, *fields)
+    last = None
+    while True:
+        page = queryset.filter(_after(order, last)) if last else queryset
+        rows = list(page[:EXPORT_CHUNK_SIZE])
+        for row in rows:
+            yield row[len(order):]
+        if len(rows) < EXPORT_CHUNK_SIZE:
+            return
+        last = rows[-1][:len(order)]
+
+
+def transaction_rows(tenant, start=None, end=None, transaction_type=None):
+    queryset = _in_window(Transaction.objects.filter(tenant=tenant), 'timestamp', start, end)
+    if transaction_type:
+        queryset = queryset.filter(transaction_type=transaction_type)
+    return _keyset_rows(queryset, ('timestamp', 'id'), (
+        'id', 'timestamp', 'transaction_type', 'product_id', 'product__name',
+        'quantity', 'amount', 'deposit_amount', 'sale_id', 'created_by__username',
+    ))
+
+
+TRANSACTION_COLUMNS = (
+    'id', 'timestamp', 'type', 'product_id', 'product', 'quantity',
+    'amount', 'deposit_amount', 'sale_id', 'recorded_by',
+)
+
+
+def sale_rows(tenant, start=None, end=None, transaction_type=None):
+    """One row per sale item, with the sale's own columns repeated."""
+    queryset = _in_window(SaleItem.objects.filter(sale__tenant=tenant), 'sale__timestamp', start, end)
+    return _keyset_rows(queryset, ('sale__timestamp', 'sale_id', 'id'), (
+        'sale_id', 'sale__timestamp', 'sale__payment_method', 'sale__created_by__username',
+        'sale__total_amount', 'product_id', 'product__name', 'quantity', 'price',
+        'deposit_amount', 'subtotal',
+    ))
+
+
+SALE_COLUMNS = (
+    'sale_id', 'timestamp', 'payment_method', 'cashier', 'sale_total',
+    'product_id', 'product', 'quantity', 'price', 'deposit_amount', 'subtotal',
+)
+
+
+def inventory_rows(tenant, start=None, end=None, transaction_type=None):
+    """
+    Current stock levels, or with an ``end`` date the stock and value at the
+    close of that day from the movement ledger. ``start`` and the type filter
+    do not apply.
+    """
+    if end is None:
+        queryset = Product.objects.filter(tenant=tenant).annotate(inventory_value=_inventory_value())
+        return _keyset_rows(queryset, ('name', 'id'), (
+            'id', 'sku', 'name', 'category__name', 'quantity', 'low_stock_threshold',
+            'price', 'deposit_amount', 'is_returnable', 'bottles_outstanding',
+            'inventory_value', 'last_updated',
+        ))
+
+    return _keyset_rows(stock_as_of(tenant, end - timedelta(microseconds=1)), ('name', 'id'), (
+        'id', 'sku', 'name', 'category__name', 'quantity_as_of', 'low_stock_threshold',
+        'price_as_of', 'deposit_amount', 'is_returnable', 'bottles_as_of',
+        'inventory_value_as_of', 'last_updated',
+    ))
+
+
+INVENTORY_COLUMNS = (
+    'id', 'sku', 'name', 'category', 'quantity', 'low_stock_threshold',
+    'price', 'deposit_amount', 'is_returnable', 'bottles_outstanding',
+    'inventory_value', 'last_updated',
+)
+
+EXPORTS = {
+    'transactions': (TRANSACTION_COLUMNS, transaction_rows),
+    'sales': (SALE_COLUMNS, sale_rows),
+    'inventory': (INVENTORY_COLUMNS, inventory_rows),
+}
+
+
+def _csv_chunks(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % ROWS_PER_WRITE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(columns, rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder))
+        if len(lines) == ROWS_PER_WRITE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+async def _async_chunks(chunks):
+    # Pull each chunk on the request's ORM thread so the event loop never runs a query
+    next_chunk = sync_to_async(next)
+    while True:
+        chunk = await next_chunk(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def export_response(request, tenant, dataset, export_format, start=None, end=None, transaction_type=None):
+    """Build a ``StreamingHttpResponse`` downloading ``dataset`` in ``export_format``."""
+    columns, rows = EXPORTS[dataset]
+    chunk_writer = _csv_chunks if export_format == 'csv' else _ndjson_chunks
+    chunks = chunk_writer(columns, rows(tenant, start, end, transaction_type))
+    if isinstance(request, ASGIRequest):
+        # A sync iterator would be read into memory in full before an ASGI server sends it
+        chunks = _async_chunks(chunks)
+
+    filename = f"{dataset}-{timezone.localdate():%Y%m%d}.{export_format}"
+    response = StreamingHttpResponse(chunks, content_type=EXPORT_FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
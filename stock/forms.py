@@ -2,6 +2,7 @@ from django import forms
 from django.core.exceptions import ValidationError
 from django.forms import modelformset_factory
 from .models import Category, Product, Transaction, SaleItem
+from .services import stock_deltas
 from datetime import date
 
 
@@ -32,7 +33,23 @@ class ProductForm(forms.ModelForm):
         return deposit_amount
 
 
-class SalesTransactionForm(forms.ModelForm):
+class ProductPickerMixin:
+    """
+    For forms whose product <select> is filled by the product search endpoint:
+    the template renders only the chosen product instead of every option.
+    """
+
+    def selected_product(self):
+        value = self['product'].value()
+        if not value:
+            return None
+        try:
+            return self.fields['product'].queryset.get(pk=value)
+        except (Product.DoesNotExist, ValueError, TypeError):
+            return None
+
+
+class SalesTransactionForm(ProductPickerMixin, forms.ModelForm):
     class Meta:
         model = Transaction
         fields = ['product', 'quantity']
@@ -55,7 +72,7 @@ class SalesTransactionForm(forms.ModelForm):
         return quantity
 
 
-class SaleItemForm(forms.ModelForm):
+class SaleItemForm(ProductPickerMixin, forms.ModelForm):
     class Meta:
         model = SaleItem
         fields = ['product', 'quantity']
@@ -83,7 +100,7 @@ SaleItemFormSet = modelformset_factory(
 )
 
 
-class BottleReturnForm(forms.ModelForm):
+class BottleReturnForm(ProductPickerMixin, forms.ModelForm):
     class Meta:
         model = Transaction
         fields = ['product', 'quantity']
@@ -106,7 +123,7 @@ class BottleReturnForm(forms.ModelForm):
         return quantity
 
 
-class RestockTransactionForm(forms.ModelForm):
+class RestockTransactionForm(ProductPickerMixin, forms.ModelForm):
     class Meta:
         model = Transaction
         fields = ['product', 'quantity']
@@ -121,6 +138,35 @@ class RestockTransactionForm(forms.ModelForm):
             self.fields['product'].queryset = Product.objects.none()
 
 
+class TransactionAdminForm(forms.ModelForm):
+    """
+    Admin form that rejects a new transaction its product's stock cannot
+    cover. The admin validates inside its save transaction, so the product
+    row locked here stays locked until ``record_transaction`` has moved it.
+    """
+    class Meta:
+        model = Transaction
+        fields = '__all__'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        product = cleaned_data.get('product')
+        quantity = cleaned_data.get('quantity')
+        if self.instance.pk or product is None or quantity is None:
+            return cleaned_data
+
+        product = Product.objects.select_for_update().get(pk=product.pk)
+        txn = Transaction(product=product, quantity=quantity,
+                          transaction_type=cleaned_data.get('transaction_type'))
+        stock, bottles = stock_deltas(txn)
+        if product.quantity + stock < 0:
+            raise ValidationError(f"Only {product.quantity} units of {product.name} in stock.")
+        if product.bottles_outstanding + bottles < 0:
+            raise ValidationError(
+                f"Only {product.bottles_outstanding} containers of {product.name} outstanding.")
+        return cleaned_data
+
+
 class CategoryForm(forms.ModelForm):
     class Meta:
         model = Category
@@ -0,0 +1,113 @@
+"""
+Idempotency keys for write endpoints.
+
+Clients send an ``Idempotency-Key`` header (or an ``idempotency_key`` form
+field). The first request with a key reserves it in the same database
+transaction as the write and stores the write's result; a repeated request
+with that key gets the stored result back without running the write again.
+
+Each key also stores a fingerprint of the request that first used it (endpoint
+plus payload), so a key reused for a different request is refused rather than
+answered with an unrelated stored result.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+KEY_MAX_LENGTH = 64
+
+# Fields that vary between submissions of the same form
+UNFINGERPRINTED_FIELDS = ('idempotency_key', 'csrfmiddlewaretoken')
+
+
+class IdempotencyKeyMismatch(Exception):
+    """The idempotency key was first used for a different request."""
+
+
+def get_idempotency_key(request):
+    """Return the client's idempotency key for ``request``, or ``None``."""
+    key = request.headers.get('Idempotency-Key')
+    if not key:
+        data = getattr(request, 'data', request.POST)
+        key = data.get('idempotency_key') if hasattr(data, 'get') else None
+    if not key:
+        return None
+    key = str(key).strip()
+    if len(key) > KEY_MAX_LENGTH:
+        key = hashlib.sha256(key.encode()).hexdigest()
+    return key or None
+
+
+def payload_fingerprint(*parts):
+    """Hash of the JSON-serializable ``parts`` identifying one request."""
+    payload = json.dumps(parts, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def request_fingerprint(request):
+    """``payload_fingerprint`` of ``request``'s method, path and payload."""
+    data = getattr(request, 'data', request.POST)
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    if isinstance(data, dict):
+        data = {name: value for name, value in data.items() if name not in UNFINGERPRINTED_FIELDS}
+    return payload_fingerprint(request.method, request.path, data)
+
+
+def _replay(response, stored_fingerprint, fingerprint):
+    # Keys stored before fingerprints were recorded have none to compare
+    if stored_fingerprint and fingerprint and stored_fingerprint != fingerprint:
+        raise IdempotencyKeyMismatch("This idempotency key was already used for a different request.")
+    return response, True
+
+
+def run_idempotent(tenant, key, write, fingerprint=''):
+    """
+    Run ``write()`` at most once per ``(tenant, key)``.
+
+    ``write`` must return a JSON-serializable result. Returns ``(result, replayed)``;
+    ``replayed`` is True when the result was stored by an earlier request. If
+    ``write`` raises, the key is released with the rolled-back transaction so
+    the client can retry. Without a key, ``write`` simply runs.
+
+    ``fingerprint`` (see ``request_fingerprint``) is stored with the key; a
+    replay whose fingerprint differs raises ``IdempotencyKeyMismatch``.
+    """
+    if not key:
+        return write(), False
+
+    stored = IdempotencyKey.objects.filter(tenant=tenant, key=key).values_list('response', 'fingerprint').first()
+    if stored is not None:
+        return _replay(*stored, fingerprint)
+
+    with transaction.atomic():
+        try:
+            # A concurrent request with the same key blocks on the unique
+            # index here until the first one commits, then fails.
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(tenant=tenant, key=key, fingerprint=fingerprint)
+        except IntegrityError:
+            record = None
+        else:
+            result = write()
+            record.response = result
+            record.save(update_fields=['response'])
+            return result, False
+
+    record = IdempotencyKey.objects.get(tenant=tenant, key=key)
+    return _replay(record.response, record.fingerprint, fingerprint)
+
+
+def purge_expired_keys(now=None):
+    """Delete keys older than ``IDEMPOTENCY_KEY_TTL_HOURS``. Returns the number deleted."""
+    now = now or timezone.now()
+    cutoff = now - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,204 @@
+"""
+Bulk product import: create and update a tenant's catalogue from CSV or JSON.
+
+Rows are read and validated as a stream and written in chunks. Each chunk
+costs a fixed handful of queries however many rows it holds: one to load the
+products it names, one or two for missing categories, and a single
+``INSERT ... ON CONFLICT (tenant, sku) DO UPDATE`` for the products.
+"""
+import csv
+import io
+import json
+import uuid
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_tenant_cache_version
+from .models import Category, Product, StockMovement
+from .serializers import ProductImportRowSerializer
+
+IMPORT_CHUNK_SIZE = 500
+
+IMPORT_FORMATS = ('csv', 'json', 'ndjson')
+
+# Columns an import may set. ``quantity`` only seeds new products: existing
+# stock changes through restocks so the movement ledger stays complete.
+IMPORT_FIELDS = (
+    'name', 'category', 'description', 'quantity', 'price', 'deposit_amount',
+    'expiry_date', 'low_stock_threshold', 'is_returnable',
+)
+UPSERT_FIELDS = [
+    'name', 'category', 'description', 'price', 'deposit_amount',
+    'expiry_date', 'low_stock_threshold', 'is_returnable', 'last_updated',
+]
+
+
+def import_format(filename):
+    """The import format implied by ``filename``'s extension, or ``None``."""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return {'csv': 'csv', 'json': 'json', 'ndjson': 'ndjson', 'jsonl': 'ndjson'}.get(extension)
+
+
+def read_rows(stream, import_format):
+    """
+    Yield the rows of a binary ``stream`` as dicts. CSV and NDJSON are read a
+    line at a time; JSON must be an array of objects. Raises ``ValueError``
+    when the file cannot be parsed; an unparseable NDJSON line is yielded as
+    ``None`` so it is reported as a bad row.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if import_format == 'csv':
+        try:
+            yield from csv.DictReader(text)
+        except csv.Error as e:
+            raise ValueError(f"Invalid CSV: {e}")
+    elif import_format == 'ndjson':
+        for line in text:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None  # Reported against its row number
+    else:
+        rows = json.load(text)
+        if not isinstance(rows, list):
+            raise ValueError("A JSON import must be an array of product objects.")
+        yield from rows
+
+
+def _clean(row):
+    """Drop blank cells so they mean "not given" rather than failing validation."""
+    return {
+        key.strip(): value.strip() if isinstance(value, str) else value
+        for key, value in row.items()
+        if key and value not in ('', None)
+    }
+
+
+def _category_ids(tenant, names):
+    """Map category names to ids, creating the missing ones with one ``bulk_create``."""
+    if not names:
+        return {}
+    found = dict(Category.objects.filter(tenant=tenant, name__in=names).values_list('name', 'pk'))
+    missing = names - found.keys()
+    if missing:
+        Category.objects.bulk_create(
+            [Category(tenant=tenant, name=name) for name in missing], ignore_conflicts=True
+        )
+        found.update(Category.objects.filter(tenant=tenant, name__in=missing).values_list('name', 'pk'))
+    return found
+
+
+def _import_chunk(tenant, rows, report):
+    """Validate and upsert one chunk of ``(row_number, row)`` pairs."""
+    valid = {}
+    for number, row in rows:
+        if not isinstance(row, dict):
+            report['errors'].append({'row': number, 'errors': {'row': ["Expected an object of product columns."]}})
+            continue
+        serializer = ProductImportRowSerializer(data=_clean(row))
+        if not serializer.is_valid():
+            report['errors'].append({'row': number, 'errors': serializer.errors})
+        else:
+            data = serializer.validated_data
+            sku = data.pop('sku', '') or str(uuid.uuid4())[:20]
+            if sku in valid:
+                earlier = valid[sku][0]
+                report['errors'].append({
+                    'row': earlier, 'errors': {'sku': [f"Duplicate SKU; row {number} replaces this row."]},
+                })
+            valid[sku] = (number, data)
+    if not valid:
+        return
+
+    existing = {
+        product.sku: product
+        for product in Product.objects.filter(tenant=tenant, sku__in=valid)
+    }
+    category_ids = _category_ids(tenant, {
+        data['category'] for _, data in valid.values() if data.get('category')
+    })
+
+    products = []
+    now = timezone.now()
+    for sku, (number, data) in valid.items():
+        current = existing.get(sku)
+        if current is None and not ('name' in data and 'price' in data):
+            report['errors'].append({
+                'row': number, 'errors': {'sku': ["Unknown SKU; new products need a name and price."]},
+            })
+            continue
+
+        values = {}
+        if current is not None:
+            values = {field: getattr(current, field) for field in IMPORT_FIELDS if field != 'category'}
+            values['category_id'] = current.category_id
+        for field, value in data.items():
+            if field == 'category':
+                values['category_id'] = category_ids.get(value)
+            elif field != 'quantity' or current is None:
+                values[field] = value
+
+        product = Product(tenant=tenant, sku=sku, last_updated=now, **values)
+        if product.is_returnable and product.deposit_amount <= 0:
+            report['errors'].append({
+                'row': number,
+                'errors': {'deposit_amount': ["Deposit amount must be greater than 0 for returnable products."]},
+            })
+            continue
+        if not product.is_returnable and product.deposit_amount != 0:
+            report['errors'].append({
+                'row': number,
+                'errors': {'deposit_amount': ["Deposit amount must be 0 for non-returnable products."]},
+            })
+            continue
+        products.append(product)
+
+    if not products:
+        return
+    Product.objects.bulk_create(
+        products,
+        update_conflicts=True,
+        unique_fields=['tenant', 'sku'],
+        update_fields=UPSERT_FIELDS,
+    )
+
+    created = [product for product in products if product.sku not in existing]
+    report['created'] += len(created)
+    report['updated'] += len(products) - len(created)
+
+    # New products' stock is their opening balance in the movement ledger
+    opening = {product.sku: product.quantity for product in created if product.quantity}
+    if opening:
+        StockMovement.objects.bulk_create([
+            StockMovement(tenant=tenant, product_id=pk, quantity_delta=opening[sku], reason='opening')
+            for sku, pk in Product.objects.filter(tenant=tenant, sku__in=opening).values_list('sku', 'pk')
+        ])
+
+
+def import_products(tenant, rows, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Create or update ``tenant``'s products from an iterable of row dicts.
+
+    Rows are matched on SKU: a known SKU updates only the columns the row
+    carries, an unknown or missing SKU creates a product (which needs a name
+    and price). Category names are created as needed. Invalid rows are skipped
+    and reported; the valid ones are all written in one transaction.
+
+    Returns ``{'created': n, 'updated': n, 'errors': [{'row': n, 'errors': {...}}]}``
+    with rows numbered from 1.
+    """
+    report = {'created': 0, 'updated': 0, 'errors': []}
+    numbered = enumerate(rows, start=1)
+    with transaction.atomic():
+        while True:
+            chunk = list(islice(numbered, chunk_size))
+            if not chunk:
+                break
+            _import_chunk(tenant, chunk, report)
+        if report['created'] or report['updated']:
+            bump_tenant_cache_version(tenant.pk)
+    report['errors'].sort(key=lambda error: error['row'])
+    return report
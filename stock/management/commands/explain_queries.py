@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import F
+
+from stock.models import Product, Sale, Transaction
+from stock.reports import inventory_status
+from tenants.models import Client
+
+
+def hot_queries(tenant):
+    """The tenant-scoped read paths that the composite indexes are tuned for."""
+    return {
+        'sales list': Sale.objects.filter(tenant=tenant).order_by('-timestamp')[:50],
+        'recent sale transactions': Transaction.objects.filter(
+            tenant=tenant, transaction_type='sale'
+        ).order_by('-timestamp')[:20],
+        'restock history': Transaction.objects.filter(
+            tenant=tenant, transaction_type='restock'
+        ).order_by('-timestamp'),
+        'transaction history': Transaction.objects.filter(tenant=tenant).order_by('-timestamp'),
+        'inventory status': inventory_status(tenant),
+        'low stock products': Product.objects.filter(
+            tenant=tenant, quantity__lte=F('low_stock_threshold')
+        ).order_by('name'),
+        'returnable products': Product.objects.filter(
+            tenant=tenant, is_returnable=True
+        ).order_by('name'),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Print the query plans of the hot tenant-scoped read queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=int, help='Tenant id to plan for (defaults to the first tenant)')
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='Run the queries and report actual timings (PostgreSQL only)',
+        )
+
+    def handle(self, *args, **options):
+        if options['tenant'] is not None:
+            tenant = Client.objects.filter(pk=options['tenant']).first()
+        else:
+            tenant = Client.objects.order_by('pk').first()
+        if tenant is None:
+            raise CommandError("No tenant to plan queries for")
+
+        explain_options = {}
+        if options['analyze']:
+            if connection.vendor != 'postgresql':
+                raise CommandError("--analyze is only supported on PostgreSQL")
+            explain_options['analyze'] = True
+
+        for name, queryset in hot_queries(tenant).items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{name}:"))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write('')
@@ -0,0 +1,40 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from stock.imports import IMPORT_FORMATS, import_format, import_products, read_rows
+from tenants.models import Client
+
+
+class Command(BaseCommand):
+    help = 'Create or update a tenant\'s products from a CSV, JSON or NDJSON file, matched on SKU'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument('--tenant', type=int, required=True, help='Tenant id to import into')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help='Defaults to the file extension')
+
+    def handle(self, *args, **options):
+        try:
+            tenant = Client.objects.get(pk=options['tenant'])
+        except Client.DoesNotExist:
+            raise CommandError(f"Tenant {options['tenant']} does not exist")
+
+        file_format = options['format'] or import_format(options['path'])
+        if file_format is None:
+            raise CommandError("Cannot tell the format from the file name; pass --format")
+
+        try:
+            with open(options['path'], 'rb') as stream:
+                report = import_products(tenant, read_rows(stream, file_format))
+        except OSError as e:
+            raise CommandError(str(e))
+        except ValueError as e:
+            raise CommandError(f"Import failed, nothing was written: {e}")
+
+        for error in report['errors']:
+            self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'])}")
+        self.stdout.write(
+            f"✅ Created {report['created']} and updated {report['updated']} product(s); "
+            f"{len(report['errors'])} row(s) rejected"
+        )
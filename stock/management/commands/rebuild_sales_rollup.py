@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from stock.rollups import rebuild_sales
+from tenants.models import Client
+
+
+class Command(BaseCommand):
+    help = 'Backfill or rebuild the DailyProductSales rollup from transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=int, help='Only rebuild this tenant id')
+        parser.add_argument('--since', type=str, help='Only rebuild days on or after YYYY-MM-DD')
+
+    def handle(self, *args, **options):
+        tenant = None
+        if options['tenant'] is not None:
+            try:
+                tenant = Client.objects.get(pk=options['tenant'])
+            except Client.DoesNotExist:
+                raise CommandError(f"Tenant {options['tenant']} does not exist")
+
+        since = None
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("--since must be in YYYY-MM-DD format")
+
+        with transaction.atomic():
+            written = rebuild_sales(tenant=tenant, since=since)
+
+        self.stdout.write(f"✅ Rebuilt {written} daily sales rollup row(s)")
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from stock.services import recalculate_sale_totals
+from tenants.models import Client
+
+
+class Command(BaseCommand):
+    help = "Reset sale totals to the sum of their items' subtotals"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=int, help='Only recalculate this tenant id')
+
+    def handle(self, *args, **options):
+        tenant = None
+        if options['tenant'] is not None:
+            try:
+                tenant = Client.objects.get(pk=options['tenant'])
+            except Client.DoesNotExist:
+                raise CommandError(f"Tenant {options['tenant']} does not exist")
+
+        corrected = recalculate_sale_totals(tenant=tenant)
+        self.stdout.write(f"✅ Corrected {corrected} sale total(s)")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from stock.ledger import take_snapshot
+from tenants.models import Client
+
+
+class Command(BaseCommand):
+    help = 'Snapshot every product\'s stock so point-in-time reports only replay recent movements'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=int, help='Only snapshot this tenant id')
+
+    def handle(self, *args, **options):
+        tenants = Client.objects.order_by('pk')
+        if options['tenant'] is not None:
+            tenants = tenants.filter(pk=options['tenant'])
+            if not tenants.exists():
+                raise CommandError(f"Tenant {options['tenant']} does not exist")
+
+        written = sum(take_snapshot(tenant) for tenant in tenants)
+        self.stdout.write(f"✅ Snapshotted {written} product(s)")
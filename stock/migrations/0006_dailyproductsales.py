@@ -0,0 +1,36 @@
+# Generated by Django 4.0 on 2026-10-17 18:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0004_remove_client_schema_name_delete_domain'),
+        ('stock', '0005_alter_category_name_alter_product_category_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('deposit', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('transactions_count', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='stock.product')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='tenants.client')),
+            ],
+            options={
+                'verbose_name_plural': 'daily product sales',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproductsales',
+            constraint=models.UniqueConstraint(fields=('tenant', 'date', 'product'), name='unique_tenant_date_product_sales'),
+        ),
+    ]
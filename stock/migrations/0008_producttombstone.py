@@ -0,0 +1,36 @@
+# Generated by Django 4.0 on 2026-10-17 18:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0004_remove_client_schema_name_delete_domain'),
+        ('stock', '0007_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['tenant', 'last_updated', 'id'], name='product_tenant_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='producttombstone',
+            name='tenant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_tombstones', to='tenants.client'),
+        ),
+        migrations.AddIndex(
+            model_name='producttombstone',
+            index=models.Index(fields=['tenant', 'id'], name='stock_produ_tenant__53146d_idx'),
+        ),
+    ]
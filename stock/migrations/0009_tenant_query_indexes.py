@@ -0,0 +1,42 @@
+# Generated by Django 4.0 on 2026-10-17 18:57
+
+from django.db import migrations, models
+import django.db.models.expressions
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0008_producttombstone'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='stock_trans_transac_c3f401_idx',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['tenant', 'name'], name='product_tenant_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('quantity__lte', django.db.models.expressions.F('low_stock_threshold'))), fields=['tenant', 'name'], name='product_low_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_returnable', True)), fields=['tenant', 'name'], name='product_returnable_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['tenant', '-timestamp'], name='sale_tenant_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['tenant', 'transaction_type', '-timestamp'], name='txn_tenant_type_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['tenant', '-timestamp'], name='txn_tenant_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Trigram GIN indexes for stock.search. They only exist on PostgreSQL, so
+# they are created with SQL here rather than declared in Model.Meta.
+# ``icontains``/``istartswith`` compile to ``UPPER(col) LIKE UPPER(...)``,
+# hence the UPPER() expression indexes; ``trigram_similar`` uses the bare column.
+INDEXES = (
+    ('product_name_upper_trgm_idx', 'stock_product', 'UPPER(name) gin_trgm_ops'),
+    ('product_name_trgm_idx', 'stock_product', 'name gin_trgm_ops'),
+    ('product_sku_upper_trgm_idx', 'stock_product', 'UPPER(sku) gin_trgm_ops'),
+    ('category_name_upper_trgm_idx', 'stock_category', 'UPPER(name) gin_trgm_ops'),
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, expression in INDEXES:
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({expression})')
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0009_tenant_query_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
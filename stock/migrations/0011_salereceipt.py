@@ -0,0 +1,23 @@
+# Generated by Django 4.2.16 on 2026-10-17 19:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0010_product_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaleReceipt',
+            fields=[
+                ('sale', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='receipt', serialize=False, to='stock.sale')),
+                ('text', models.TextField()),
+                ('html', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.16 on 2026-10-17 19:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0011_salereceipt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('event', models.CharField(max_length=50)),
+                ('tenant_id', models.BigIntegerField(blank=True, null=True)),
+                ('user_id', models.BigIntegerField(blank=True, null=True)),
+                ('message', models.TextField()),
+                ('data', models.JSONField(default=dict)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tenant_id', 'created_at'], name='stock_audit_tenant__548bdd_idx'), models.Index(fields=['event', 'created_at'], name='stock_audit_event_8e7a1b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.2.16 on 2026-10-17 19:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def snapshot_existing_stock(apps, schema_editor):
+    """Baseline snapshot of today's stock; the ledger has no history before it."""
+    Product = apps.get_model('stock', 'Product')
+    StockSnapshot = apps.get_model('stock', 'StockSnapshot')
+    taken_at = django.utils.timezone.now()
+    StockSnapshot.objects.bulk_create(
+        [
+            StockSnapshot(
+                tenant_id=product.tenant_id, product_id=product.pk, taken_at=taken_at,
+                quantity=product.quantity, bottles_outstanding=product.bottles_outstanding,
+                price=product.price, deposit_amount=product.deposit_amount,
+            )
+            for product in Product.objects.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0004_remove_client_schema_name_delete_domain'),
+        ('stock', '0012_auditevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity_delta', models.IntegerField(default=0)),
+                ('bottles_delta', models.IntegerField(default=0)),
+                ('reason', models.CharField(choices=[('sale', 'Sale'), ('restock', 'Restock'), ('deposit_refund', 'Deposit Refund'), ('deposit_collected', 'Deposit Collected'), ('opening', 'Opening Balance'), ('adjustment', 'Adjustment'), ('sale_deleted', 'Sale Deleted')], max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='stock.product')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='tenants.client')),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='stock.transaction')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('quantity', models.IntegerField()),
+                ('bottles_outstanding', models.IntegerField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('deposit_amount', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='stock.product')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='tenants.client')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tenant', 'taken_at'], name='snapshot_tenant_ts_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stocksnapshot',
+            constraint=models.UniqueConstraint(fields=('product', 'taken_at'), name='unique_product_snapshot'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['product', 'created_at'], name='movement_product_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['tenant', 'created_at'], name='movement_tenant_ts_idx'),
+        ),
+        migrations.RunPython(snapshot_existing_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.16 on 2026-10-17 19:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0013_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='voided_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='reason',
+            field=models.CharField(choices=[('sale', 'Sale'), ('restock', 'Restock'), ('deposit_refund', 'Deposit Refund'), ('deposit_collected', 'Deposit Collected'), ('sale_void', 'Sale Void'), ('opening', 'Opening Balance'), ('adjustment', 'Adjustment'), ('sale_deleted', 'Sale Deleted')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='transaction_type',
+            field=models.CharField(choices=[('sale', 'Sale'), ('restock', 'Restock'), ('deposit_refund', 'Deposit Refund'), ('deposit_collected', 'Deposit Collected'), ('sale_void', 'Sale Void')], max_length=20),
+        ),
+    ]
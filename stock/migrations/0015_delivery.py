@@ -0,0 +1,43 @@
+# Generated by Django 4.2.16 on 2026-10-17 19:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0004_remove_client_schema_name_delete_domain'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('stock', '0014_sale_void'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Delivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('supplier', models.CharField(blank=True, max_length=255)),
+                ('notes', models.TextField(blank=True)),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='tenants.client')),
+            ],
+            options={
+                'verbose_name_plural': 'deliveries',
+                'ordering': ['-received_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='delivery',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to='stock.delivery'),
+        ),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['tenant', '-received_at'], name='delivery_tenant_ts_idx'),
+        ),
+    ]
@@ -1,10 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from django.conf import settings
 import uuid
 from decimal import Decimal
-from django.db.models import F
+from django.db.models import F, Q
 from tenants.models import Client
 
 
@@ -43,6 +43,20 @@ class Product(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['tenant', 'sku'], name='unique_tenant_sku')
         ]
+        indexes = [
+            models.Index(fields=['tenant', 'name'], name='product_tenant_name_idx'),
+            models.Index(fields=['tenant', 'last_updated', 'id'], name='product_tenant_updated_idx'),
+            models.Index(
+                fields=['tenant', 'name'],
+                name='product_low_stock_idx',
+                condition=Q(quantity__lte=F('low_stock_threshold')),
+            ),
+            models.Index(
+                fields=['tenant', 'name'],
+                name='product_returnable_idx',
+                condition=Q(is_returnable=True),
+            ),
+        ]
 
     @property
     def is_low_stock(self):
@@ -54,18 +68,76 @@ class Product(models.Model):
             return self.expiry_date < timezone.now().date()
         return False
 
-    def adjust_stock(self, delta):
-        Product.objects.filter(pk=self.pk).update(quantity=F('quantity') + delta)
-        self.refresh_from_db(fields=['quantity'])
-
     @property
     def total_price(self):
         return self.price + self.deposit_amount if self.is_returnable else self.price
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so a save that edits the counters can log the change
+        instance._loaded_stock = (
+            instance.__dict__.get('quantity'), instance.__dict__.get('bottles_outstanding')
+        )
+        return instance
+
+    # Counters moved by the stock services with relative UPDATEs
+    STOCK_FIELDS = ('quantity', 'bottles_outstanding')
+
     def save(self, *args, **kwargs):
         if not self.sku:
             self.sku = str(uuid.uuid4())[:20]
-        super().save(*args, **kwargs)
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            self._record_stock_edit(dict.fromkeys(self.STOCK_FIELDS, 0))
+            return
+
+        # Only write the counters when they were edited on this instance, so
+        # saving other columns from a stale copy cannot undo a sale or restock
+        deferred = self.get_deferred_fields()
+        loaded = getattr(self, '_loaded_stock', (None, None))
+        edited = [
+            field for field, was in zip(self.STOCK_FIELDS, loaded)
+            if field not in deferred and (was is None or getattr(self, field) != was)
+        ]
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.STOCK_FIELDS
+                and field.attname not in deferred
+            ] + edited
+        else:
+            edited = [field for field in edited if field in update_fields]
+
+        with transaction.atomic():
+            current = {}
+            if edited:
+                current = (
+                    Product.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values(*edited)
+                    .first()
+                ) or {}
+            super().save(*args, **kwargs)
+            self._record_stock_edit(current, reason='adjustment')
+
+    def _record_stock_edit(self, before, reason='opening'):
+        """
+        Ledger counters set directly (forms, admin, API) against ``before``,
+        their values in the database just before the write.
+        """
+        self._loaded_stock = tuple(self.__dict__.get(field) for field in self.STOCK_FIELDS)
+        deltas = {field: getattr(self, field) - value for field, value in before.items()}
+        if not any(deltas.values()):
+            return
+        StockMovement.objects.create(
+            tenant_id=self.tenant_id,
+            product=self,
+            quantity_delta=deltas.get('quantity', 0),
+            bottles_delta=deltas.get('bottles_outstanding', 0),
+            reason=reason,
+        )
 
     def __str__(self):
         return self.name
@@ -78,18 +150,24 @@ class Sale(models.Model):
     timestamp = models.DateTimeField(default=timezone.now)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     payment_method = models.CharField(max_length=50, blank=True, null=True)
+    voided_at = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['tenant', '-timestamp'], name='sale_tenant_ts_idx'),
+        ]
 
     def __str__(self):
         return f"Sale {self.id} - ₦{self.total_amount:,.2f}"
 
     def calculate_total(self):
-        from django.db.models import Sum, F
-        total = self.items.aggregate(
-            total=Sum(F('quantity') * (F('product__price') + F('product__deposit_amount')))
-        )['total'] or Decimal('0.00')
+        """
+        Recompute ``total_amount`` from the items' subtotals, which snapshot
+        the price and deposit at the time of sale.
+        """
+        from django.db.models import Sum
+        total = self.items.aggregate(total=Sum('subtotal'))['total'] or Decimal('0.00')
         self.total_amount = total
         self.save(update_fields=['total_amount'])
 
@@ -112,16 +190,41 @@ class SaleItem(models.Model):
         return f"{self.product.name} x {self.quantity}"
 
 
+class Delivery(models.Model):
+    """
+    A delivery note: one batch of restocked lines received together. Its
+    lines are the restock ``Transaction`` rows linked to it.
+    """
+    tenant = models.ForeignKey(Client, on_delete=models.CASCADE, related_name="deliveries")
+    reference = models.CharField(max_length=100, blank=True)
+    supplier = models.CharField(max_length=255, blank=True)
+    notes = models.TextField(blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    received_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = 'deliveries'
+        ordering = ['-received_at']
+        indexes = [
+            models.Index(fields=['tenant', '-received_at'], name='delivery_tenant_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"Delivery {self.reference or self.pk} - {self.received_at:%Y-%m-%d}"
+
+
 class Transaction(models.Model):
     TRANSACTION_TYPES = (
         ('sale', 'Sale'),
         ('restock', 'Restock'),
         ('deposit_refund', 'Deposit Refund'),
         ('deposit_collected', 'Deposit Collected'),
+        ('sale_void', 'Sale Void'),
     )
 
     tenant = models.ForeignKey(Client, on_delete=models.CASCADE, related_name="transactions")
     sale = models.ForeignKey(Sale, on_delete=models.CASCADE, related_name='transactions', null=True, blank=True)
+    delivery = models.ForeignKey(Delivery, on_delete=models.SET_NULL, related_name='transactions', null=True, blank=True)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField()
     transaction_type = models.CharField(max_length=20, choices=TRANSACTION_TYPES)
@@ -135,7 +238,8 @@ class Transaction(models.Model):
         ordering = ['-timestamp']
         indexes = [
             models.Index(fields=['-timestamp']),
-            models.Index(fields=['transaction_type']),
+            models.Index(fields=['tenant', 'transaction_type', '-timestamp'], name='txn_tenant_type_ts_idx'),
+            models.Index(fields=['tenant', '-timestamp'], name='txn_tenant_ts_idx'),
         ]
 
     def __str__(self):
@@ -151,4 +255,164 @@ class Transaction(models.Model):
             self.deposit_amount = Decimal(self.quantity) * self.product.deposit_amount
         elif self.transaction_type == 'deposit_collected':
             self.deposit_amount = Decimal(self.quantity) * self.product.deposit_amount
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+class DailyProductSales(models.Model):
+    """
+    Per-tenant, per-day, per-product sales totals.
+
+    Maintained incrementally by ``stock.rollups.record_sales`` as sales and
+    deposit refunds are written, and rebuilt with ``manage.py rebuild_sales_rollup``.
+    """
+    tenant = models.ForeignKey(Client, on_delete=models.CASCADE, related_name="daily_sales")
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="daily_sales")
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    deposit = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transactions_count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'daily product sales'
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['tenant', 'date', 'product'], name='unique_tenant_date_product_sales')
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.product_id} x {self.quantity}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    The stored result of a write submitted with a client-generated key, so a
+    replay of the same key returns that result instead of writing again.
+    """
+    tenant = models.ForeignKey(Client, on_delete=models.CASCADE, related_name="idempotency_keys")
+    key = models.CharField(max_length=64)
+    # sha256 of the endpoint and payload that first used the key
+    fingerprint = models.CharField(max_length=64, blank=True, default='')
+    response = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tenant', 'key'], name='unique_tenant_idempotency_key')
+        ]
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return self.key
+
+
+class ProductTombstone(models.Model):
+    """
+    Marks a deleted product so offline clients syncing from a changes cursor
+    can drop it from their local cache.
+    """
+    tenant = models.ForeignKey(Client, on_delete=models.CASCADE, related_name="product_tombstones")
+    product_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant', 'id']),
+        ]
+
+    def __str__(self):
+        return f"Product {self.product_id} deleted {self.deleted_at}"
+
+
+class SaleReceipt(models.Model):
+    """
+    A sale's receipt rendered once at checkout, as plain text for receipt
+    printers and as standalone HTML, so reprints never re-query or re-render.
+    """
+    sale = models.OneToOneField(Sale, on_delete=models.CASCADE, primary_key=True, related_name='receipt')
+    text = models.TextField()
+    html = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Receipt for sale {self.sale_id}"
+
+
+class AuditEvent(models.Model):
+    """
+    An audit log entry, written in batches by the audit writer when the
+    database sink is enabled. Tenant and user are kept as plain ids so the
+    trail outlives the rows it mentions.
+    """
+    created_at = models.DateTimeField()
+    event = models.CharField(max_length=50)
+    tenant_id = models.BigIntegerField(null=True, blank=True)
+    user_id = models.BigIntegerField(null=True, blank=True)
+    message = models.TextField()
+    data = models.JSONField(default=dict)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant_id', 'created_at']),
+            models.Index(fields=['event', 'created_at']),
+        ]
+
+    def __str__(self):
+        return self.message
+
+
+class StockMovement(models.Model):
+    """
+    One signed change to a product's ``quantity`` and ``bottles_outstanding``.
+
+    Append-only: every write path that moves the counters adds a row after its
+    ``UPDATE``, so with ``StockSnapshot`` the stock at any past moment is the
+    nearest snapshot plus the movements after it (see ``stock.ledger``).
+    """
+    REASONS = Transaction.TRANSACTION_TYPES + (
+        ('opening', 'Opening Balance'),
+        ('adjustment', 'Adjustment'),
+        ('sale_deleted', 'Sale Deleted'),
+    )
+
+    tenant = models.ForeignKey(Client, on_delete=models.CASCADE, related_name="stock_movements")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="stock_movements")
+    quantity_delta = models.IntegerField(default=0)
+    bottles_delta = models.IntegerField(default=0)
+    reason = models.CharField(max_length=20, choices=REASONS)
+    transaction = models.ForeignKey(
+        Transaction, on_delete=models.SET_NULL, null=True, blank=True, related_name="stock_movements"
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='movement_product_ts_idx'),
+            models.Index(fields=['tenant', 'created_at'], name='movement_tenant_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_reason_display()}: {self.quantity_delta:+d} on product {self.product_id}"
+
+
+class StockSnapshot(models.Model):
+    """A product's counters and prices at ``taken_at``, written by ``manage.py snapshot_stock``."""
+    tenant = models.ForeignKey(Client, on_delete=models.CASCADE, related_name="stock_snapshots")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="stock_snapshots")
+    taken_at = models.DateTimeField()
+    quantity = models.IntegerField()
+    bottles_outstanding = models.IntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    deposit_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'taken_at'], name='unique_product_snapshot')
+        ]
+        indexes = [
+            models.Index(fields=['tenant', 'taken_at'], name='snapshot_tenant_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"Product {self.product_id} at {self.taken_at}: {self.quantity}"
@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class StockPageNumberPagination(PageNumberPagination):
+    """Default API pagination; clients may ask for up to 200 rows with ``?page_size=``."""
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class TimestampCursorPagination(CursorPagination):
+    """
+    Newest-first cursor pagination for sales and transactions.
+
+    The cursor is the ``(timestamp, id)`` of the row a page ends on (see
+    ``encode_keyset_cursor``), so each page is a range scan on that pair from
+    the previous cursor, and neither deep pages nor a full export pay for
+    ``OFFSET`` or ``COUNT(*)``. A ``-`` prefix marks a cursor for the page
+    before it.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        encoded = request.query_params.get(self.cursor_query_param)
+        backwards = bool(encoded) and encoded.startswith('-')
+        position = None
+        if encoded:
+            position = decode_keyset_cursor(encoded.removeprefix('-'))
+            if position is None:
+                raise NotFound(self.invalid_cursor_message)
+
+        if backwards:
+            timestamp, pk = position
+            queryset = queryset.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk))
+            queryset = queryset.order_by('timestamp', 'id')
+        else:
+            if position:
+                timestamp, pk = position
+                queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+            queryset = queryset.order_by('-timestamp', '-id')
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if backwards:
+            self.page.reverse()
+        # Paging back started from a row that is still there; paging on, from one that was
+        self.has_next = True if backwards else has_more
+        self.has_previous = has_more if backwards else position is not None
+        return self.page
+
+    def get_next_link(self):
+        if not (self.has_next and self.page):
+            return None
+        cursor = encode_keyset_cursor(self.page[-1].timestamp, self.page[-1].pk)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        if not (self.has_previous and self.page):
+            return None
+        cursor = '-' + encode_keyset_cursor(self.page[0].timestamp, self.page[0].pk)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_keyset_cursor(timestamp, pk):
+    return f"{(timestamp - _EPOCH) // timedelta(microseconds=1)}_{pk}"
+
+
+def decode_keyset_cursor(cursor):
+    """Inverse of ``encode_keyset_cursor``; ``None`` for a missing or malformed cursor."""
+    try:
+        micros, pk = cursor.split('_')
+        return _EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def keyset_page(queryset, cursor=None, page_size=50):
+    """
+    One newest-first page of ``queryset`` for the template views.
+
+    Rows come after ``cursor`` in ``(-timestamp, -id)`` order, so every page is
+    an index range scan however far back it is. Returns ``(rows, next_cursor)``;
+    ``next_cursor`` is ``None`` on the last page.
+    """
+    position = decode_keyset_cursor(cursor)
+    if position:
+        timestamp, pk = position
+        queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+
+    rows = list(queryset.order_by('-timestamp', '-id')[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_keyset_cursor(rows[-1].timestamp, rows[-1].pk)
@@ -0,0 +1,98 @@
+"""
+Receipt view model: one sale with its items, loaded in two queries and
+totalled in a single pass so the receipt template never touches the database.
+
+A sale does not change after checkout, so its receipt is also rendered once
+into a ``SaleReceipt`` (plain text for receipt printers plus standalone
+HTML) and reprints are served straight from that row. Voiding a sale deletes
+the row, and the next reprint renders it again with the void marked.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.template.loader import render_to_string
+
+from .models import Sale, SaleItem, SaleReceipt
+
+# Characters per line on an 80mm thermal printer in its default font
+RECEIPT_WIDTH = 42
+
+
+def build_receipt(tenant, sale_id):
+    """Load ``sale_id`` for ``tenant`` and return its receipt; raises ``Sale.DoesNotExist``."""
+    sale = (
+        Sale.objects
+        .select_related('created_by')
+        .prefetch_related(
+            Prefetch('items', queryset=SaleItem.objects.select_related('product').order_by('id'))
+        )
+        .get(pk=sale_id, tenant=tenant)
+    )
+    return receipt_for(sale)
+
+
+def receipt_for(sale, items=None):
+    """
+    Totals for a sale whose items (with products) are already prefetched, or
+    for the in-memory ``items`` written by a checkout.
+
+    Each item gets a ``deposit_total`` (unit deposit times quantity). The
+    receipt's ``subtotal`` is the sum of item subtotals, which include
+    deposits; ``deposit_total`` is the deposit share of it.
+    """
+    items = list(sale.items.all() if items is None else items)
+    subtotal = Decimal('0.00')
+    deposit_total = Decimal('0.00')
+    for item in items:
+        item.deposit_total = item.deposit_amount * item.quantity
+        subtotal += item.subtotal
+        deposit_total += item.deposit_total
+
+    cashier = sale.created_by
+    return {
+        'sale': sale,
+        'items': items,
+        'cashier': (cashier.get_full_name() or cashier.username) if cashier else '',
+        'subtotal': subtotal,
+        'deposit_total': deposit_total,
+        'total': sale.total_amount,
+    }
+
+
+def render_receipt(receipt):
+    """Return the ``(text, html)`` renderings of a receipt from ``receipt_for``."""
+    context = dict(receipt, width=RECEIPT_WIDTH, rule='-' * RECEIPT_WIDTH)
+    text = render_to_string('stock/receipts/receipt.txt', context)
+    html = render_to_string('stock/receipts/receipt.html', context)
+    return text, html
+
+
+def store_receipt(sale, items=None):
+    """Render ``sale``'s receipt and save it; see ``receipt_for`` for ``items``."""
+    text, html = render_receipt(receipt_for(sale, items))
+    return SaleReceipt.objects.create(sale=sale, text=text, html=html)
+
+
+def stored_receipt(tenant, sale_id):
+    """
+    The stored receipt of ``sale_id`` for ``tenant``. Sales from before
+    receipts were stored get theirs rendered and saved on first request.
+    Raises ``Sale.DoesNotExist``.
+    """
+    receipt = (
+        SaleReceipt.objects.select_related('sale')
+        .filter(sale_id=sale_id, sale__tenant=tenant)
+        .first()
+    )
+    if receipt is not None:
+        return receipt
+
+    view_model = build_receipt(tenant, sale_id)
+    text, html = render_receipt(view_model)
+    try:
+        with transaction.atomic():
+            return SaleReceipt.objects.create(sale=view_model['sale'], text=text, html=html)
+    except IntegrityError:
+        # Another request stored it first
+        return SaleReceipt.objects.select_related('sale').get(sale_id=sale_id)
@@ -0,0 +1,202 @@
+"""
+Read models for the dashboard: sales summary, chart data and inventory status.
+"""
+import json
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, CharField, DecimalField, ExpressionWrapper, F, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import tenant_cache_key
+from .models import DailyProductSales, Product
+
+
+def resolve_period(params):
+    """
+    Turn dashboard query parameters into ``(period, start_datetime, end_datetime)``.
+
+    ``period`` is daily, weekly, monthly (default), quarterly or custom. A custom
+    period takes ``start_date``/``end_date`` (YYYY-MM-DD, inclusive) or ``range``,
+    a number of days ending today. The end datetime is exclusive.
+    """
+    period = params.get('period', 'monthly')
+    now = timezone.localtime()
+    tz = timezone.get_current_timezone()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    if period == 'custom':
+        try:
+            if params.get('range'):
+                days = int(params['range'])
+                if days < 1:
+                    raise ValueError(days)
+                return period, today - timedelta(days=days - 1), today + timedelta(days=1)
+
+            start_date = datetime.strptime(params.get('start_date', ''), '%Y-%m-%d').date()
+            end_date = datetime.strptime(params.get('end_date', ''), '%Y-%m-%d').date()
+            # Beginning of the start day up to the beginning of the day AFTER the end day
+            return (
+                period,
+                datetime.combine(start_date, time.min).replace(tzinfo=tz),
+                datetime.combine(end_date + timedelta(days=1), time.min).replace(tzinfo=tz),
+            )
+        except (ValueError, TypeError):
+            # If parsing fails, fall back to the default (monthly)
+            period = 'monthly'
+
+    if period == 'daily':
+        return period, today, today + timedelta(days=1)
+
+    if period == 'weekly':
+        start_datetime = today - timedelta(days=today.weekday())
+        return period, start_datetime, start_datetime + timedelta(days=7)
+
+    if period == 'quarterly':
+        start_datetime = today.replace(month=3 * ((now.month - 1) // 3) + 1, day=1)
+        if start_datetime.month <= 9:
+            return period, start_datetime, start_datetime.replace(month=start_datetime.month + 3)
+        return period, start_datetime, start_datetime.replace(year=start_datetime.year + 1, month=1)
+
+    start_datetime = today.replace(day=1)
+    if start_datetime.month == 12:
+        return 'monthly', start_datetime, start_datetime.replace(year=start_datetime.year + 1, month=1)
+    return 'monthly', start_datetime, start_datetime.replace(month=start_datetime.month + 1)
+
+
+def _inventory_value():
+    return ExpressionWrapper(
+        F('quantity') * F('price'),
+        output_field=DecimalField(max_digits=20, decimal_places=2)
+    )
+
+
+def inventory_status(tenant):
+    """
+    Products of ``tenant`` annotated with their stock status and value.
+
+    Status and value are computed by the database with ``CASE`` and arithmetic
+    annotations, and the category name comes from the same query, so callers
+    can paginate the result without per-row queries.
+    """
+    return (
+        Product.objects.filter(tenant=tenant)
+        .select_related('category')
+        .only('name', 'quantity', 'price', 'low_stock_threshold', 'last_updated', 'category__name')
+        .annotate(
+            reorder_level=F('low_stock_threshold'),
+            inventory_value=_inventory_value(),
+            stock_status=Case(
+                When(quantity__lte=0, then=Value('Out of Stock')),
+                When(quantity__lte=F('low_stock_threshold'), then=Value('Low Stock')),
+                default=Value('In Stock'),
+                output_field=CharField(),
+            ),
+        )
+        .order_by('name')
+    )
+
+
+def dashboard_summary(tenant, start_datetime, end_datetime):
+    """
+    Return the sales summary and serialized chart data for ``tenant``.
+
+    The result is cached per tenant and period; any stock write for the tenant
+    bumps its cache version, so the next request recomputes it.
+    """
+    key = tenant_cache_key(
+        tenant.pk, 'dashboard', start_datetime.date().isoformat(), end_datetime.date().isoformat()
+    )
+    summary = cache.get(key)
+    if summary is None:
+        summary = _compute_dashboard_summary(tenant, start_datetime, end_datetime)
+        cache.set(key, summary, settings.DASHBOARD_CACHE_TIMEOUT)
+    return summary
+
+
+def _compute_dashboard_summary(tenant, start_datetime, end_datetime):
+    # Read sales from the daily rollup instead of re-aggregating raw transactions.
+    # Rows holding only voids of earlier days' sales have no transactions of
+    # their own but negative quantity and revenue, so keep every row that
+    # moves either; only deposit-refund-only rows are left out.
+    daily_sales = DailyProductSales.objects.filter(
+        tenant=tenant,
+        date__gte=start_datetime.date(),
+        date__lt=end_datetime.date(),
+    ).exclude(quantity=0, revenue=0)
+
+    # --- Sales Performance Metrics ---
+    sales_summary = daily_sales.aggregate(
+        total_revenue=Coalesce(Sum('revenue'), Decimal(0)),
+        total_quantity=Coalesce(Sum('quantity'), 0),
+        transactions_count=Coalesce(Sum('transactions_count'), 0)
+    )
+
+    # --- Chart Data Preparation ---
+    # 1. Sales Trend
+    sales_trend_data = (
+        daily_sales
+        .values('date')
+        .annotate(
+            total_sales=Coalesce(Sum('quantity'), 0),
+            total_revenue=Coalesce(Sum('revenue'), Decimal(0))
+        )
+        .order_by('date')
+    )
+
+    sales_trend = {
+        'dates': [item['date'].strftime('%b %d') for item in sales_trend_data],
+        'quantities': [item['total_sales'] for item in sales_trend_data],
+        'revenues': [float(item['total_revenue']) for item in sales_trend_data]
+    }
+
+    # 2. Inventory Value by Category
+    category_value = (
+        Product.objects.filter(tenant=tenant)
+        .values('category__name')
+        .annotate(total_value=Coalesce(Sum(_inventory_value()), Decimal(0)))
+        .order_by('-total_value')
+    )
+
+    inventory_by_category = {
+        'labels': [item['category__name'] or 'Uncategorized' for item in category_value],
+        'values': [float(item['total_value']) for item in category_value]
+    }
+
+    # 3. Top Selling Products
+    top_products_data = (
+        daily_sales
+        .values('product__name', 'product__id')
+        .annotate(
+            total_sold=Coalesce(Sum('quantity'), 0),
+            total_revenue=Coalesce(Sum('revenue'), Decimal(0))
+        )
+        .order_by('-total_sold')[:5]
+    )
+
+    top_products = {
+        'labels': [item['product__name'] for item in top_products_data],
+        'sales': [item['total_sold'] for item in top_products_data],
+        'revenues': [float(item['total_revenue']) for item in top_products_data]
+    }
+
+    chart_data = {
+        'sales_trend': sales_trend,
+        'inventory_by_category': inventory_by_category,
+        'top_products': top_products
+    }
+
+    total_inventory_value = Product.objects.filter(tenant=tenant).aggregate(
+        total=Coalesce(Sum(_inventory_value()), Decimal(0))
+    )['total']
+
+    return {
+        'total_inventory_value': total_inventory_value,
+        'total_revenue': sales_summary['total_revenue'],
+        'total_quantity': sales_summary['total_quantity'],
+        'transactions_count': sales_summary['transactions_count'],
+        'chart_data': json.dumps(chart_data, default=str),
+    }
@@ -0,0 +1,136 @@
+"""
+Incremental maintenance of the ``DailyProductSales`` rollup.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import DailyProductSales, Transaction
+
+ROLLUP_TYPES = ('sale', 'sale_void', 'deposit_refund')
+
+
+def record_sales(transactions, sign=1):
+    """
+    Fold sale, sale-void and deposit-refund transactions into the daily rollup;
+    ``sign=-1`` takes them back out (for transactions being deleted).
+
+    Rows for each (tenant, day) are created with one ``bulk_create`` that ignores
+    existing keys, then incremented with one ``UPDATE ... CASE`` so concurrent
+    tills never overwrite each other's totals.
+    """
+    days = defaultdict(lambda: defaultdict(lambda: [0, Decimal('0'), Decimal('0'), 0]))
+
+    for txn in transactions:
+        if txn.transaction_type not in ROLLUP_TYPES:
+            continue
+        day = timezone.localdate(txn.timestamp)
+        totals = days[(txn.tenant_id, day)][txn.product_id]
+        if txn.transaction_type == 'sale':
+            totals[0] += sign * txn.quantity
+            totals[1] += sign * Decimal(txn.amount)
+            totals[2] += sign * Decimal(txn.deposit_amount)
+            totals[3] += sign
+        elif txn.transaction_type == 'sale_void':
+            # Void amounts are stored negative; the quantity is the units returned
+            totals[0] -= sign * txn.quantity
+            totals[1] += sign * Decimal(txn.amount)
+            totals[2] += sign * Decimal(txn.deposit_amount)
+        else:
+            totals[2] -= sign * Decimal(txn.deposit_amount)
+
+    for (tenant_id, day), products in days.items():
+        DailyProductSales.objects.bulk_create(
+            [DailyProductSales(tenant_id=tenant_id, date=day, product_id=pk) for pk in products],
+            ignore_conflicts=True,
+        )
+        DailyProductSales.objects.filter(
+            tenant_id=tenant_id, date=day, product_id__in=products
+        ).update(
+            quantity=Case(
+                *[When(product_id=pk, then=F('quantity') + t[0]) for pk, t in products.items()]
+            ),
+            revenue=Case(
+                *[When(product_id=pk, then=F('revenue') + t[1]) for pk, t in products.items()],
+                output_field=DecimalField(),
+            ),
+            deposit=Case(
+                *[When(product_id=pk, then=F('deposit') + t[2]) for pk, t in products.items()],
+                output_field=DecimalField(),
+            ),
+            transactions_count=Case(
+                *[When(product_id=pk, then=F('transactions_count') + t[3]) for pk, t in products.items()]
+            ),
+        )
+
+
+def rebuild_sales(tenant=None, since=None, batch_size=1000):
+    """
+    Recompute rollup rows from the raw ``Transaction`` table.
+
+    Existing rows in scope are deleted first; the aggregation runs in the
+    database and rows are written back in batches. Returns the row count.
+    """
+    rollup = DailyProductSales.objects.all()
+    transactions = Transaction.objects.filter(transaction_type__in=ROLLUP_TYPES)
+    if tenant is not None:
+        rollup = rollup.filter(tenant=tenant)
+        transactions = transactions.filter(tenant=tenant)
+    if since is not None:
+        rollup = rollup.filter(date__gte=since)
+        transactions = transactions.filter(timestamp__date__gte=since)
+
+    is_sale = Q(transaction_type='sale')
+    is_void = Q(transaction_type='sale_void')
+    rows = (
+        transactions
+        .annotate(day=TruncDate('timestamp', tzinfo=timezone.get_current_timezone()))
+        .values('tenant_id', 'day', 'product_id')
+        .annotate(
+            total_quantity=Coalesce(
+                Sum(Case(
+                    When(is_sale, then=F('quantity')),
+                    When(is_void, then=-F('quantity')),
+                    default=0,
+                )),
+                0,
+            ),
+            total_revenue=Coalesce(
+                Sum('amount', filter=is_sale | is_void), Value(Decimal('0')), output_field=DecimalField()
+            ),
+            total_deposit=Coalesce(
+                Sum(Case(
+                    When(is_sale | is_void, then=F('deposit_amount')),
+                    default=-F('deposit_amount'),
+                    output_field=DecimalField(),
+                )),
+                Value(Decimal('0')),
+                output_field=DecimalField(),
+            ),
+            total_count=Count('id', filter=is_sale, output_field=IntegerField()),
+        )
+        .order_by()
+    )
+
+    rollup.delete()
+    batch = []
+    written = 0
+    for row in rows.iterator():
+        batch.append(DailyProductSales(
+            tenant_id=row['tenant_id'],
+            date=row['day'],
+            product_id=row['product_id'],
+            quantity=row['total_quantity'],
+            revenue=row['total_revenue'],
+            deposit=row['total_deposit'],
+            transactions_count=row['total_count'],
+        ))
+        if len(batch) >= batch_size:
+            DailyProductSales.objects.bulk_create(batch)
+            written += len(batch)
+            batch = []
+    DailyProductSales.objects.bulk_create(batch)
+    return written + len(batch)
@@ -0,0 +1,88 @@
+"""
+Typeahead product search for the product pickers.
+
+On PostgreSQL, name and category matching is served by pg_trgm GIN indexes
+(see migration 0010). Those indexes also cover ``ILIKE '%term%'`` and add
+typo-tolerant similarity matches ranked by ``TrigramSimilarity``. Other
+databases fall back to substring matching ranked by where the term matched.
+"""
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+from .models import Product
+
+SEARCH_LIMIT = 20
+
+# Fields returned per match: the offline-cache shape plus SKU and category
+SEARCH_FIELDS = (
+    'id', 'name', 'sku', 'category_name', 'price', 'quantity',
+    'is_returnable', 'deposit_amount', 'bottles_outstanding',
+)
+
+
+# Fields returned by a barcode/SKU lookup
+SKU_LOOKUP_FIELDS = (
+    'id', 'sku', 'name', 'price', 'deposit_amount', 'quantity',
+    'is_returnable', 'bottles_outstanding',
+)
+
+
+async def lookup_sku(tenant_id, sku):
+    """
+    The product with ``sku`` as a dict of ``SKU_LOOKUP_FIELDS``, or ``None``.
+
+    One probe of the unique ``(tenant, sku)`` index, so scans always see the
+    current price and stock.
+    """
+    return await (
+        Product.objects
+        .filter(tenant_id=tenant_id, sku=sku)
+        .values(*SKU_LOOKUP_FIELDS)
+        .afirst()
+    )
+
+
+def search_products(tenant_id, term, in_stock=False, has_outstanding=False, limit=SEARCH_LIMIT):
+    """
+    Return a values queryset of the best ``limit`` matches for ``term`` over
+    product name, SKU prefix and category name. An empty term lists products
+    alphabetically.
+    """
+    products = Product.objects.filter(tenant_id=tenant_id)
+    if in_stock:
+        products = products.filter(quantity__gt=0)
+    if has_outstanding:
+        products = products.filter(is_returnable=True, bottles_outstanding__gt=0)
+
+    term = term.strip()
+    if not term:
+        return _values(products.order_by('name'))[:limit]
+
+    matches = (
+        Q(name__icontains=term)
+        | Q(sku__istartswith=term)
+        | Q(category__name__icontains=term)
+    )
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        products = products.filter(matches | Q(name__trigram_similar=term)).annotate(
+            rank=TrigramSimilarity('name', term),
+        ).order_by('-rank', 'name')
+    else:
+        products = products.filter(matches).annotate(
+            rank=Case(
+                When(name__istartswith=term, then=Value(0)),
+                When(sku__istartswith=term, then=Value(1)),
+                When(name__icontains=term, then=Value(2)),
+                default=Value(3),
+                output_field=IntegerField(),
+            ),
+        ).order_by('rank', 'name')
+
+    return _values(products)[:limit]
+
+
+def _values(products):
+    return products.annotate(category_name=F('category__name')).values(*SEARCH_FIELDS)
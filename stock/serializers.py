@@ -1,19 +1,41 @@
 # stock/serializers.py
+from decimal import Decimal
+
 from rest_framework import serializers
 import tenants
 from .models import Category, Product, Transaction
 
 from rest_framework import serializers
-from .models import Sale, Transaction
+from .models import Delivery, Sale, SaleItem, Transaction
+from .sync import PRODUCT_CACHE_FIELDS
+
+class SparseFieldsMixin:
+    """
+    Drop every field not named in the request's comma-separated ``?fields=``
+    so clients only receive the columns they render. Unknown names are ignored.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        requested = request.query_params.get('fields')
+        if not requested:
+            return
+        wanted = {name.strip() for name in requested.split(',')}
+        for name in set(self.fields) - wanted:
+            self.fields.pop(name)
 
-class CategorySerializer(serializers.ModelSerializer):
+
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name', 'company']
         read_only_fields = ['company'] # Company is set by the view
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # This ensures that when creating/updating a product, the category provided
     # must belong to the user's company.
     category = serializers.PrimaryKeyRelatedField(
@@ -29,6 +51,8 @@ class ProductSerializer(serializers.ModelSerializer):
         super().__init__(*args, **kwargs)
         # Dynamically filter the category queryset based on the request user's company
         request = self.context.get('request')
+        if 'category' not in self.fields:  # left out by ?fields=
+            return
         if request and hasattr(request.user, 'company'):
             self.fields['category'].queryset = Category.objects.filter(tenant=request.user.company)
 
@@ -38,7 +62,7 @@ class ProductSerializer(serializers.ModelSerializer):
             )
 
 
-class TransactionSerializer(serializers.ModelSerializer):
+class TransactionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # This ensures the product provided in an API call belongs to the user's company.
     product = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all()
@@ -52,7 +76,7 @@ class TransactionSerializer(serializers.ModelSerializer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         request = self.context.get('request')
-        if request and hasattr(request.user, 'company'):
+        if request and hasattr(request.user, 'company') and 'product' in self.fields:
             self.fields['product'].queryset = Product.objects.filter(tenant=request.user.company)
 
 
@@ -60,3 +84,112 @@ class SaleSerializer(serializers.ModelSerializer):
     class Meta:
         model = Sale
         fields = '__all__'
+
+
+class SaleListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Sale
+        fields = ['id', 'timestamp', 'total_amount', 'payment_method', 'created_by', 'voided_at']
+
+
+class SaleItemSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+
+    class Meta:
+        model = SaleItem
+        fields = ['product', 'product_name', 'quantity', 'price', 'deposit_amount', 'subtotal']
+
+
+class SaleDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    items = SaleItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Sale
+        fields = ['id', 'timestamp', 'total_amount', 'payment_method', 'created_by', 'voided_at', 'items']
+
+
+class SaleLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class SaleCreateSerializer(serializers.Serializer):
+    """
+    Input for a checkout: either ``items`` (a list of product/quantity lines)
+    or a single ``product`` and ``quantity``.
+    """
+    items = SaleLineSerializer(many=True, required=False)
+    product = serializers.IntegerField(required=False)
+    quantity = serializers.IntegerField(min_value=1, required=False)
+    payment_method = serializers.CharField(max_length=50, required=False, allow_blank=True)
+
+    def validate(self, attrs):
+        if not attrs.get('items'):
+            if attrs.get('product') is None or attrs.get('quantity') is None:
+                raise serializers.ValidationError("Provide items, or a product and quantity.")
+            attrs['items'] = [{'product': attrs['product'], 'quantity': attrs['quantity']}]
+        return attrs
+
+
+class ProductCacheSerializer(serializers.ModelSerializer):
+    """The compact product shape stored in the PWA's offline cache."""
+
+    class Meta:
+        model = Product
+        fields = PRODUCT_CACHE_FIELDS
+        read_only_fields = PRODUCT_CACHE_FIELDS
+
+
+class SyncOperationSerializer(serializers.Serializer):
+    """One operation from the offline PWA queue."""
+    key = serializers.CharField(max_length=64)
+    type = serializers.ChoiceField(choices=['sale', 'return', 'restock'])
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+    timestamp = serializers.DateTimeField(required=False)
+
+
+class VoidSalesSerializer(serializers.Serializer):
+    sales = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=1000)
+
+
+class ProductImportRowSerializer(serializers.Serializer):
+    """
+    One row of a bulk product import. Every column is optional here: rows for
+    an existing SKU only change the columns they carry, and the import checks
+    that new products have a name and price.
+    """
+    sku = serializers.CharField(max_length=20, required=False, allow_blank=True)
+    name = serializers.CharField(max_length=255, required=False)
+    category = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    description = serializers.CharField(required=False, allow_blank=True)
+    quantity = serializers.IntegerField(min_value=0, required=False)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'), required=False)
+    deposit_amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False)
+    expiry_date = serializers.DateField(required=False, allow_null=True)
+    low_stock_threshold = serializers.IntegerField(min_value=0, required=False)
+    is_returnable = serializers.BooleanField(required=False)
+
+
+class DeliveryLineSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Transaction
+        fields = ['id', 'product', 'quantity']
+        read_only_fields = ['id', 'product', 'quantity']
+
+
+class DeliverySerializer(serializers.ModelSerializer):
+    lines = DeliveryLineSerializer(source='transactions', many=True, read_only=True)
+
+    class Meta:
+        model = Delivery
+        fields = ['id', 'reference', 'supplier', 'notes', 'created_by', 'received_at', 'lines']
+        read_only_fields = ['created_by', 'received_at']
+
+
+class DeliveryCreateSerializer(serializers.Serializer):
+    """A delivery note and its lines, received as one restock."""
+    reference = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    supplier = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    notes = serializers.CharField(required=False, allow_blank=True)
+    lines = SaleLineSerializer(many=True, allow_empty=False, max_length=1000)
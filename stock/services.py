@@ -0,0 +1,497 @@
+"""
+Stock write paths shared by the template views and the API.
+
+Everything that moves stock for a sale goes through here so the row locking,
+validation and bulk writes live in one place instead of being repeated per view.
+"""
+from collections import defaultdict
+from contextvars import ContextVar
+from decimal import Decimal
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .audit import audit
+from .cache import bump_tenant_cache_version
+from .models import Delivery, Product, Sale, SaleItem, SaleReceipt, StockMovement, Transaction
+from .receipts import store_receipt
+from .rollups import ROLLUP_TYPES, record_sales
+
+
+class InsufficientStock(ValueError):
+    """Raised when a stock movement would take more units than are available."""
+
+
+def move_stock(product_id, quantity=0, bottles=0):
+    """
+    Apply signed deltas to a product's ``quantity`` and ``bottles_outstanding``.
+
+    The change is a single guarded ``UPDATE ... SET quantity = quantity + n``;
+    negative deltas only match while enough units remain, so the returned
+    affected-row count is 0 when the movement would oversell.
+    """
+    guards = {}
+    if quantity < 0:
+        guards['quantity__gte'] = -quantity
+    if bottles < 0:
+        guards['bottles_outstanding__gte'] = -bottles
+
+    return Product.objects.filter(pk=product_id, **guards).update(
+        quantity=F('quantity') + quantity,
+        bottles_outstanding=F('bottles_outstanding') + bottles,
+        last_updated=timezone.now(),
+    )
+
+
+def move_stock_bulk(deltas):
+    """
+    Apply ``{product_id: (quantity, bottles)}`` deltas with one ``UPDATE ... CASE``.
+
+    Unlike ``move_stock`` there is no per-row guard, so callers must hold the
+    product rows locked and have validated the movement already.
+    """
+    if not deltas:
+        return 0
+    return Product.objects.filter(pk__in=deltas).update(
+        quantity=Case(
+            *[When(pk=pk, then=F('quantity') + qty) for pk, (qty, _) in deltas.items() if qty],
+            default=F('quantity'),
+        ),
+        bottles_outstanding=Case(
+            *[When(pk=pk, then=F('bottles_outstanding') + bottles) for pk, (_, bottles) in deltas.items() if bottles],
+            default=F('bottles_outstanding'),
+        ),
+        last_updated=timezone.now(),
+    )
+
+
+def sale_transaction(tenant, user, product, quantity, timestamp, sale=None):
+    """Build an unsaved sale ``Transaction`` with the amounts ``Transaction.save`` would set."""
+    return Transaction(
+        tenant=tenant,
+        sale=sale,
+        product=product,
+        quantity=quantity,
+        transaction_type='sale',
+        timestamp=timestamp,
+        created_by=user,
+        amount=Decimal(quantity) * product.price,
+        deposit_amount=(
+            Decimal(quantity) * product.deposit_amount
+            if product.is_returnable else Decimal('0.00')
+        ),
+    )
+
+
+def stock_deltas(txn):
+    """Return the ``(quantity, bottles)`` deltas a transaction applies to its product."""
+    if txn.transaction_type == 'sale':
+        return -txn.quantity, txn.quantity if txn.product.is_returnable else 0
+    if txn.transaction_type == 'restock':
+        return txn.quantity, 0
+    if txn.transaction_type == 'deposit_refund':
+        return 0, -txn.quantity
+    if txn.transaction_type == 'sale_void':
+        return txn.quantity, -txn.quantity if txn.product.is_returnable else 0
+    return 0, 0
+
+
+def record_movements(transactions):
+    """
+    Append the ledger rows for ``transactions`` whose stock movement has just
+    been applied, in one ``INSERT``. Called after the ``UPDATE`` so each row is
+    stamped later than the counters it describes changed.
+    """
+    movements = []
+    for txn in transactions:
+        quantity, bottles = stock_deltas(txn)
+        if quantity or bottles:
+            movements.append(StockMovement(
+                tenant_id=txn.tenant_id,
+                product_id=txn.product_id,
+                quantity_delta=quantity,
+                bottles_delta=bottles,
+                reason=txn.transaction_type,
+                transaction=txn,
+            ))
+    StockMovement.objects.bulk_create(movements)
+
+
+def apply_stock_movement(txn):
+    """
+    Move stock and update the daily sales rollup for an already saved transaction.
+
+    Call inside ``transaction.atomic()`` so the transaction row is rolled back
+    when the guard rejects the movement.
+    """
+    quantity, bottles = stock_deltas(txn)
+    if (quantity or bottles) and not move_stock(txn.product_id, quantity, bottles):
+        if quantity < 0:
+            raise InsufficientStock(f"Insufficient stock for {txn.product.name}")
+        raise InsufficientStock(
+            f"Cannot return {txn.quantity} containers of {txn.product.name}; "
+            f"not that many are outstanding."
+        )
+    record_movements([txn])
+    record_sales([txn])
+
+    audit(
+        txn.transaction_type,
+        f"Transaction {txn.id}: {txn.transaction_type} of {txn.quantity} "
+        f"units on product {txn.product_id} by user {txn.created_by_id}",
+        tenant_id=txn.tenant_id, user_id=txn.created_by_id, transaction_id=txn.id,
+        product_id=txn.product_id, quantity=txn.quantity,
+    )
+
+
+def record_transaction(txn):
+    """Save ``txn`` and apply its stock movement atomically."""
+    with transaction.atomic():
+        txn.save()
+        apply_stock_movement(txn)
+    return txn
+
+
+def checkout(tenant, user, lines, payment_method=None):
+    """
+    Record a sale for ``lines``, an iterable of ``(product_id, quantity)`` pairs.
+
+    All basket products are locked with a single ``SELECT ... FOR UPDATE``
+    ordered by pk (so concurrent tills always lock in the same order), stock is
+    validated in memory, and the sale items, transactions and stock deductions
+    are written with two ``bulk_create`` calls and one ``UPDATE``.
+    Repeated lines for the same product are merged into one sale item.
+    """
+    quantities = {}
+    for product_id, quantity in lines:
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+    if not quantities:
+        raise ValueError("A sale needs at least one item.")
+
+    with transaction.atomic():
+        products = {
+            product.pk: product
+            for product in Product.objects.select_for_update()
+            .filter(tenant=tenant, pk__in=quantities)
+            .order_by('pk')
+        }
+
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
+            if product is None:
+                raise ValueError("Product not found.")
+            if product.quantity < quantity:
+                raise InsufficientStock(f"Insufficient stock for {product.name}")
+
+        sale = Sale.objects.create(
+            tenant=tenant,
+            created_by=user,
+            payment_method=payment_method,
+        )
+
+        items = []
+        transactions = []
+        total = Decimal('0.00')
+
+        for product_id, quantity in quantities.items():
+            product = products[product_id]
+            subtotal = (product.price + product.deposit_amount) * quantity
+            total += subtotal
+
+            items.append(SaleItem(
+                sale=sale,
+                product=product,
+                quantity=quantity,
+                price=product.price,
+                deposit_amount=product.deposit_amount,
+                subtotal=subtotal,
+            ))
+            transactions.append(
+                sale_transaction(tenant, user, product, quantity, sale.timestamp, sale=sale)
+            )
+
+        SaleItem.objects.bulk_create(items)
+        Transaction.objects.bulk_create(transactions)
+        record_sales(transactions)
+
+        move_stock_bulk({
+            pk: (-qty, qty if products[pk].is_returnable else 0)
+            for pk, qty in quantities.items()
+        })
+        record_movements(transactions)
+
+        sale.total_amount = total
+        sale.save(update_fields=['total_amount'])
+        bump_tenant_cache_version(tenant.pk)
+        # Render once the sale is committed rather than while its products are locked;
+        # a receipt that fails to store here is rendered on first request instead
+        transaction.on_commit(partial(store_receipt, sale, items), robust=True)
+
+    audit(
+        'sale',
+        f"Sale {sale.id}: {len(items)} line(s), {sum(quantities.values())} units, "
+        f"total {total} by user {getattr(user, 'pk', None)}",
+        tenant_id=tenant.pk, user_id=getattr(user, 'pk', None), sale_id=sale.id,
+        lines=len(items), units=sum(quantities.values()), total=total,
+    )
+    return sale
+
+
+def receive_delivery(tenant, user, lines, reference='', supplier='', notes=''):
+    """
+    Restock ``tenant``'s products from a delivery note and return the ``Delivery``.
+
+    ``lines`` is an iterable of ``(product_id, quantity)`` pairs; each becomes
+    a restock ``Transaction`` linked to the delivery. The products are locked
+    with one ``SELECT ... FOR UPDATE`` ordered by pk, the transactions and
+    their ledger rows are written with one ``bulk_create`` each, and all the
+    stock increments with a single ``UPDATE``, whatever the number of lines.
+    """
+    lines = list(lines)
+    if not lines:
+        raise ValueError("A delivery needs at least one line.")
+
+    with transaction.atomic():
+        products = {
+            product.pk: product
+            for product in Product.objects.select_for_update()
+            .filter(tenant=tenant, pk__in={product_id for product_id, _ in lines})
+            .order_by('pk')
+        }
+        if any(product_id not in products for product_id, _ in lines):
+            raise ValueError("Product not found.")
+
+        delivery = Delivery.objects.create(
+            tenant=tenant, created_by=user, reference=reference, supplier=supplier, notes=notes,
+        )
+        transactions = [
+            Transaction(
+                tenant=tenant,
+                delivery=delivery,
+                product=products[product_id],
+                quantity=quantity,
+                transaction_type='restock',
+                timestamp=delivery.received_at,
+                created_by=user,
+            )
+            for product_id, quantity in lines
+        ]
+        Transaction.objects.bulk_create(transactions)
+
+        deltas = defaultdict(int)
+        for product_id, quantity in lines:
+            deltas[product_id] += quantity
+        move_stock_bulk({pk: (quantity, 0) for pk, quantity in deltas.items()})
+        record_movements(transactions)
+        bump_tenant_cache_version(tenant.pk)
+
+    audit(
+        'delivery',
+        f"Delivery {delivery.pk}: {len(lines)} line(s), {sum(deltas.values())} units "
+        f"by user {getattr(user, 'pk', None)}",
+        tenant_id=tenant.pk, user_id=getattr(user, 'pk', None), delivery_id=delivery.pk,
+        lines=len(lines), units=sum(deltas.values()),
+    )
+    return delivery
+
+
+SALE_TOTALS_BATCH_SIZE = 1000
+
+
+def recalculate_sale_totals(tenant=None):
+    """
+    Reset every sale's ``total_amount`` to the sum of its items' subtotals.
+
+    Only sales whose stored total disagrees are rewritten, in batches of
+    ``SALE_TOTALS_BATCH_SIZE`` with one ``UPDATE`` each. Returns the number
+    of sales corrected.
+    """
+    items_total = Coalesce(
+        Subquery(
+            SaleItem.objects.filter(sale=OuterRef('pk'))
+            .order_by()
+            .values('sale')
+            .annotate(total=Sum('subtotal'))
+            .values('total')
+        ),
+        Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+    sales = Sale.objects.all()
+    if tenant is not None:
+        sales = sales.filter(tenant=tenant)
+    stale = list(
+        sales.annotate(items_total=items_total)
+        .exclude(total_amount=F('items_total'))
+        .values_list('pk', 'tenant_id')
+    )
+
+    for start in range(0, len(stale), SALE_TOTALS_BATCH_SIZE):
+        batch = [pk for pk, _ in stale[start:start + SALE_TOTALS_BATCH_SIZE]]
+        with transaction.atomic():
+            Sale.objects.filter(pk__in=batch).update(total_amount=items_total)
+
+    for tenant_id in {tenant_id for _, tenant_id in stale}:
+        bump_tenant_cache_version(tenant_id)
+    return len(stale)
+
+
+# Set while ``delete_sales`` deletes, so the per-sale pre_delete signal does
+# not restore stock a second time and deleted transactions do not each bump
+# the tenant cache version
+deleting_sales_in_bulk = ContextVar('deleting_sales_in_bulk', default=False)
+
+
+def _lock_products(product_ids):
+    return {
+        product.pk: product
+        for product in Product.objects.select_for_update()
+        .filter(pk__in=product_ids)
+        .order_by('pk')
+    }
+
+
+def _return_sold_stock(products, lines, reason):
+    """
+    Put sold units back on the shelf: ``lines`` are ``(product_id, quantity,
+    transaction)`` with ``products`` locked. Returnables also take their
+    containers back off ``bottles_outstanding``, as far as it goes. All lines
+    are applied with one ``UPDATE ... CASE`` and ledgered with one ``INSERT``.
+    """
+    outstanding = {pk: max(product.bottles_outstanding, 0) for pk, product in products.items()}
+    deltas = defaultdict(lambda: [0, 0])
+    movements = []
+    for product_id, quantity, txn in lines:
+        product = products[product_id]
+        bottles = min(quantity, outstanding[product_id]) if product.is_returnable else 0
+        outstanding[product_id] -= bottles
+        deltas[product_id][0] += quantity
+        deltas[product_id][1] -= bottles
+        movements.append(StockMovement(
+            tenant_id=product.tenant_id,
+            product_id=product_id,
+            quantity_delta=quantity,
+            bottles_delta=-bottles,
+            reason=reason,
+            transaction=txn,
+        ))
+
+    move_stock_bulk({pk: tuple(delta) for pk, delta in deltas.items()})
+    StockMovement.objects.bulk_create(movements)
+    for tenant_id in {product.tenant_id for product in products.values()}:
+        bump_tenant_cache_version(tenant_id)
+
+
+def void_sales(tenant, sale_ids, user=None):
+    """
+    Void ``tenant``'s sales in ``sale_ids`` and return how many were voided.
+
+    The sales are kept and marked ``voided_at``. Each sold line gets a
+    ``sale_void`` transaction with the negated amounts, linked to its sale.
+    The units go back to stock with one ``UPDATE`` across all the sales, and
+    the daily rollup is reduced on the day of the void. Their stored receipts
+    are dropped so reprints show the void. Sales that are already voided are
+    skipped.
+    """
+    with transaction.atomic():
+        sale_ids = list(
+            Sale.objects.select_for_update()
+            .filter(tenant=tenant, pk__in=sale_ids, voided_at__isnull=True)
+            .values_list('pk', flat=True)
+        )
+        if not sale_ids:
+            return 0
+
+        items = list(
+            SaleItem.objects.filter(sale__in=sale_ids)
+            .values_list('sale_id', 'product_id', 'quantity', 'price', 'deposit_amount')
+        )
+        products = _lock_products({item[1] for item in items})
+
+        now = timezone.now()
+        reversals = []
+        for sale_id, product_id, quantity, price, deposit in items:
+            product = products[product_id]
+            reversals.append(Transaction(
+                tenant=tenant,
+                sale_id=sale_id,
+                product=product,
+                quantity=quantity,
+                transaction_type='sale_void',
+                timestamp=now,
+                created_by=user,
+                amount=-(price * quantity),
+                deposit_amount=-(deposit * quantity) if product.is_returnable else Decimal('0.00'),
+                notes="Sale voided",
+            ))
+        Transaction.objects.bulk_create(reversals)
+        _return_sold_stock(products, [(t.product_id, t.quantity, t) for t in reversals], 'sale_void')
+        record_sales(reversals)
+        Sale.objects.filter(pk__in=sale_ids).update(voided_at=now)
+        # Stored receipts are re-rendered, with the void marked, on next request
+        SaleReceipt.objects.filter(sale__in=sale_ids).delete()
+
+    audit(
+        'sale_void',
+        f"Voided {len(sale_ids)} sale(s), {len(items)} line(s) by user {getattr(user, 'pk', None)}",
+        tenant_id=tenant.pk, user_id=getattr(user, 'pk', None),
+        sale_ids=[str(pk) for pk in sale_ids],
+    )
+    return len(sale_ids)
+
+
+def reverse_deleted_sales(sale_ids):
+    """
+    Undo the stock and rollup effects of sales that are about to be deleted:
+    unvoided sales' units go back to stock and their transactions leave the
+    daily rollup.
+    """
+    items = list(
+        SaleItem.objects.filter(sale__in=sale_ids, sale__voided_at__isnull=True)
+        .values_list('product_id', 'quantity')
+    )
+    if items:
+        products = _lock_products({product_id for product_id, _ in items})
+        _return_sold_stock(products, [(pk, quantity, None) for pk, quantity in items], 'sale_deleted')
+
+    record_sales(
+        Transaction.objects.filter(sale__in=sale_ids, transaction_type__in=ROLLUP_TYPES).only(
+            'tenant_id', 'product_id', 'timestamp', 'transaction_type',
+            'quantity', 'amount', 'deposit_amount',
+        ),
+        sign=-1,
+    )
+
+
+def delete_sales(sales):
+    """
+    Delete the ``sales`` queryset, returning the number of sales deleted.
+
+    Stock of sales that were not voided goes back with one ``UPDATE`` across
+    all of them, and the deleted sales' transactions are taken back out of the
+    daily rollup, instead of the per-sale ``pre_delete`` signal doing it.
+    """
+    with transaction.atomic():
+        rows = list(sales.select_for_update().values_list('pk', 'tenant_id'))
+        if not rows:
+            return 0
+        sale_ids = [pk for pk, _ in rows]
+
+        reverse_deleted_sales(sale_ids)
+        # The per-sale stock signal and the per-transaction cache signal are
+        # both skipped; the cache is bumped once per tenant instead
+        token = deleting_sales_in_bulk.set(True)
+        try:
+            Sale.objects.filter(pk__in=sale_ids).delete()
+        finally:
+            deleting_sales_in_bulk.reset(token)
+        for tenant_id in {tenant_id for _, tenant_id in rows}:
+            bump_tenant_cache_version(tenant_id)
+
+    audit('sale_delete', f"Deleted {len(sale_ids)} sale(s)", sale_ids=[str(pk) for pk in sale_ids])
+    return len(sale_ids)
@@ -1,51 +1,50 @@
-import logging
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.db import transaction
-from .models import Transaction, Product, Sale, SaleItem
-
-audit_logger = logging.getLogger('audit')
-
-@receiver(post_save, sender=Transaction)
-def update_product_quantity(sender, instance, created, **kwargs):
-    if created:
-        product = instance.product
-        if instance.transaction_type == 'sale':
-            # Check for sufficient stock before deducting
-            if product.quantity >= instance.quantity:
-                product.quantity -= instance.quantity
-                if product.is_returnable:
-                    product.bottles_outstanding += instance.quantity
-            else:
-                # Handle the error case, maybe log it or raise an exception
-                # This check is better placed in the view before saving
-                audit_logger.error(f"Attempted to sell {instance.quantity} of {product.name} but only {product.quantity} available.")
-                return # Stop processing
-                
-        elif instance.transaction_type == 'restock':
-            product.quantity += instance.quantity
-
-        product.save() # <-- This line MUST be uncommented
-        
-        # Log audit information
-        audit_logger.info(
-            f"Transaction {instance.id}: {instance.transaction_type} of {instance.quantity} "
-            f"units on product {product.id} by user {instance.created_by}"
-        )
+from .cache import bump_tenant_cache_version
+from .models import Category, Product, ProductTombstone, Sale, Transaction
+from .services import deleting_sales_in_bulk, reverse_deleted_sales
+from tenants.models import Client
 
-@receiver(pre_delete, sender=Sale)
-def restore_stock_when_sale_deleted(sender, instance, **kwargs):
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Transaction)
+def invalidate_tenant_cache(sender, instance, **kwargs):
     """
-    When a Sale is deleted (including from Admin),
-    restore stock for all its SaleItems.
+    Any catalogue or stock change makes the tenant's cached read models stale.
+    Bulk writes skip these signals and bump the version themselves, and so
+    does ``delete_sales`` for the transactions its sales cascade to.
     """
+    if sender is Transaction and deleting_sales_in_bulk.get():
+        return
+    bump_tenant_cache_version(instance.tenant_id)
 
-    with transaction.atomic():
-        for item in instance.items.all():
-            # Return quantity back to stock
-            item.product.adjust_stock(item.quantity)
 
+@receiver(post_delete, sender=Product)
+def record_product_tombstone(sender, instance, **kwargs):
+    """
+    Leave a tombstone so offline caches drop the product on their next delta
+    sync. It is written on commit, and skipped when the product went away
+    because its tenant was deleted.
+    """
+    tenant_id, product_id = instance.tenant_id, instance.pk
+
+    def create_tombstone():
+        if Client.objects.filter(pk=tenant_id).exists():
+            ProductTombstone.objects.create(tenant_id=tenant_id, product_id=product_id)
 
-# @receiver(pre_delete, sender=SaleItem)
-# def restore_stock_when_item_deleted(sender, instance, **kwargs):
-#     instance.product.adjust_stock(instance.quantity)
+    transaction.on_commit(create_tombstone)
+
+
+@receiver(pre_delete, sender=Sale)
+def restore_stock_when_sale_deleted(sender, instance, **kwargs):
+    """
+    When a Sale is deleted (including from Admin), restore stock for its
+    items and take it out of the daily rollup. ``delete_sales`` does this for
+    many sales at once and turns the signal off while it deletes.
+    """
+    if deleting_sales_in_bulk.get():
+        return
+    with transaction.atomic():
+        reverse_deleted_sales([instance.pk])
@@ -0,0 +1,313 @@
+"""
+Batch ingestion of operations queued by the offline PWA.
+
+A reconnecting till sends its whole queue in one request. Every operation
+carries a client-generated idempotency key, so replaying a batch (for example
+after a timeout) never applies an operation twice.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .audit import audit
+from .cache import bump_tenant_cache_version
+from .idempotency import payload_fingerprint
+from .models import IdempotencyKey, Product, ProductTombstone, Sale, SaleItem, Transaction
+from .rollups import record_sales
+from .services import move_stock_bulk, record_movements, sale_transaction
+
+SYNC_OPERATION_TYPES = ('sale', 'return', 'restock')
+
+# Operations accepted per batch; a longer offline queue is sent in several
+SYNC_MAX_OPERATIONS = 500
+
+CHANGES_PAGE_SIZE = 200
+CHANGES_MAX_PAGE_SIZE = 1000
+
+# ``last_updated`` is stamped when a write runs, not when it commits. Changes
+# younger than this may still be uncommitted, so the feed's cursor never moves
+# past them and they are sent again on every poll until they are older.
+CHANGES_SETTLE_TIME = timedelta(minutes=5)
+
+# Fields mirrored by the PWA's Dexie ``products_cache`` table
+PRODUCT_CACHE_FIELDS = (
+    'id', 'name', 'price', 'quantity', 'is_returnable', 'deposit_amount', 'bottles_outstanding',
+)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class SyncKeyConflict(Exception):
+    """A concurrent batch stored one of this batch's idempotency keys first."""
+
+
+def _stored_responses(tenant, keys):
+    """``{key: (response, fingerprint)}`` for the keys ``tenant`` has stored."""
+    return {
+        row.key: (row.response, row.fingerprint)
+        for row in IdempotencyKey.objects.filter(tenant=tenant, key__in=keys)
+    }
+
+
+def _operation_fingerprint(op):
+    return payload_fingerprint('sync', op['type'], op['product'], op['quantity'], op.get('timestamp'))
+
+
+def apply_sync_batch(tenant, user, operations):
+    """
+    Apply validated offline ``operations`` for ``tenant`` in one database transaction.
+
+    Each operation is a dict with ``key``, ``type`` (sale, return or restock),
+    ``product``, ``quantity`` and an optional ``timestamp``. Operations are
+    checked in order against the locked stock levels; the accepted ones are
+    written with ``bulk_create`` and a single grouped stock ``UPDATE``.
+
+    Returns one result dict per operation, in order, with a ``status`` of
+    ``applied``, ``duplicate`` (key seen before; the original result is
+    returned) or ``rejected`` (with a ``detail`` message, including for a key
+    first used for a different operation or request).
+
+    When a concurrent replay of the same keys commits first, this batch is
+    rolled back and applied again, so those keys come back as duplicates. If
+    that attempt loses a race too, ``SyncKeyConflict`` is raised and nothing
+    from the batch is written; the client should send it again.
+    """
+    try:
+        results, applied = _apply_sync_batch(tenant, user, operations)
+    except SyncKeyConflict:
+        results, applied = _apply_sync_batch(tenant, user, operations)
+
+    audit(
+        'sync_batch',
+        f"Sync batch: {applied} applied, {len(results) - applied} skipped "
+        f"of {len(operations)} operation(s) by user {getattr(user, 'pk', None)}",
+        tenant_id=tenant.pk, user_id=getattr(user, 'pk', None),
+        applied=applied, skipped=len(results) - applied, operations=len(operations),
+    )
+    return results
+
+
+def _apply_sync_batch(tenant, user, operations):
+    """One attempt at ``apply_sync_batch``; returns ``(results, applied_count)``."""
+    results = []
+    sales, items, transactions, new_keys = [], [], [], []
+
+    with transaction.atomic():
+        stored = _stored_responses(tenant, [op['key'] for op in operations])
+        products = {
+            product.pk: product
+            for product in Product.objects.select_for_update()
+            .filter(tenant=tenant, pk__in={op['product'] for op in operations})
+            .order_by('pk')
+        }
+        stock = {pk: [p.quantity, p.bottles_outstanding] for pk, p in products.items()}
+        deltas = defaultdict(lambda: [0, 0])
+        applied = {}
+        fingerprints = {}
+
+        for op in operations:
+            key = op['key']
+            fingerprint = _operation_fingerprint(op)
+            first_fingerprint = stored[key][1] if key in stored else fingerprints.get(key)
+            if first_fingerprint and first_fingerprint != fingerprint:
+                results.append({
+                    'key': key, 'status': 'rejected',
+                    'detail': "Idempotency key already used for a different operation.",
+                })
+                continue
+            if key in stored:
+                results.append({**stored[key][0], 'status': 'duplicate'})
+                continue
+            if key in applied:
+                # Resolved below, once the first occurrence has its ids
+                results.append({'key': key, 'status': 'duplicate'})
+                continue
+
+            product = products.get(op['product'])
+            quantity = op['quantity']
+            timestamp = op.get('timestamp') or timezone.now()
+            detail = None
+
+            if product is None:
+                detail = "Product not found."
+            elif op['type'] == 'sale':
+                if stock[product.pk][0] < quantity:
+                    detail = f"Insufficient stock for {product.name}"
+                else:
+                    bottles = quantity if product.is_returnable else 0
+                    sale = Sale(tenant=tenant, created_by=user, timestamp=timestamp)
+                    sale.total_amount = (product.price + product.deposit_amount) * quantity
+                    sales.append(sale)
+                    items.append(SaleItem(
+                        sale=sale,
+                        product=product,
+                        quantity=quantity,
+                        price=product.price,
+                        deposit_amount=product.deposit_amount,
+                        subtotal=sale.total_amount,
+                    ))
+                    txn = sale_transaction(tenant, user, product, quantity, timestamp, sale=sale)
+                    stock[product.pk][0] -= quantity
+                    stock[product.pk][1] += bottles
+                    deltas[product.pk][0] -= quantity
+                    deltas[product.pk][1] += bottles
+            elif op['type'] == 'return':
+                if not product.is_returnable:
+                    detail = f"{product.name} is not a returnable product."
+                elif stock[product.pk][1] < quantity:
+                    detail = f"Cannot return {quantity} containers of {product.name}; not that many are outstanding."
+                else:
+                    txn = Transaction(
+                        tenant=tenant,
+                        product=product,
+                        quantity=quantity,
+                        transaction_type='deposit_refund',
+                        timestamp=timestamp,
+                        created_by=user,
+                        amount=Decimal(quantity) * product.deposit_amount * Decimal('-1'),
+                        deposit_amount=Decimal(quantity) * product.deposit_amount,
+                    )
+                    stock[product.pk][1] -= quantity
+                    deltas[product.pk][1] -= quantity
+            elif op['type'] == 'restock':
+                if getattr(user, 'role', None) != 'manager':
+                    detail = "Only managers can restock."
+                else:
+                    txn = Transaction(
+                        tenant=tenant,
+                        product=product,
+                        quantity=quantity,
+                        transaction_type='restock',
+                        timestamp=timestamp,
+                        created_by=user,
+                    )
+                    stock[product.pk][0] += quantity
+                    deltas[product.pk][0] += quantity
+
+            if detail is not None:
+                results.append({'key': key, 'status': 'rejected', 'detail': detail})
+                continue
+
+            transactions.append(txn)
+            result = {'key': key, 'status': 'applied', 'transaction': txn}
+            applied[key] = result
+            fingerprints[key] = fingerprint
+            results.append(result)
+
+        Sale.objects.bulk_create(sales)
+        SaleItem.objects.bulk_create(items)
+        Transaction.objects.bulk_create(transactions)
+        move_stock_bulk({pk: tuple(delta) for pk, delta in deltas.items()})
+        record_movements(transactions)
+        record_sales(transactions)
+
+        # Transaction ids only exist after the insert; swap them into the results
+        for result in applied.values():
+            txn = result.pop('transaction')
+            result['transaction'] = txn.pk
+            if txn.sale_id:
+                result['sale'] = str(txn.sale_id)
+            new_keys.append(IdempotencyKey(
+                tenant=tenant, key=result['key'], fingerprint=fingerprints[result['key']], response=result,
+            ))
+        try:
+            # The unique index blocks until a concurrent batch with one of
+            # these keys commits, then fails; the batch then starts over.
+            with transaction.atomic():
+                IdempotencyKey.objects.bulk_create(new_keys)
+        except IntegrityError:
+            raise SyncKeyConflict
+        results = [
+            {**applied[r['key']], 'status': 'duplicate'}
+            if r['status'] == 'duplicate' and r['key'] in applied else r
+            for r in results
+        ]
+
+        if transactions:
+            bump_tenant_cache_version(tenant.pk)
+
+    return results, len(applied)
+
+
+def encode_changes_cursor(updated, product_id, tombstone_id):
+    """Pack a changes-feed position into the opaque string handed to clients."""
+    micros = (updated - _EPOCH) // timedelta(microseconds=1) if updated else 0
+    return f"{micros}-{product_id}-{tombstone_id}"
+
+
+def decode_changes_cursor(cursor):
+    """Inverse of ``encode_changes_cursor``; raises ``ValueError`` for malformed cursors."""
+    micros, product_id, tombstone_id = (int(part) for part in cursor.split('-'))
+    if min(micros, product_id, tombstone_id) < 0:
+        raise ValueError("Invalid cursor.")
+    return _EPOCH + timedelta(microseconds=micros), product_id, tombstone_id
+
+
+def product_changes(tenant, cursor=None, limit=CHANGES_PAGE_SIZE):
+    """
+    Products changed and deleted for ``tenant`` since ``cursor``.
+
+    Products are walked in ``(last_updated, id)`` order and deletions in
+    tombstone id order, at most ``limit`` of each per page. Without a cursor
+    every product is returned and no deletions are, since the client starts
+    from an empty cache. Returns a dict with ``products`` (values dicts of
+    ``PRODUCT_CACHE_FIELDS``), ``deleted`` (product ids), the next ``cursor``
+    and ``has_more``.
+
+    The cursor only advances over changes older than ``CHANGES_SETTLE_TIME``.
+    Newer ones are appended to the last page without moving it, so they are
+    sent again on later polls. Any change whose transaction commits within
+    ``CHANGES_SETTLE_TIME`` of its ``last_updated`` is therefore delivered at
+    least once; clients must upsert, as a product may arrive more than once.
+    """
+    products = Product.objects.filter(tenant=tenant)
+    tombstones = ProductTombstone.objects.filter(tenant=tenant)
+    horizon = timezone.now() - CHANGES_SETTLE_TIME
+
+    if cursor:
+        updated, last_product, last_tombstone = decode_changes_cursor(cursor)
+        settled = products.filter(
+            Q(last_updated__gt=updated) | Q(last_updated=updated, id__gt=last_product)
+        )
+        tombstones = tombstones.filter(id__gt=last_tombstone)
+    else:
+        settled = products
+        updated, last_product = None, 0
+        last_tombstone = (
+            tombstones.order_by('-id').values_list('id', flat=True).first() or 0
+        )
+        tombstones = tombstones.none()
+
+    rows = list(
+        settled.filter(last_updated__lte=horizon)
+        .order_by('last_updated', 'id')
+        .values('last_updated', *PRODUCT_CACHE_FIELDS)[:limit + 1]
+    )
+    deleted = list(tombstones.order_by('id').values_list('id', 'product_id')[:limit + 1])
+    has_more = len(rows) > limit or len(deleted) > limit
+    rows, deleted = rows[:limit], deleted[:limit]
+
+    if rows:
+        updated, last_product = rows[-1]['last_updated'], rows[-1]['id']
+    if deleted:
+        last_tombstone = deleted[-1][0]
+
+    if len(rows) < limit:
+        # Unsettled changes ride along on the last page without moving the cursor
+        rows += products.filter(last_updated__gt=horizon).order_by('last_updated', 'id').values(
+            'last_updated', *PRODUCT_CACHE_FIELDS
+        )[:limit - len(rows)]
+
+    for row in rows:
+        del row['last_updated']
+
+    return {
+        'products': rows,
+        'deleted': [product_id for _, product_id in deleted],
+        'cursor': encode_changes_cursor(updated, last_product, last_tombstone),
+        'has_more': has_more,
+    }
@@ -1,6 +1,6 @@
 from django import template
 from decimal import Decimal
-from django.db.models import Sum
+from django.db.models import QuerySet, Sum
 
 register = template.Library()
 
@@ -18,10 +18,15 @@ def mul(value, arg):
 @register.filter
 def aggregate_sum(queryset, field_name):
     """
-    Returns the sum of a given field for any queryset.
+    Returns the sum of a given field for any queryset or list.
     Example: sale.items.all|aggregate_sum:'subtotal'
+
+    Lists and querysets that are already fetched (e.g. prefetched relations)
+    are summed in Python instead of running another query.
     """
-    return queryset.aggregate(total=Sum(field_name))['total'] or 0
+    if isinstance(queryset, QuerySet) and queryset._result_cache is None:
+        return queryset.aggregate(total=Sum(field_name))['total'] or 0
+    return sum((getattr(obj, field_name) or 0 for obj in queryset), 0)
 
 @register.filter(name='abs')
 def absolute_value(value):
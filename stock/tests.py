@@ -59,10 +59,67 @@
 #         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 #         self.assertIn('Insufficient stock', response.data.get('detail', ''))
 
-from django.test import TestCase, Client
+import csv
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import redirect_stdout
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.db.models import Sum
+from django.template import Context, Template
+from django.template.loader import render_to_string
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from stock.models import Product, Transaction, Category
+from django.utils import timezone
+
 from accounts.models import CustomUser
+from stock.audit import AuditQueueHandler, ConsoleSink, DatabaseSink
+from stock.idempotency import purge_expired_keys
+from stock.imports import import_products
+from stock.ledger import stock_as_of, take_snapshot
+from stock.models import (
+    AuditEvent, Category, DailyProductSales, Delivery, IdempotencyKey, Product, ProductTombstone,
+    Sale, SaleItem, SaleReceipt, StockMovement, StockSnapshot, Transaction,
+)
+from stock.receipts import build_receipt, stored_receipt
+from stock.reports import dashboard_summary
+from stock.rollups import rebuild_sales
+from stock.search import lookup_sku, search_products
+from stock.services import (
+    InsufficientStock, checkout, delete_sales, move_stock, recalculate_sale_totals,
+    receive_delivery, record_transaction, sale_transaction, void_sales,
+)
+from stock.sync import CHANGES_SETTLE_TIME, SYNC_MAX_OPERATIONS, _stored_responses
+from tenants.models import Client as Tenant
+
+
+class ShopTestCase(TestCase):
+    """
+    A "Test Shop" tenant with a cashier ``till`` and a manager ``boss``, both
+    with password ``testpass``.
+    """
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Test Shop")
+        self.cashier = CustomUser.objects.create_user(
+            username='till', password='testpass', role='cashier', company=self.tenant
+        )
+        self.manager = CustomUser.objects.create_user(
+            username='boss', password='testpass', role='manager', company=self.tenant
+        )
+
 
 class ManageBottleReturnsTests(TestCase):
     def setUp(self):
@@ -235,4 +292,1271 @@ class ManageBottleReturnsTests(TestCase):
         # Should show most recent 20 returns
         recent_returns = response.context['recent_returns']
         self.assertEqual(len(recent_returns), 5)
-        self.assertEqual(recent_returns[0].quantity, 5)  # Most recent first
\ No newline at end of file
+        self.assertEqual(recent_returns[0].quantity, 5)  # Most recent first
+
+
+class CheckoutServiceTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.coke = Product.objects.create(
+            tenant=self.tenant,
+            name='Coke',
+            quantity=20,
+            price=Decimal('300.00'),
+            deposit_amount=Decimal('100.00'),
+            is_returnable=True
+        )
+        self.bread = Product.objects.create(
+            tenant=self.tenant,
+            name='Bread',
+            quantity=5,
+            price=Decimal('1200.00')
+        )
+
+    def test_checkout_writes_sale_in_bulk(self):
+        with self.assertNumQueries(11):
+            sale = checkout(self.tenant, self.cashier, [
+                (self.coke.pk, 2),
+                (self.bread.pk, 1),
+                (self.coke.pk, 1),
+            ])
+
+        self.coke.refresh_from_db()
+        self.bread.refresh_from_db()
+        self.assertEqual(self.coke.quantity, 17)
+        self.assertEqual(self.coke.bottles_outstanding, 3)
+        self.assertEqual(self.bread.quantity, 4)
+        self.assertEqual(self.bread.bottles_outstanding, 0)
+
+        self.assertEqual(sale.items.count(), 2)
+        self.assertEqual(sale.total_amount, Decimal('2400.00'))
+        coke_txn = Transaction.objects.get(sale=sale, product=self.coke)
+        self.assertEqual(coke_txn.amount, Decimal('900.00'))
+        self.assertEqual(coke_txn.deposit_amount, Decimal('300.00'))
+
+    def test_insufficient_stock_rolls_back(self):
+        with self.assertRaises(InsufficientStock):
+            checkout(self.tenant, self.cashier, [
+                (self.coke.pk, 2),
+                (self.bread.pk, 6),
+            ])
+
+        self.coke.refresh_from_db()
+        self.assertEqual(self.coke.quantity, 20)
+        self.assertFalse(Sale.objects.exists())
+        self.assertFalse(SaleItem.objects.exists())
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_other_tenant_product_rejected(self):
+        other = Tenant.objects.create(name="Other Shop")
+        foreign = Product.objects.create(tenant=other, name='Fanta', quantity=10, price=300)
+        with self.assertRaises(ValueError):
+            checkout(self.tenant, self.cashier, [(foreign.pk, 1)])
+
+    def test_manage_sales_renders_receipt(self):
+        self.client.login(username='till', password='testpass')
+        response = self.client.post(reverse('manage_sales'), {
+            'form-TOTAL_FORMS': '2',
+            'form-INITIAL_FORMS': '0',
+            'form-0-product': self.coke.pk,
+            'form-0-quantity': '4',
+            'form-1-product': self.bread.pk,
+            'form-1-quantity': '2',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'stock/sales_receipt.html')
+        self.bread.refresh_from_db()
+        self.assertEqual(self.bread.quantity, 3)
+
+
+class StockMovementTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(
+            tenant=self.tenant,
+            name='Malt',
+            quantity=5,
+            price=Decimal('400.00'),
+            deposit_amount=Decimal('50.00'),
+            is_returnable=True,
+            bottles_outstanding=2
+        )
+
+    def test_guarded_update_rejects_oversell(self):
+        self.assertEqual(move_stock(self.product.pk, quantity=-6), 0)
+        self.assertEqual(move_stock(self.product.pk, bottles=-3), 0)
+        self.assertEqual(move_stock(self.product.pk, quantity=-5, bottles=-2), 1)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 0)
+        self.assertEqual(self.product.bottles_outstanding, 0)
+
+    def test_sale_transaction_is_applied_once(self):
+        record_transaction(Transaction(
+            tenant=self.tenant,
+            product=self.product,
+            quantity=3,
+            transaction_type='sale',
+            created_by=self.manager
+        ))
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 2)
+        self.assertEqual(self.product.bottles_outstanding, 5)
+
+    def test_oversell_rolls_back_transaction_row(self):
+        with self.assertRaises(InsufficientStock):
+            record_transaction(Transaction(
+                tenant=self.tenant,
+                product=self.product,
+                quantity=9,
+                transaction_type='sale'
+            ))
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_manage_restock_increments_stock(self):
+        self.client.login(username='boss', password='testpass')
+        response = self.client.post(reverse('manage_restock'), {
+            'product': self.product.pk,
+            'quantity': 10
+        })
+        self.assertEqual(response.status_code, 302)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 15)
+
+    def test_restock_api_increments_stock(self):
+        self.client.login(username='boss', password='testpass')
+        response = self.client.post(
+            '/api/stock/apirestock/', {'product': self.product.pk, 'quantity': 10}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['transaction_type'], 'restock')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 15)
+
+    def test_admin_rejects_oversell_with_form_error(self):
+        admin_user = CustomUser.objects.create_superuser(
+            username='root', password='testpass', email='root@example.com', company=self.tenant
+        )
+        self.client.force_login(admin_user)
+        response = self.client.post(reverse('admin:stock_transaction_add'), {
+            'tenant': self.tenant.pk,
+            'product': self.product.pk,
+            'quantity': 9,
+            'transaction_type': 'sale',
+            'timestamp_0': '2024-01-01',
+            'timestamp_1': '10:00:00',
+            'amount': '0',
+            'deposit_amount': '0',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Only 5 units of Malt in stock.')
+        self.assertFalse(Transaction.objects.exists())
+
+
+class DailySalesRollupTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(
+            tenant=self.tenant,
+            name='Stout',
+            quantity=50,
+            price=Decimal('700.00'),
+            deposit_amount=Decimal('100.00'),
+            is_returnable=True
+        )
+
+    def rollup_rows(self):
+        return list(DailyProductSales.objects.values_list(
+            'product_id', 'quantity', 'revenue', 'deposit', 'transactions_count'
+        ))
+
+    def test_sales_and_refunds_update_rollup(self):
+        checkout(self.tenant, self.cashier, [(self.product.pk, 3)])
+        checkout(self.tenant, self.cashier, [(self.product.pk, 2)])
+        record_transaction(Transaction(
+            tenant=self.tenant,
+            product=self.product,
+            quantity=4,
+            transaction_type='deposit_refund',
+            created_by=self.cashier
+        ))
+
+        self.assertEqual(self.rollup_rows(), [
+            (self.product.pk, 5, Decimal('3500.00'), Decimal('100.00'), 2)
+        ])
+
+    def test_rebuild_matches_incremental_rollup(self):
+        checkout(self.tenant, self.cashier, [(self.product.pk, 3)])
+        record_transaction(Transaction(
+            tenant=self.tenant,
+            product=self.product,
+            quantity=1,
+            transaction_type='deposit_refund'
+        ))
+        incremental = self.rollup_rows()
+
+        DailyProductSales.objects.all().delete()
+        call_command('rebuild_sales_rollup', stdout=open('/dev/null', 'w'))
+
+        self.assertEqual(self.rollup_rows(), incremental)
+
+
+class DashboardCacheTests(ShopTestCase):
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+        self.product = Product.objects.create(tenant=self.tenant, name='Water', quantity=10, price=100)
+        self.start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.end = self.start + timezone.timedelta(days=1)
+
+    def test_cached_summary_skips_queries(self):
+        dashboard_summary(self.tenant, self.start, self.end)
+        # Just the database cache reads: the tenant version and the summary
+        with self.assertNumQueries(2):
+            dashboard_summary(self.tenant, self.start, self.end)
+
+    def test_product_change_invalidates(self):
+        dashboard_summary(self.tenant, self.start, self.end)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = 200
+            self.product.save()
+
+        summary = dashboard_summary(self.tenant, self.start, self.end)
+        self.assertIn('2000.0', summary['chart_data'])
+
+
+class SyncBatchTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(
+            tenant=self.tenant,
+            name='Beer',
+            quantity=10,
+            price=Decimal('800.00'),
+            deposit_amount=Decimal('100.00'),
+            is_returnable=True,
+            bottles_outstanding=1
+        )
+        self.client.login(username='till', password='testpass')
+        self.url = reverse('api_sync')
+
+    def post(self, operations):
+        return self.client.post(self.url, {'operations': operations}, content_type='application/json')
+
+    def test_batch_applies_operations_and_reports_per_item(self):
+        response = self.post([
+            {'key': 'a', 'type': 'sale', 'product': self.product.pk, 'quantity': 4},
+            {'key': 'b', 'type': 'return', 'product': self.product.pk, 'quantity': 5},
+            {'key': 'c', 'type': 'sale', 'product': self.product.pk, 'quantity': 7},
+            {'key': 'd', 'type': 'restock', 'product': self.product.pk, 'quantity': 3},
+            {'key': 'e', 'type': 'sale', 'product': self.product.pk, 'quantity': 0},
+            {'key': 'a', 'type': 'sale', 'product': self.product.pk, 'quantity': 4},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(
+            [r['status'] for r in results],
+            ['applied', 'applied', 'rejected', 'rejected', 'rejected', 'duplicate']
+        )
+        self.assertEqual(results[5]['transaction'], results[0]['transaction'])
+        self.assertIn('Insufficient stock', results[2]['detail'])
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 6)
+        self.assertEqual(self.product.bottles_outstanding, 0)
+        self.assertEqual(Sale.objects.get().total_amount, Decimal('3600.00'))
+
+    def test_oversized_batch_is_rejected(self):
+        operations = [
+            {'key': f'k{i}', 'type': 'sale', 'product': self.product.pk, 'quantity': 1}
+            for i in range(SYNC_MAX_OPERATIONS + 1)
+        ]
+        self.assertEqual(self.post(operations).status_code, 400)
+        self.assertFalse(Sale.objects.exists())
+
+    def test_concurrent_replay_reports_duplicate(self):
+        operations = [{'key': 'k1', 'type': 'sale', 'product': self.product.pk, 'quantity': 2}]
+        first = self.post(operations).json()['results'][0]
+
+        # A concurrent replay that looked the key up before the first batch committed
+        with patch('stock.sync._stored_responses', side_effect=[{}, _stored_responses(self.tenant, ['k1'])]):
+            second = self.post(operations)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()['results'][0], {**first, 'status': 'duplicate'})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 8)
+
+    def test_repeated_key_conflict_is_retryable(self):
+        operations = [{'key': 'k1', 'type': 'sale', 'product': self.product.pk, 'quantity': 2}]
+        with patch('stock.sync.IdempotencyKey.objects.bulk_create', side_effect=IntegrityError):
+            response = self.post(operations)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(Sale.objects.exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 10)
+
+    def test_key_reused_for_different_operation_is_rejected(self):
+        self.post([{'key': 'k1', 'type': 'sale', 'product': self.product.pk, 'quantity': 2}])
+        results = self.post([
+            {'key': 'k1', 'type': 'sale', 'product': self.product.pk, 'quantity': 3},
+            {'key': 'k2', 'type': 'sale', 'product': self.product.pk, 'quantity': 1},
+            {'key': 'k2', 'type': 'sale', 'product': self.product.pk, 'quantity': 4},
+        ]).json()['results']
+
+        self.assertEqual([r['status'] for r in results], ['rejected', 'applied', 'rejected'])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 7)
+
+    def test_replayed_batch_is_not_applied_twice(self):
+        operations = [{'key': 'k1', 'type': 'sale', 'product': self.product.pk, 'quantity': 2}]
+        first = self.post(operations).json()['results'][0]
+        second = self.post(operations).json()['results'][0]
+
+        self.assertEqual(second['status'], 'duplicate')
+        self.assertEqual(second['sale'], first['sale'])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 8)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+
+class IdempotencyKeyTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(
+            tenant=self.tenant,
+            name='Juice',
+            quantity=10,
+            price=Decimal('500.00')
+        )
+        self.client.login(username='till', password='testpass')
+
+    def test_api_sale_retry_returns_original_sale(self):
+        url = '/api/stock/apisales/'
+        payload = {'items': [{'product': self.product.pk, 'quantity': 2}]}
+
+        first = self.client.post(url, payload, content_type='application/json', HTTP_IDEMPOTENCY_KEY='retry-1')
+        second = self.client.post(url, payload, content_type='application/json', HTTP_IDEMPOTENCY_KEY='retry-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.json()['id'], first.json()['id'])
+        self.assertEqual(Sale.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 8)
+
+    def test_key_reused_for_different_request_is_rejected(self):
+        url = '/api/stock/apisales/'
+        self.client.post(
+            url, {'items': [{'product': self.product.pk, 'quantity': 2}]},
+            content_type='application/json', HTTP_IDEMPOTENCY_KEY='retry-3'
+        )
+        response = self.client.post(
+            url, {'items': [{'product': self.product.pk, 'quantity': 5}]},
+            content_type='application/json', HTTP_IDEMPOTENCY_KEY='retry-3'
+        )
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Sale.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 8)
+
+    def test_failed_write_releases_key(self):
+        url = '/api/stock/apisales/'
+        response = self.client.post(
+            url, {'product': self.product.pk, 'quantity': 50},
+            content_type='application/json', HTTP_IDEMPOTENCY_KEY='retry-2'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_resubmitted_sales_form_does_not_sell_twice(self):
+        data = {
+            'form-TOTAL_FORMS': '1',
+            'form-INITIAL_FORMS': '0',
+            'form-0-product': self.product.pk,
+            'form-0-quantity': '3',
+            'idempotency_key': 'form-key',
+        }
+        first = self.client.post(reverse('manage_sales'), data)
+        second = self.client.post(reverse('manage_sales'), data)
+
+        self.assertEqual(first.context['sale'].pk, second.context['sale'].pk)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 7)
+
+    def test_purge_expired_keys(self):
+        IdempotencyKey.objects.create(tenant=self.tenant, key='old')
+        IdempotencyKey.objects.create(tenant=self.tenant, key='new')
+        IdempotencyKey.objects.filter(key='old').update(created_at=timezone.now() - timedelta(days=30))
+
+        self.assertEqual(purge_expired_keys(), 1)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+
+
+class ProductChangesFeedTests(ShopTestCase):
+    url = '/api/stock/apiproducts/changes/'
+
+    def setUp(self):
+        super().setUp()
+        self.cola = Product.objects.create(tenant=self.tenant, name='Cola', quantity=10, price=Decimal('200.00'))
+        self.water = Product.objects.create(tenant=self.tenant, name='Water', quantity=5, price=Decimal('100.00'))
+        # Settled changes, older than the feed's settle time
+        Product.objects.update(last_updated=timezone.now() - 2 * CHANGES_SETTLE_TIME)
+        self.client.login(username='till', password='testpass')
+
+    def test_full_snapshot_then_delta(self):
+        first = self.client.get(self.url).json()
+        self.assertEqual({p['id'] for p in first['products']}, {self.cola.pk, self.water.pk})
+        self.assertEqual(
+            set(first['products'][0]),
+            {'id', 'name', 'price', 'quantity', 'is_returnable', 'deposit_amount', 'bottles_outstanding'}
+        )
+        self.assertFalse(first['has_more'])
+
+        unchanged = self.client.get(self.url, {'cursor': first['cursor']}).json()
+        self.assertEqual(unchanged['products'], [])
+
+        record_transaction(sale_transaction(self.tenant, self.cashier, self.water, 2, timezone.now()))
+        delta = self.client.get(self.url, {'cursor': unchanged['cursor']}).json()
+        self.assertEqual([p['id'] for p in delta['products']], [self.water.pk])
+        self.assertEqual(delta['products'][0]['quantity'], 3)
+
+    def test_deleted_products_are_reported(self):
+        cursor = self.client.get(self.url).json()['cursor']
+        cola_id = self.cola.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cola.delete()
+
+        delta = self.client.get(self.url, {'cursor': cursor}).json()
+        self.assertEqual(delta['deleted'], [cola_id])
+        self.assertEqual(ProductTombstone.objects.count(), 1)
+
+    def test_pages_follow_cursor(self):
+        page = self.client.get(self.url, {'limit': 1}).json()
+        self.assertTrue(page['has_more'])
+        seen = [p['id'] for p in page['products']]
+        page = self.client.get(self.url, {'limit': 1, 'cursor': page['cursor']}).json()
+        seen += [p['id'] for p in page['products']]
+        self.assertEqual(sorted(seen), sorted([self.cola.pk, self.water.pk]))
+
+    def test_late_commit_is_not_skipped(self):
+        cursor = self.client.get(self.url).json()['cursor']
+        # A write stamped before that poll whose transaction only commits now
+        Product.objects.filter(pk=self.cola.pk).update(
+            quantity=4, last_updated=timezone.now() - CHANGES_SETTLE_TIME / 2
+        )
+
+        page = self.client.get(self.url, {'cursor': cursor}).json()
+        self.assertEqual([(p['id'], p['quantity']) for p in page['products']], [(self.cola.pk, 4)])
+        # Sent again until it settles, then the cursor moves past it
+        self.assertEqual(page['cursor'], cursor)
+        later = timezone.now() + CHANGES_SETTLE_TIME
+        with patch('stock.sync.timezone.now', return_value=later):
+            page = self.client.get(self.url, {'cursor': cursor}).json()
+            self.assertEqual([p['id'] for p in page['products']], [self.cola.pk])
+            page = self.client.get(self.url, {'cursor': page['cursor']}).json()
+            self.assertEqual(page['products'], [])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(self.url, {'cursor': 'nonsense'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ExplainQueriesCommandTests(ShopTestCase):
+    def test_prints_a_plan_per_hot_query(self):
+        out = StringIO()
+        call_command('explain_queries', tenant=self.tenant.pk, stdout=out)
+        self.assertIn('restock history:', out.getvalue())
+        self.assertIn('low stock products:', out.getvalue())
+
+
+class AsyncReadViewTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_tenant = Tenant.objects.create(name="Other Shop")
+        self.product = Product.objects.create(
+            tenant=self.tenant, name='Malt', quantity=20, price=Decimal('300.00')
+        )
+        Product.objects.create(tenant=self.other_tenant, name='Elsewhere', quantity=1, price=Decimal('1.00'))
+        self.sale = checkout(self.tenant, self.cashier, [(self.product.pk, 2)])
+        self.client.login(username='till', password='testpass')
+
+    def test_product_list_is_tenant_scoped(self):
+        response = self.client.get(reverse('api_product_list'))
+        self.assertEqual([p['name'] for p in response.json()['results']], ['Malt'])
+
+    def test_recent_transactions_filters_by_type(self):
+        record_transaction(Transaction(
+            tenant=self.tenant, product=self.product, quantity=5,
+            transaction_type='restock', created_by=self.cashier
+        ))
+        response = self.client.get(reverse('api_recent_transactions'), {'type': 'sale'})
+        results = response.json()['results']
+        self.assertEqual([row['transaction_type'] for row in results], ['sale'])
+        self.assertEqual(results[0]['product__name'], 'Malt')
+
+        response = self.client.get(reverse('api_recent_transactions'), {'type': 'bogus'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_sale_receipt_data(self):
+        response = self.client.get(reverse('api_sale_receipt', args=[self.sale.pk]))
+        data = response.json()
+        self.assertEqual(data['cashier'], 'till')
+        self.assertEqual(data['items'][0]['quantity'], 2)
+        self.assertEqual(data['total_amount'], '600.00')
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.client.get(reverse('api_product_list'))
+        self.assertEqual(response.status_code, 302)
+
+
+class ApiPaginationTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(
+            tenant=self.tenant, name='Malt', quantity=0, price=Decimal('300.00')
+        )
+        now = timezone.now()
+        Transaction.objects.bulk_create([
+            Transaction(
+                tenant=self.tenant, product=self.product, quantity=1,
+                transaction_type='restock', timestamp=now - timedelta(minutes=i % 3)
+            )
+            for i in range(7)
+        ])
+        self.client.login(username='boss', password='testpass')
+
+    def test_transaction_cursor_pages_cover_every_row_once(self):
+        url = '/api/stock/apirestock/?page_size=3'
+        seen = []
+        while url:
+            data = self.client.get(url).json()
+            self.assertNotIn('count', data)
+            seen += [row['id'] for row in data['results']]
+            url = data['next']
+
+        self.assertEqual(sorted(seen), sorted(Transaction.objects.values_list('id', flat=True)))
+
+    def test_previous_links_walk_back_through_tied_timestamps(self):
+        url = '/api/stock/apirestock/?page_size=3'
+        pages = []
+        while url:
+            data = self.client.get(url).json()
+            pages.append([row['id'] for row in data['results']])
+            url = data['next']
+        self.assertEqual(sum(pages, []), list(
+            Transaction.objects.order_by('-timestamp', '-id').values_list('id', flat=True)
+        ))
+
+        url = data['previous']
+        for page in reversed(pages[:-1]):
+            data = self.client.get(url).json()
+            self.assertEqual([row['id'] for row in data['results']], page)
+            url = data['previous']
+        self.assertIsNone(url)
+
+    def test_invalid_api_cursor_is_not_found(self):
+        response = self.client.get('/api/stock/apirestock/', {'cursor': 'nonsense'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_sparse_fields(self):
+        data = self.client.get('/api/stock/apirestock/', {'fields': 'id,quantity'}).json()
+        self.assertEqual(set(data['results'][0]), {'id', 'quantity'})
+
+        data = self.client.get('/api/stock/apiproducts/', {'fields': 'name'}).json()
+        self.assertEqual(data['results'], [{'name': 'Malt'}])
+
+
+class ExportTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(
+            tenant=self.tenant, name='Malt', quantity=20, price=Decimal('300.00')
+        )
+        checkout(self.tenant, self.manager, [(self.product.pk, 2)])
+        record_transaction(Transaction(
+            tenant=self.tenant, product=self.product, quantity=5,
+            transaction_type='restock', created_by=self.manager
+        ))
+        self.client.login(username='boss', password='testpass')
+
+    def export(self, dataset, **params):
+        response = self.client.get(reverse('export_data', args=[dataset]), params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_transactions_csv_filtered_by_type(self):
+        rows = list(csv.DictReader(self.export('transactions', type='restock').splitlines()))
+        self.assertEqual([(row['type'], row['quantity']) for row in rows], [('restock', '5')])
+
+    def test_sales_ndjson_has_one_line_per_item(self):
+        lines = self.export('sales', format='ndjson').splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])['product'], 'Malt')
+        self.assertEqual(json.loads(lines[0])['subtotal'], '600.00')
+
+    def test_inventory_snapshot(self):
+        rows = list(csv.DictReader(self.export('inventory').splitlines()))
+        self.assertEqual(rows[0]['quantity'], '23')
+
+    def test_date_window_excludes_other_days(self):
+        self.assertEqual(self.export('transactions', end_date='2000-01-01').splitlines()[1:], [])
+
+    def test_export_pages_by_keyset(self):
+        for _ in range(4):
+            checkout(self.tenant, self.manager, [(self.product.pk, 1)])
+        expected = list(
+            Transaction.objects.filter(tenant=self.tenant).order_by('timestamp', 'id').values_list('id', flat=True)
+        )
+        with patch('stock.exports.EXPORT_CHUNK_SIZE', 2):
+            rows = list(csv.DictReader(self.export('transactions').splitlines()))
+        self.assertEqual([int(row['id']) for row in rows], expected)
+
+    def test_cashiers_cannot_export(self):
+        self.client.login(username='till', password='testpass')
+        response = self.client.get(reverse('export_data', args=['transactions']))
+        self.assertEqual(response.status_code, 302)
+
+
+class StockHistoryPageTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(
+            tenant=self.tenant, name='Malt Drink', sku='MALT-1', quantity=0, price=Decimal('300.00'),
+            is_returnable=True, deposit_amount=Decimal('50.00')
+        )
+        Product.objects.create(tenant=self.tenant, name='Water', quantity=4, price=Decimal('100.00'))
+        now = timezone.now()
+        Transaction.objects.bulk_create([
+            Transaction(
+                tenant=self.tenant, product=self.product, quantity=1,
+                transaction_type='restock', timestamp=now - timedelta(minutes=i // 2)
+            )
+            for i in range(30)
+        ])
+        self.client.login(username='boss', password='testpass')
+
+    def test_restock_history_is_keyset_paginated(self):
+        first = self.client.get(reverse('manage_restock'))
+        self.assertEqual(len(first.context['transactions']), 25)
+
+        second = self.client.get(reverse('manage_restock'), {'before': first.context['next_cursor']})
+        self.assertEqual(len(second.context['transactions']), 5)
+        self.assertIsNone(second.context['next_cursor'])
+
+        ids = [t.id for t in first.context['transactions']] + [t.id for t in second.context['transactions']]
+        self.assertEqual(len(set(ids)), 30)
+
+    def test_restock_page_renders_no_product_options(self):
+        response = self.client.get(reverse('manage_restock'))
+        self.assertNotContains(response, 'Water (Current')
+
+    def test_product_search(self):
+        url = reverse('api_product_search')
+        self.assertEqual([p['name'] for p in self.client.get(url, {'q': 'malt'}).json()['results']], ['Malt Drink'])
+        self.assertEqual([p['name'] for p in self.client.get(url, {'q': 'malt-'}).json()['results']], ['Malt Drink'])
+        self.assertEqual([p['name'] for p in self.client.get(url, {'in_stock': '1'}).json()['results']], ['Water'])
+        self.assertEqual(self.client.get(url, {'has_outstanding': '1'}).json()['results'], [])
+
+
+class ProductSearchTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        drinks = Category.objects.create(tenant=self.tenant, name='Soft Drinks')
+        for name, sku in (('Orange Juice', 'OJ-1'), ('Juice Box', 'JB-1'), ('Cola', 'COLA-1')):
+            Product.objects.create(
+                tenant=self.tenant, name=name, sku=sku, category=drinks,
+                quantity=5, price=Decimal('100.00')
+            )
+        other = Tenant.objects.create(name="Other Shop")
+        Product.objects.create(tenant=other, name='Juice Elsewhere', quantity=5, price=Decimal('1.00'))
+
+    def names(self, term, **filters):
+        return [row['name'] for row in search_products(self.tenant.pk, term, **filters)]
+
+    def test_prefix_matches_rank_first(self):
+        self.assertEqual(self.names('juice'), ['Juice Box', 'Orange Juice'])
+
+    def test_matches_sku_and_category(self):
+        self.assertEqual(self.names('cola-'), ['Cola'])
+        self.assertEqual(len(self.names('soft drinks')), 3)
+
+    def test_result_shape(self):
+        row = search_products(self.tenant.pk, 'cola')[0]
+        self.assertEqual(row['category_name'], 'Soft Drinks')
+        self.assertEqual(row['sku'], 'COLA-1')
+
+
+class SkuLookupTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(
+            tenant=self.tenant, name='Stout', sku='5012345678900', quantity=12,
+            price=Decimal('700.00'), is_returnable=True, deposit_amount=Decimal('100.00')
+        )
+
+    def test_lookup_is_one_indexed_query(self):
+        lookup = async_to_sync(lookup_sku)
+        with self.assertNumQueries(1):
+            self.assertEqual(lookup(self.tenant.pk, '5012345678900')['price'], Decimal('700.00'))
+
+    def test_lookup_sees_stock_writes(self):
+        lookup = async_to_sync(lookup_sku)
+        lookup(self.tenant.pk, '5012345678900')
+        checkout(self.tenant, self.cashier, [(self.product.pk, 2)])
+        self.assertEqual(lookup(self.tenant.pk, '5012345678900')['quantity'], 10)
+
+    def test_endpoint(self):
+        self.client.login(username='till', password='testpass')
+        response = self.client.get(reverse('api_sku_lookup', args=['5012345678900']))
+        self.assertEqual(response.json()['deposit_amount'], '100.00')
+        self.assertTrue(response.json()['is_returnable'])
+
+        response = self.client.get(reverse('api_sku_lookup', args=['unknown']))
+        self.assertEqual(response.status_code, 404)
+
+
+class ReceiptTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.coke = Product.objects.create(
+            tenant=self.tenant, name='Coke', quantity=20, price=Decimal('300.00'),
+            deposit_amount=Decimal('100.00'), is_returnable=True
+        )
+        self.bread = Product.objects.create(
+            tenant=self.tenant, name='Bread', quantity=5, price=Decimal('1200.00')
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sale = checkout(self.tenant, self.cashier, [(self.coke.pk, 3), (self.bread.pk, 1)])
+
+    def test_receipt_totals(self):
+        receipt = build_receipt(self.tenant, self.sale.pk)
+        self.assertEqual(receipt['subtotal'], Decimal('2400.00'))
+        self.assertEqual(receipt['deposit_total'], Decimal('300.00'))
+        self.assertEqual(receipt['items'][0].deposit_total, Decimal('300.00'))
+        self.assertEqual(receipt['cashier'], 'till')
+
+    def test_receipt_renders_without_further_queries(self):
+        with self.assertNumQueries(2):
+            receipt = build_receipt(self.tenant, self.sale.pk)
+        with self.assertNumQueries(0):
+            html = render_to_string('stock/sales_receipt.html', {
+                'sale': receipt['sale'], 'receipt': receipt, 'user': self.cashier,
+            })
+        self.assertIn('Coke', html)
+        self.assertIn('300.00', html)
+
+    def test_other_tenant_sale_not_found(self):
+        other = Tenant.objects.create(name="Other Shop")
+        with self.assertRaises(Sale.DoesNotExist):
+            build_receipt(other, self.sale.pk)
+
+    def test_aggregate_sum_uses_fetched_rows(self):
+        template = Template("{% load custom_filters %}{{ items|aggregate_sum:'subtotal' }}")
+        items = list(self.sale.items.all())
+        with self.assertNumQueries(0):
+            self.assertEqual(template.render(Context({'items': items})), '2400.00')
+        with self.assertNumQueries(1):
+            template.render(Context({'items': self.sale.items.all()}))
+
+    def test_checkout_stores_rendered_receipt(self):
+        receipt = SaleReceipt.objects.get(sale=self.sale)
+        lines = receipt.text.splitlines()
+        self.assertTrue(all(len(line) <= 42 for line in lines))
+        self.assertIn('Cashier: till', lines)
+        self.assertTrue(any(line.startswith('Coke') and line.endswith('1,200.00') for line in lines))
+        self.assertTrue(any(line.startswith('TOTAL PAID') and line.endswith('2,400.00') for line in lines))
+        self.assertIn('Container deposit', receipt.html)
+        self.assertNotIn('<nav', receipt.html)
+
+    def test_receipt_rendered_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            sale = checkout(self.tenant, self.cashier, [(self.bread.pk, 1)])
+            self.assertFalse(SaleReceipt.objects.filter(sale=sale).exists())
+        self.assertEqual(len(callbacks), 2)  # cache bump, receipt
+        callbacks[-1]()
+        self.assertIn('Bread', SaleReceipt.objects.get(sale=sale).text)
+
+    def test_receipt_served_from_store_and_revalidated(self):
+        self.client.login(username='till', password='testpass')
+        url = reverse('sale_receipt_text', args=[self.sale.pk])
+        with self.assertNumQueries(3):  # session, user, stored receipt
+            response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(reverse('sale_receipt', args=[self.sale.pk]))
+        self.assertContains(response, 'Sales Receipt')
+
+    def test_voided_sale_receipt_changes(self):
+        self.client.login(username='till', password='testpass')
+        url = reverse('sale_receipt_text', args=[self.sale.pk])
+        etag = self.client.get(url)['ETag']
+
+        void_sales(self.tenant, [self.sale.pk])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('*** VOID ***', response.content.decode())
+        self.assertContains(self.client.get(reverse('sale_receipt', args=[self.sale.pk])), 'VOID')
+
+    def test_other_tenant_cannot_revalidate(self):
+        self.client.login(username='till', password='testpass')
+        url = reverse('sale_receipt_text', args=[self.sale.pk])
+        etag = self.client.get(url)['ETag']
+
+        other = Tenant.objects.create(name="Other Shop")
+        CustomUser.objects.create_user(username='other', password='testpass', role='cashier', company=other)
+        self.client.login(username='other', password='testpass')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+    def test_missing_receipt_rendered_on_first_request(self):
+        SaleReceipt.objects.filter(sale=self.sale).delete()
+        receipt = stored_receipt(self.tenant, self.sale.pk)
+        self.assertIn('Coke', receipt.text)
+        self.assertTrue(SaleReceipt.objects.filter(sale=self.sale).exists())
+
+        other = Tenant.objects.create(name="Other Shop")
+        with self.assertRaises(Sale.DoesNotExist):
+            stored_receipt(other, self.sale.pk)
+
+
+class SaleTotalTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.coke = Product.objects.create(
+            tenant=self.tenant, name='Coke', quantity=20, price=Decimal('300.00'),
+            deposit_amount=Decimal('100.00'), is_returnable=True
+        )
+        self.sale = checkout(self.tenant, self.cashier, [(self.coke.pk, 2)])
+
+    def test_calculate_total_ignores_later_price_changes(self):
+        Product.objects.filter(pk=self.coke.pk).update(price=Decimal('500.00'))
+        self.sale.calculate_total()
+        self.sale.refresh_from_db()
+        self.assertEqual(self.sale.total_amount, Decimal('800.00'))
+
+    def test_recalculate_only_rewrites_stale_totals(self):
+        other = checkout(self.tenant, self.cashier, [(self.coke.pk, 1)])
+        Sale.objects.filter(pk=self.sale.pk).update(total_amount=Decimal('1.00'))
+        empty = Sale.objects.create(tenant=self.tenant, total_amount=Decimal('5.00'))
+
+        self.assertEqual(recalculate_sale_totals(self.tenant), 2)
+        self.assertEqual(
+            dict(Sale.objects.values_list('pk', 'total_amount')),
+            {self.sale.pk: Decimal('800.00'), other.pk: Decimal('400.00'), empty.pk: Decimal('0.00')},
+        )
+        self.assertEqual(recalculate_sale_totals(), 0)
+
+    def test_command(self):
+        Sale.objects.filter(pk=self.sale.pk).update(total_amount=Decimal('1.00'))
+        out = StringIO()
+        call_command('recalculate_sale_totals', tenant=self.tenant.pk, stdout=out)
+        self.assertIn('Corrected 1 sale total(s)', out.getvalue())
+
+
+class AuditLogTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.logger = logging.getLogger('audit')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = f"{self.directory.name}/audit.log"
+
+    def capture(self, **options):
+        handler = AuditQueueHandler(filename=self.path, **options)
+        original = self.logger.handlers
+        self.logger.handlers = [handler]
+        self.addCleanup(setattr, self.logger, 'handlers', original)
+        return handler
+
+    def test_events_written_as_json_lines_off_the_calling_thread(self):
+        handler = self.capture(batch_size=10)
+        product = Product.objects.create(tenant=self.tenant, name='Malt', quantity=20, price=Decimal('300.00'))
+
+        with self.assertNumQueries(11):
+            sale = checkout(self.tenant, self.cashier, [(product.pk, 2)])
+        self.assertNotEqual(handler.writer.ident, threading.get_ident())
+        handler.flush_and_stop()
+
+        with open(self.path) as log:
+            entries = [json.loads(line) for line in log]
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['event'], 'sale')
+        self.assertEqual(entries[0]['sale_id'], str(sale.id))
+        self.assertEqual(entries[0]['tenant_id'], self.tenant.pk)
+        self.assertEqual(entries[0]['total'], '600.00')
+
+    def test_file_rotates(self):
+        handler = self.capture(max_bytes=200, backup_count=2)
+        for number in range(10):
+            self.logger.info(f"event {number}", extra={'audit_event': 'test', 'audit_fields': {}})
+        handler.flush_and_stop()
+        self.assertTrue(os.path.exists(f"{self.path}.1"))
+
+    def test_console_sink_writes_fields(self):
+        record = logging.makeLogRecord({
+            'msg': "Sale", 'audit_event': 'sale', 'audit_fields': {'tenant_id': 7, 'total': Decimal('600.00')},
+        })
+        out = StringIO()
+        with redirect_stdout(out):
+            ConsoleSink().write([record])
+        entry = json.loads(out.getvalue())
+        self.assertEqual((entry['event'], entry['tenant_id'], entry['total']), ('sale', 7, '600.00'))
+
+    def test_database_sink_bulk_creates(self):
+        records = [
+            logging.makeLogRecord({
+                'msg': f"event {number}", 'audit_event': 'restock',
+                'audit_fields': {'tenant_id': 7, 'user_id': 3, 'quantity': number},
+            })
+            for number in range(3)
+        ]
+        with self.assertNumQueries(1):
+            DatabaseSink().write(records)
+        self.assertEqual(
+            list(AuditEvent.objects.order_by('id').values_list('tenant_id', 'event', 'data')),
+            [(7, 'restock', {'quantity': n}) for n in range(3)],
+        )
+
+
+class StockLedgerTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.coke = Product.objects.create(
+            tenant=self.tenant, name='Coke', quantity=20, price=Decimal('300.00'),
+            deposit_amount=Decimal('100.00'), is_returnable=True
+        )
+
+    def movements(self):
+        return list(StockMovement.objects.order_by('id').values_list('reason', 'quantity_delta', 'bottles_delta'))
+
+    def test_stale_save_does_not_undo_stock_moves(self):
+        stale = Product.objects.get(pk=self.coke.pk)
+        checkout(self.tenant, self.manager, [(self.coke.pk, 5)])
+        stale.price = Decimal('350.00')
+        stale.save()
+
+        self.coke.refresh_from_db()
+        self.assertEqual((self.coke.quantity, self.coke.price), (15, Decimal('350.00')))
+        self.assertEqual(self.movements(), [('opening', 20, 0), ('sale', -5, 5)])
+
+    def test_stale_stock_edit_ledgers_against_current_row(self):
+        stale = Product.objects.get(pk=self.coke.pk)
+        checkout(self.tenant, self.manager, [(self.coke.pk, 5)])
+        stale.quantity = 30
+        stale.save()
+
+        self.assertEqual(self.movements()[-1], ('adjustment', 15, 0))
+        self.assertEqual(stock_as_of(self.tenant, timezone.now()).get(pk=self.coke.pk).quantity_as_of, 30)
+
+    def test_write_paths_append_movements(self):
+        sale = checkout(self.tenant, self.manager, [(self.coke.pk, 3)])
+        record_transaction(Transaction(
+            tenant=self.tenant, product=self.coke, quantity=5,
+            transaction_type='restock', created_by=self.manager
+        ))
+        product = Product.objects.get(pk=self.coke.pk)
+        product.quantity = 30
+        product.save()
+        product.name = 'Coca-Cola'
+        product.save()
+        sale.delete()
+
+        self.assertEqual(self.movements(), [
+            ('opening', 20, 0),
+            ('sale', -3, 3),
+            ('restock', 5, 0),
+            ('adjustment', 8, 0),
+            ('sale_deleted', 3, -3),
+        ])
+        self.coke.refresh_from_db()
+        totals = StockMovement.objects.aggregate(q=Sum('quantity_delta'), b=Sum('bottles_delta'))
+        self.assertEqual((totals['q'], totals['b']), (self.coke.quantity, self.coke.bottles_outstanding))
+
+    def test_stock_as_of_replays_tail_after_snapshot(self):
+        start = timezone.now() - timedelta(days=10)
+        StockMovement.objects.update(created_at=start)
+        checkout(self.tenant, self.manager, [(self.coke.pk, 2)])
+        StockMovement.objects.filter(reason='sale').update(created_at=start + timedelta(days=2))
+
+        take_snapshot(self.tenant)
+        StockSnapshot.objects.update(taken_at=start + timedelta(days=3))
+        Product.objects.filter(pk=self.coke.pk).update(price=Decimal('500.00'))
+
+        checkout(self.tenant, self.manager, [(self.coke.pk, 4)])
+        StockMovement.objects.filter(reason='sale', quantity_delta=-4).update(created_at=start + timedelta(days=5))
+
+        def as_of(days):
+            with self.assertNumQueries(1):
+                return list(stock_as_of(self.tenant, start + timedelta(days=days)).values_list(
+                    'quantity_as_of', 'bottles_as_of', 'inventory_value_as_of'
+                ))
+
+        # Before the first snapshot there is no recorded price but today's
+        self.assertEqual(as_of(1), [(20, 0, Decimal('10000.00'))])
+        self.assertEqual(as_of(2), [(18, 2, Decimal('9000.00'))])
+        self.assertEqual(as_of(4), [(18, 2, Decimal('5400.00'))])
+        self.assertEqual(as_of(6), [(14, 6, Decimal('4200.00'))])
+
+    def test_snapshot_command(self):
+        out = StringIO()
+        call_command('snapshot_stock', tenant=self.tenant.pk, stdout=out)
+        self.assertIn('Snapshotted 1 product(s)', out.getvalue())
+        self.assertEqual(StockSnapshot.objects.get().quantity, 20)
+
+    def test_inventory_export_as_of_date(self):
+        StockMovement.objects.update(created_at=timezone.now() - timedelta(days=3))
+        checkout(self.tenant, self.manager, [(self.coke.pk, 5)])
+        self.client.login(username='boss', password='testpass')
+        yesterday = (timezone.localdate() - timedelta(days=1)).isoformat()
+        response = self.client.get(
+            reverse('export_data', args=['inventory']), {'format': 'ndjson', 'end_date': yesterday}
+        )
+        row = json.loads(b''.join(response.streaming_content).decode().splitlines()[0])
+        self.assertEqual(row['quantity'], 20)
+
+
+class SaleVoidTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.coke = Product.objects.create(
+            tenant=self.tenant, name='Coke', quantity=50, price=Decimal('300.00'),
+            deposit_amount=Decimal('100.00'), is_returnable=True
+        )
+        self.bread = Product.objects.create(
+            tenant=self.tenant, name='Bread', quantity=50, price=Decimal('1200.00')
+        )
+        self.sales = [
+            checkout(self.tenant, self.manager, [(self.coke.pk, 2), (self.bread.pk, 1)])
+            for _ in range(5)
+        ]
+
+    def assertStock(self, coke, bottles, bread):
+        self.coke.refresh_from_db()
+        self.bread.refresh_from_db()
+        self.assertEqual((self.coke.quantity, self.coke.bottles_outstanding, self.bread.quantity), (coke, bottles, bread))
+
+    def test_void_restores_stock_and_writes_reversals(self):
+        ids = [sale.pk for sale in self.sales]
+        with self.assertNumQueries(12):
+            self.assertEqual(void_sales(self.tenant, ids, user=self.manager), 5)
+        self.assertStock(50, 0, 50)
+
+        reversals = Transaction.objects.filter(transaction_type='sale_void')
+        self.assertEqual(reversals.count(), 10)
+        self.assertEqual(
+            reversals.filter(product=self.coke).aggregate(a=Sum('amount'), d=Sum('deposit_amount')),
+            {'a': Decimal('-3000.00'), 'd': Decimal('-1000.00')},
+        )
+        self.assertFalse(Sale.objects.filter(voided_at__isnull=True).exists())
+        rollup = DailyProductSales.objects.get(product=self.coke)
+        self.assertEqual((rollup.quantity, rollup.revenue, rollup.deposit), (0, Decimal('0'), Decimal('0')))
+
+        # Voiding again changes nothing
+        self.assertEqual(void_sales(self.tenant, ids), 0)
+        self.assertStock(50, 0, 50)
+
+    def test_void_rollup_matches_rebuild(self):
+        void_sales(self.tenant, [self.sales[0].pk])
+        before = list(DailyProductSales.objects.order_by('product_id').values_list('quantity', 'revenue', 'deposit'))
+        call_command('rebuild_sales_rollup', stdout=StringIO())
+        after = list(DailyProductSales.objects.order_by('product_id').values_list('quantity', 'revenue', 'deposit'))
+        self.assertEqual(before, after)
+
+    def test_void_of_earlier_day_lowers_dashboard_totals(self):
+        # Every sale was yesterday, so today's rollup rows hold only the void
+        yesterday = timezone.now() - timedelta(days=1)
+        Sale.objects.update(timestamp=yesterday)
+        Transaction.objects.update(timestamp=yesterday)
+        rebuild_sales(self.tenant)
+        sale = self.sales[0]
+
+        start = timezone.localtime(yesterday).replace(hour=0, minute=0, second=0, microsecond=0)
+        end = start + timedelta(days=2)
+        before = dashboard_summary(self.tenant, start, end)
+        self.assertEqual((before['total_revenue'], before['total_quantity']), (Decimal('9000.00'), 15))
+
+        cache.clear()
+        void_sales(self.tenant, [sale.pk])
+        after = dashboard_summary(self.tenant, start, end)
+        self.assertEqual((after['total_revenue'], after['total_quantity']), (Decimal('7200.00'), 12))
+
+    def test_bulk_delete_restores_stock_once(self):
+        void_sales(self.tenant, [self.sales[0].pk])
+        self.assertEqual(delete_sales(Sale.objects.filter(tenant=self.tenant)), 5)
+        self.assertStock(50, 0, 50)
+        self.assertFalse(Transaction.objects.exists())
+        self.assertEqual(
+            set(DailyProductSales.objects.values_list('quantity', 'revenue', 'deposit')),
+            {(0, Decimal('0'), Decimal('0'))},
+        )
+
+    def test_bulk_delete_queries_do_not_grow_with_sales(self):
+        def delete_counting_queries(sales):
+            with CaptureQueriesContext(connection) as queries:
+                with self.captureOnCommitCallbacks(execute=True):
+                    delete_sales(Sale.objects.filter(pk__in=[sale.pk for sale in sales]))
+            return len(queries)
+
+        self.assertEqual(delete_counting_queries(self.sales[:2]), delete_counting_queries(self.sales[2:]))
+
+    def test_single_delete_uses_signal(self):
+        self.sales[0].delete()
+        self.assertStock(42, 8, 46)
+
+    def test_void_api_requires_manager(self):
+        url = '/api/stock/apisales/void/'
+        self.client.force_login(self.cashier)
+        self.assertEqual(self.client.post(url, {'sales': [str(self.sales[0].pk)]}, content_type='application/json').status_code, 403)
+
+        self.client.force_login(self.manager)
+        response = self.client.post(url, {'sales': [str(s.pk) for s in self.sales[:2]]}, content_type='application/json')
+        self.assertEqual(response.json(), {'voided': 2})
+        self.assertStock(44, 6, 47)
+
+
+class ProductImportTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.coke = Product.objects.create(
+            tenant=self.tenant, sku='COKE-1', name='Coke', quantity=10, price=Decimal('300.00'),
+            deposit_amount=Decimal('100.00'), is_returnable=True
+        )
+
+    def test_creates_products_and_categories(self):
+        rows = [
+            {'sku': 'BRD-1', 'name': 'Bread', 'price': '1200', 'quantity': '20', 'category': 'Bakery'},
+            {'sku': 'BUN-1', 'name': 'Bun', 'price': '500', 'category': 'Bakery'},
+            {'name': 'Water', 'price': '200', 'category': 'Drinks'},
+        ]
+        report = import_products(self.tenant, rows)
+        self.assertEqual(report, {'created': 3, 'updated': 0, 'errors': []})
+        self.assertEqual(set(Category.objects.values_list('name', flat=True)), {'Bakery', 'Drinks'})
+        bread = Product.objects.get(sku='BRD-1')
+        self.assertEqual((bread.quantity, bread.category.name), (20, 'Bakery'))
+        self.assertTrue(Product.objects.get(name='Water').sku)
+        self.assertEqual(
+            list(StockMovement.objects.filter(product=bread).values_list('reason', 'quantity_delta')),
+            [('opening', 20)],
+        )
+
+    def test_upsert_updates_given_columns_but_not_stock(self):
+        report = import_products(self.tenant, [{'sku': 'COKE-1', 'price': '350', 'quantity': '999'}])
+        self.assertEqual(report, {'created': 0, 'updated': 1, 'errors': []})
+        self.coke.refresh_from_db()
+        self.assertEqual((self.coke.price, self.coke.quantity, self.coke.name), (Decimal('350.00'), 10, 'Coke'))
+        self.assertEqual(self.coke.deposit_amount, Decimal('100.00'))
+
+    def test_reports_bad_rows_and_keeps_good_ones(self):
+        rows = [
+            {'sku': 'OK-1', 'name': 'Fine', 'price': '100'},
+            {'sku': 'BAD-1', 'name': 'Free', 'price': '0'},
+            {'sku': 'NEW-1', 'price': '100'},
+            {'sku': 'DEP-1', 'name': 'Jar', 'price': '100', 'is_returnable': 'true'},
+            'not a row',
+        ]
+        report = import_products(self.tenant, rows, chunk_size=2)
+        self.assertEqual((report['created'], report['updated']), (1, 0))
+        self.assertEqual([error['row'] for error in report['errors']], [2, 3, 4, 5])
+        self.assertIn('price', report['errors'][0]['errors'])
+        self.assertIn('deposit_amount', report['errors'][2]['errors'])
+        self.assertEqual(list(Product.objects.order_by('sku').values_list('sku', flat=True)), ['COKE-1', 'OK-1'])
+
+    def test_api_upload_requires_manager(self):
+        url = '/api/stock/apiproducts/import/'
+        csv_file = b"sku,name,price,quantity\nCOKE-1,,320,\nTEA-1,Tea,150,12\n"
+
+        self.client.force_login(self.cashier)
+        upload = SimpleUploadedFile('products.csv', csv_file, content_type='text/csv')
+        self.assertEqual(self.client.post(url, {'file': upload}).status_code, 403)
+
+        self.client.force_login(self.manager)
+        upload = SimpleUploadedFile('products.csv', csv_file, content_type='text/csv')
+        response = self.client.post(url, {'file': upload})
+        self.assertEqual(response.json(), {'created': 1, 'updated': 1, 'errors': []})
+        self.coke.refresh_from_db()
+        self.assertEqual(self.coke.price, Decimal('320.00'))
+
+        response = self.client.post(url, [{'sku': 'TEA-1', 'price': '160'}], content_type='application/json')
+        self.assertEqual(response.json()['updated'], 1)
+
+        upload = SimpleUploadedFile('products.xlsx', b'', content_type='application/octet-stream')
+        self.assertEqual(self.client.post(url, {'file': upload}).status_code, 400)
+
+    def test_command_reads_ndjson(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as f:
+            f.write('{"sku": "TEA-1", "name": "Tea", "price": "150"}\n{broken\n')
+        self.addCleanup(os.remove, f.name)
+        out, err = StringIO(), StringIO()
+        call_command('import_products', f.name, tenant=self.tenant.pk, stdout=out, stderr=err)
+        self.assertIn('Created 1 and updated 0 product(s); 1 row(s) rejected', out.getvalue())
+        self.assertIn('Row 2', err.getvalue())
+
+
+class DeliveryTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = [
+            Product.objects.create(tenant=self.tenant, name=f'Item {i}', quantity=i, price=Decimal('100.00'))
+            for i in range(20)
+        ]
+
+    def test_delivery_restocks_every_line_in_fixed_queries(self):
+        lines = [(product.pk, 5) for product in self.products] + [(self.products[0].pk, 3)]
+        # savepoint, lock, delivery, transactions, stock update, movements, release
+        with self.assertNumQueries(7):
+            delivery = receive_delivery(self.tenant, self.manager, lines, reference='DN-1')
+
+        self.assertEqual(delivery.transactions.count(), 21)
+        self.assertEqual(
+            list(Product.objects.order_by('pk').values_list('quantity', flat=True)),
+            [8] + [i + 5 for i in range(1, 20)],
+        )
+        self.assertEqual(
+            StockMovement.objects.filter(reason='restock').aggregate(total=Sum('quantity_delta'))['total'], 103
+        )
+
+    def test_unknown_product_writes_nothing(self):
+        other = Tenant.objects.create(name="Other Shop")
+        foreign = Product.objects.create(tenant=other, name='Foreign', quantity=1, price=Decimal('100.00'))
+        with self.assertRaises(ValueError):
+            receive_delivery(self.tenant, self.manager, [(self.products[1].pk, 5), (foreign.pk, 5)])
+        self.assertFalse(Delivery.objects.exists())
+        self.products[1].refresh_from_db()
+        self.assertEqual(self.products[1].quantity, 1)
+
+    def test_api_requires_manager_and_replays(self):
+        url = '/api/stock/apideliveries/'
+        body = {'reference': 'DN-7', 'supplier': 'Acme', 'lines': [{'product': self.products[2].pk, 'quantity': 10}]}
+
+        self.client.force_login(self.cashier)
+        self.assertEqual(self.client.post(url, body, content_type='application/json').status_code, 403)
+
+        self.client.force_login(self.manager)
+        response = self.client.post(url, body, content_type='application/json', HTTP_IDEMPOTENCY_KEY='dn-7')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['reference'], 'DN-7')
+        self.assertEqual([line['quantity'] for line in response.json()['lines']], [10])
+
+        replay = self.client.post(url, body, content_type='application/json', HTTP_IDEMPOTENCY_KEY='dn-7')
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.products[2].refresh_from_db()
+        self.assertEqual(self.products[2].quantity, 12)
+
+        detail = self.client.get(f"{url}{response.json()['id']}/")
+        self.assertEqual(detail.json()['supplier'], 'Acme')
+
+        bad = self.client.post(url, {'lines': [{'product': 0, 'quantity': 1}]}, content_type='application/json')
+        self.assertEqual(bad.status_code, 400)
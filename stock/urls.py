@@ -3,11 +3,19 @@ from django.views.generic import RedirectView
 from rest_framework.routers import SimpleRouter
 from .views import (
     CategoryViewSet, ProductViewSet,
-    SalesTransactionViewSet, RestockTransactionViewSet,
+    SalesTransactionViewSet, RestockTransactionViewSet, DeliveryViewSet,
     manage_categories, manage_products,
     manage_sales, manage_restock,
     SalesTransactionAPIView,
-    manage_bottle_returns
+    SyncBatchView,
+    manage_bottle_returns,
+    export_data,
+    product_list,
+    product_search,
+    sku_lookup,
+    recent_transactions,
+    sale_receipt_data,
+    sale_receipt,
 )
 
 router = SimpleRouter()
@@ -15,6 +23,7 @@ router.register(r'categories', CategoryViewSet)
 router.register(r'products', ProductViewSet)
 router.register(r'sales', SalesTransactionViewSet, basename='sales')
 router.register(r'restock', RestockTransactionViewSet, basename='restock')
+router.register(r'deliveries', DeliveryViewSet)
 
 urlpatterns = [
     path('api', include(router.urls)),
@@ -23,5 +32,14 @@ urlpatterns = [
     path('sales/', manage_sales, name='manage_sales'),
     path('restock/', manage_restock, name='manage_restock'),
     path('returns/', manage_bottle_returns, name='manage_bottle_returns'),
+    path('export/<str:dataset>/', export_data, name='export_data'),
     path('api/sales/', SalesTransactionAPIView.as_view(), name='api_sales'),
+    path('api/sync/', SyncBatchView.as_view(), name='api_sync'),
+    path('api/products/', product_list, name='api_product_list'),
+    path('api/products/search/', product_search, name='api_product_search'),
+    path('api/products/sku/<str:sku>/', sku_lookup, name='api_sku_lookup'),
+    path('api/transactions/recent/', recent_transactions, name='api_recent_transactions'),
+    path('api/sales/<uuid:pk>/receipt/', sale_receipt_data, name='api_sale_receipt'),
+    path('sales/<uuid:pk>/receipt/', sale_receipt, name='sale_receipt'),
+    path('sales/<uuid:pk>/receipt.txt', sale_receipt, {'text': True}, name='sale_receipt_text'),
 ]
@@ -23,7 +23,7 @@ from .models import SaleItem
 from rest_framework.views import APIView
 from rest_framework import viewsets, status
 from rest_framework.response import Response
-from .models import Category, Product, Transaction, Sale, SaleItem
+from .models import Category, Delivery, Product, Transaction, Sale, SaleItem
 from .serializers import CategorySerializer, ProductSerializer, TransactionSerializer
 from .permissions import IsCashierOrManager, IsManager
 from rest_framework.renderers import TemplateHTMLRenderer, JSONRenderer
@@ -42,12 +42,61 @@ from django.core.paginator import Paginator
 from django.db.models import F
 from django.forms import modelformset_factory
 from django.db import transaction as db_transaction
+import uuid
+from .services import (
+    InsufficientStock,
+    apply_stock_movement,
+    checkout,
+    delete_sales,
+    receive_delivery,
+    record_transaction,
+    void_sales,
+)
+from .serializers import (
+    DeliveryCreateSerializer,
+    DeliverySerializer,
+    SaleCreateSerializer,
+    SaleDetailSerializer,
+    SaleListSerializer,
+    ProductCacheSerializer,
+    SyncOperationSerializer,
+    VoidSalesSerializer,
+)
+from .idempotency import IdempotencyKeyMismatch, get_idempotency_key, request_fingerprint, run_idempotent
+from .pagination import TimestampCursorPagination, keyset_page
+from rest_framework.decorators import action
+from .sync import (
+    CHANGES_MAX_PAGE_SIZE,
+    CHANGES_PAGE_SIZE,
+    PRODUCT_CACHE_FIELDS,
+    SYNC_MAX_OPERATIONS,
+    SyncKeyConflict,
+    apply_sync_batch,
+    product_changes,
+)
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from .exports import EXPORT_FORMATS, EXPORTS, export_response, export_window
+from .search import lookup_sku, search_products
+from .receipts import build_receipt, stored_receipt
+from .imports import import_format, import_products, read_rows
+from accounts.decorators import async_login_required
+from asgiref.sync import sync_to_async
 
 
 def is_cashier_or_manager(user):
     return user.role in ["cashier", "manager"]
 
 
+def is_manager(user):
+    return user.role == "manager"
+
+
+# Rows per page of the restock and bottle return history tables
+HISTORY_PAGE_SIZE = 25
+
+
 # =========================================================
 # TENANT QUERYSET MIXIN
 # =========================================================
@@ -76,83 +125,211 @@ class ProductViewSet(TenantQuerysetMixin, viewsets.ModelViewSet):
     serializer_class = ProductSerializer
     permission_classes = [IsManager]
 
+    def get_permissions(self):
+        # Cashiers keep an offline copy of the catalogue but cannot edit it
+        if self.action == 'changes':
+            return [IsCashierOrManager()]
+        return super().get_permissions()
+
     def perform_create(self, serializer):
         serializer.save(tenant=self.request.user.company)
 
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_products(self, request):
+        """
+        Create or update products in bulk from an uploaded ``file`` (.csv,
+        .json or .ndjson) or a JSON array body, matched on SKU. Responds with
+        created/updated counts and the errors of any rejected rows.
+        """
+        upload = request.FILES.get('file')
+        if upload is not None:
+            file_format = import_format(upload.name)
+            if file_format is None:
+                return Response(
+                    {'detail': 'Upload a .csv, .json or .ndjson file.'}, status=status.HTTP_400_BAD_REQUEST
+                )
+            rows = read_rows(upload.file, file_format)
+        elif isinstance(request.data, list):
+            rows = request.data
+        else:
+            return Response(
+                {'detail': 'Send a file or a JSON array of products.'}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            report = import_products(request.user.company, rows)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Products changed or deleted since ``?cursor=``, for the offline cache.
+
+        Call without a cursor for a full snapshot, then keep passing back the
+        returned ``cursor`` (and repeat while ``has_more``) to receive the
+        delta. Very recent changes are repeated until they settle, so clients
+        upsert what they receive.
+        """
+        try:
+            limit = min(int(request.query_params.get('limit', CHANGES_PAGE_SIZE)), CHANGES_MAX_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            return Response({'detail': 'limit must be a positive integer.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            changes = product_changes(request.user.company, request.query_params.get('cursor'), limit)
+        except ValueError:
+            return Response({'detail': 'Invalid cursor.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        changes['products'] = ProductCacheSerializer(changes['products'], many=True).data
+        return Response(changes)
+
 
 class SalesTransactionViewSet(TenantQuerysetMixin, viewsets.ModelViewSet):
     queryset = Sale.objects.prefetch_related("items__product").all()
     serializer_class = SaleSerializer
     permission_classes = [IsCashierOrManager]
+    pagination_class = TimestampCursorPagination
 
     def get_queryset(self):
-        return (
-            Sale.objects
-            .filter(tenant=self.request.user.company)
-            .select_related("created_by")
-            .prefetch_related("items__product")
-            .order_by("-id")
-        )
+        queryset = Sale.objects.filter(tenant=self.request.user.company)
+        if self.action == "list":
+            # The list serializer has no items, so there is nothing to prefetch
+            return queryset
+        return queryset.select_related("created_by").prefetch_related("items__product")
 
     def get_serializer_class(self):
         if self.action == "list":
             return SaleListSerializer
         return SaleDetailSerializer
 
+    def get_permissions(self):
+        if self.action == "void":
+            return [IsManager()]
+        return super().get_permissions()
+
+    def perform_destroy(self, instance):
+        delete_sales(Sale.objects.filter(pk=instance.pk))
+
+    @action(detail=False, methods=["post"])
+    def void(self, request):
+        """Void the listed sales at once: stock goes back and reversal transactions are written."""
+        serializer = VoidSalesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        voided = void_sales(request.user.company, serializer.validated_data["sales"], user=request.user)
+        return Response({"voided": voided})
+
     def perform_create(self, serializer):
         serializer.save(tenant=self.request.user.company, created_by=self.request.user)
 
     def create(self, request, *args, **kwargs):
-        data = request.data.copy()
-        data['transaction_type'] = 'sale'
-        product_id = data.get("product")
-        quantity = int(data.get("quantity", 0))
-
-        try:
-            product = Product.objects.get(
-                id=product_id,
-                tenant=request.user.company
-            )
-        except Product.DoesNotExist:
-            return Response(
-                {"detail": "Product not found."},
-                status=status.HTTP_400_BAD_REQUEST
+        serializer = SaleCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        lines = [(item["product"], item["quantity"]) for item in serializer.validated_data["items"]]
+
+        def write():
+            sale = checkout(
+                request.user.company,
+                request.user,
+                lines,
+                payment_method=serializer.validated_data.get("payment_method") or None,
             )
+            return SaleDetailSerializer(sale).data
 
-        if product.quantity < quantity:
-            return Response(
-                {"detail": "Insufficient stock for sale."},
-                status=status.HTTP_400_BAD_REQUEST
+        try:
+            data, replayed = run_idempotent(
+                request.user.company, get_idempotency_key(request), write, request_fingerprint(request)
             )
+        except IdempotencyKeyMismatch as e:
+            return Response({"detail": str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = self.get_serializer(data=data)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-
-
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        response = Response(data, status=status.HTTP_201_CREATED)
+        if replayed:
+            response["Idempotent-Replayed"] = "true"
+        return response
 
 
 class RestockTransactionViewSet(TenantQuerysetMixin, viewsets.ModelViewSet):
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
     permission_classes = [IsManager]
+    pagination_class = TimestampCursorPagination
 
     def perform_create(self, serializer):
         serializer.save(tenant=self.request.user.company)
 
     def create(self, request, *args, **kwargs):
-        data = request.data.copy()
-        data["transaction_type"] = "restock"
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        def write():
+            with transaction.atomic():
+                # transaction_type is read-only on the serializer, so it is set here
+                restock = serializer.save(
+                    created_by=request.user,
+                    tenant=request.user.company,
+                    transaction_type="restock",
+                )
+                apply_stock_movement(restock)
+            return serializer.data
+
+        try:
+            data, replayed = run_idempotent(
+                request.user.company, get_idempotency_key(request), write, request_fingerprint(request)
+            )
+        except IdempotencyKeyMismatch as e:
+            return Response({"detail": str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        response = Response(data, status=status.HTTP_201_CREATED)
+        if replayed:
+            response["Idempotent-Replayed"] = "true"
+        return response
+
+
+class DeliveryViewSet(TenantQuerysetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Delivery notes. Posting one restocks every line in a single database
+    transaction, however long the note.
+    """
+    queryset = Delivery.objects.prefetch_related("transactions").all()
+    serializer_class = DeliverySerializer
+    permission_classes = [IsManager]
 
-        serializer = self.get_serializer(data=data)
+    def create(self, request, *args, **kwargs):
+        serializer = DeliveryCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save(
-            created_by=request.user,
-            tenant=request.user.company
-        )
+        data = serializer.validated_data
+        lines = [(line["product"], line["quantity"]) for line in data["lines"]]
+
+        def write():
+            delivery = receive_delivery(
+                request.user.company,
+                request.user,
+                lines,
+                reference=data.get("reference", ""),
+                supplier=data.get("supplier", ""),
+                notes=data.get("notes", ""),
+            )
+            return DeliverySerializer(delivery).data
+
+        try:
+            data, replayed = run_idempotent(
+                request.user.company, get_idempotency_key(request), write, request_fingerprint(request)
+            )
+        except IdempotencyKeyMismatch as e:
+            return Response({"detail": str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        response = Response(data, status=status.HTTP_201_CREATED)
+        if replayed:
+            response["Idempotent-Replayed"] = "true"
+        return response
 
 
 # =========================================================
@@ -242,61 +419,29 @@ def manage_sales(request):
         )
 
         if formset.is_valid():
-            try:
-                with db_transaction.atomic():
-                    sale = Sale.objects.create(
-                        tenant=request.user.company,
-                        created_by=request.user,
-                    )
+            lines = [
+                (form.cleaned_data["product"].pk, form.cleaned_data["quantity"])
+                for form in formset
+                if form.cleaned_data and not form.cleaned_data.get("DELETE")
+            ]
 
-                    total = 0
-
-                    for form in formset:
-                        if not form.cleaned_data:
-                            continue
-
-                        product = Product.objects.select_for_update().get(
-                            pk=form.cleaned_data["product"].pk,
-                            tenant=request.user.company
-                        )
-
-                        quantity = form.cleaned_data["quantity"]
-
-                        if product.quantity < quantity:
-                            raise ValueError(
-                                f"Insufficient stock for {product.name}"
-                            )
-
-                        item = SaleItem.objects.create(
-                            sale=sale,
-                            product=product,
-                            quantity=quantity,
-                            price=product.price,
-                            deposit_amount=product.deposit_amount,
-                            subtotal=(product.price + product.deposit_amount) * quantity,
-                        )
-
-                        Transaction.objects.create(
-                            tenant=request.user.company,
-                            product=product,
-                            quantity=quantity,
-                            transaction_type="sale",
-                            created_by=request.user,
-                        )
-
-                        total += item.subtotal
-
-                    sale.total_amount = total
-                    sale.save()
-
-                    return render(
-                        request,
-                        "stock/sales_receipt.html",
-                        {"sale": sale},
-                    )
+            def write():
+                return {"sale": str(checkout(request.user.company, request.user, lines).pk)}
 
-            except Exception as e:
+            try:
+                result, _ = run_idempotent(
+                    request.user.company, get_idempotency_key(request), write, request_fingerprint(request)
+                )
+            except (IdempotencyKeyMismatch, ValueError) as e:
                 messages.error(request, str(e))
+            else:
+                # A resubmitted form shows the receipt of the sale it already made
+                receipt = build_receipt(request.user.company, result["sale"])
+                return render(
+                    request,
+                    "stock/sales_receipt.html",
+                    {"sale": receipt["sale"], "receipt": receipt},
+                )
 
     else:
         formset = SalesFormSet(
@@ -320,6 +465,7 @@ def manage_sales(request):
             "formset": formset,
             "transactions": transactions,
             "sales": sales,
+            "idempotency_key": uuid.uuid4().hex,
         },
     )
 
@@ -335,34 +481,32 @@ def manage_bottle_returns(request):
         )
 
         if form.is_valid():
-            with transaction.atomic():
-                return_trans = form.save(commit=False)
-                return_trans.transaction_type = "deposit_refund"
-                return_trans.created_by = request.user
-                return_trans.tenant = request.user.company
-
-                product = Product.objects.select_for_update().get(
-                    pk=return_trans.product.pk,
-                    tenant=request.user.company
-                )
-
-                refund_amount = return_trans.quantity * product.deposit_amount
-
-                return_trans.amount = -refund_amount
-                return_trans.deposit_amount = product.deposit_amount
-                return_trans.save()
-
-                product.bottles_outstanding -= return_trans.quantity
-                product.save()
+            return_trans = form.save(commit=False)
+            return_trans.transaction_type = "deposit_refund"
+            return_trans.created_by = request.user
+            return_trans.tenant = request.user.company
 
+            try:
+                record_transaction(return_trans)
+            except InsufficientStock as e:
+                messages.error(request, str(e))
+            else:
+                messages.success(
+                    request,
+                    f"Processed return of {return_trans.quantity} {return_trans.product.name} container(s).",
+                )
                 return redirect("manage_bottle_returns")
     else:
         form = BottleReturnForm(user=request.user)  # ✅ IMPORTANT
 
-    recent_returns = Transaction.objects.filter(
-        tenant=request.user.company,
-        transaction_type="deposit_refund",
-    ).order_by("-timestamp")[:20]
+    recent_returns, next_cursor = keyset_page(
+        Transaction.objects.filter(
+            tenant=request.user.company,
+            transaction_type="deposit_refund",
+        ).select_related("product", "created_by"),
+        request.GET.get("before"),
+        page_size=HISTORY_PAGE_SIZE,
+    )
 
     return render(
         request,
@@ -370,6 +514,7 @@ def manage_bottle_returns(request):
         {
             "form": form,
             "recent_returns": recent_returns,
+            "next_cursor": next_cursor,
         },
     )
 
@@ -385,27 +530,57 @@ def manage_restock(request):
             user=request.user  # if you add filtering inside form
         )
         if form.is_valid():
-            with transaction.atomic():
-                restock = form.save(commit=False)
-                restock.tenant = request.user.company
-                restock.transaction_type = "restock"
-                restock.created_by = request.user
-                restock.save()
-                return redirect("manage_restock")
+            restock = form.save(commit=False)
+            restock.tenant = request.user.company
+            restock.transaction_type = "restock"
+            restock.created_by = request.user
+            record_transaction(restock)
+            return redirect("manage_restock")
     else:
         form = RestockTransactionForm(user=request.user)
 
-    transactions = Transaction.objects.filter(
-        tenant=request.user.company,
-        transaction_type="restock",
-    ).order_by("-timestamp")
+    transactions, next_cursor = keyset_page(
+        Transaction.objects.filter(
+            tenant=request.user.company,
+            transaction_type="restock",
+        ).select_related("product", "created_by"),
+        request.GET.get("before"),
+        page_size=HISTORY_PAGE_SIZE,
+    )
 
     return render(
         request,
         "stock/manage_restock.html",
-        {"form": form, "transactions": transactions},
+        {"form": form, "transactions": transactions, "next_cursor": next_cursor},
     )
 
+@login_required
+@user_passes_test(is_manager, login_url="accounts:dashboard")
+def export_data(request, dataset):
+    """
+    Download ``dataset`` (transactions, sales or inventory) as ``?format=csv``
+    (default) or ``ndjson``, optionally limited by ``start_date``/``end_date``
+    and, for transactions, ``type``.
+    """
+    export_format = request.GET.get("format", "csv")
+    transaction_type = request.GET.get("type") or None
+    if dataset not in EXPORTS:
+        raise Http404("Unknown export.")
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest("format must be csv or ndjson.")
+    if transaction_type and transaction_type not in dict(Transaction.TRANSACTION_TYPES):
+        return HttpResponseBadRequest(f'Unknown transaction type "{transaction_type}".')
+    try:
+        start, end = export_window(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest("Dates must be in YYYY-MM-DD format.")
+
+    return export_response(
+        request, request.user.company, dataset, export_format,
+        start=start, end=end, transaction_type=transaction_type,
+    )
+
+
 class SalesTransactionAPIView(APIView):
     renderer_classes = [TemplateHTMLRenderer, JSONRenderer]
     template_name = 'stock/manage_sales.html'
@@ -429,7 +604,6 @@ class SalesTransactionAPIView(APIView):
 
         if serializer.is_valid():
             product = serializer.validated_data['product']
-            quantity = serializer.validated_data['quantity']
 
             if product.tenant != request.user.company:
                 return Response(
@@ -437,7 +611,27 @@ class SalesTransactionAPIView(APIView):
                     status=status.HTTP_403_FORBIDDEN
                 )
 
-            if product.quantity < quantity:
+            def write():
+                with transaction.atomic():
+                    sale_trans = serializer.save(
+                        transaction_type='sale',
+                        created_by=request.user,
+                        tenant=request.user.company
+                    )
+                    apply_stock_movement(sale_trans)
+                return {'transaction': sale_trans.pk}
+
+            try:
+                run_idempotent(
+                    request.user.company, get_idempotency_key(request), write, request_fingerprint(request)
+                )
+            except IdempotencyKeyMismatch as e:
+                return Response(
+                    {'detail': str(e)},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    template_name=self.template_name
+                )
+            except InsufficientStock:
                 form = SalesTransactionForm(
                     data=request.data,
                     user=request.user
@@ -458,15 +652,6 @@ class SalesTransactionAPIView(APIView):
                     template_name=self.template_name
                 )
 
-            serializer.save(
-                transaction_type='sale',
-                created_by=request.user,
-                tenant=request.user.company
-            )
-
-            product.quantity -= quantity
-            product.save()
-
             return redirect(request.path)
 
         else:
@@ -489,3 +674,201 @@ class SalesTransactionAPIView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
                 template_name=self.template_name
             )
+
+
+class SyncBatchView(APIView):
+    """
+    Apply a batch of queued offline operations in one request.
+
+    Expects ``{"operations": [{"key", "type", "product", "quantity", "timestamp"}, ...]}``
+    and returns ``{"results": [...]}`` with one entry per operation, in order.
+    Operations that fail validation are rejected individually; the rest of the
+    batch is still applied. A batch that keeps colliding with a concurrent
+    replay of its keys gets a 409 and can be retried as is.
+    """
+    permission_classes = [IsCashierOrManager]
+
+    def post(self, request, format=None):
+        operations = request.data.get('operations')
+        if not isinstance(operations, list):
+            return Response(
+                {'detail': 'Expected an "operations" list.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(operations) > SYNC_MAX_OPERATIONS:
+            return Response(
+                {'detail': f'Send at most {SYNC_MAX_OPERATIONS} operations per batch.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        valid = []
+        results = []
+        for data in operations:
+            serializer = SyncOperationSerializer(data=data)
+            if serializer.is_valid():
+                valid.append(serializer.validated_data)
+                results.append(None)
+            else:
+                key = data.get('key') if isinstance(data, dict) else None
+                results.append({'key': key, 'status': 'rejected', 'detail': serializer.errors})
+
+        try:
+            applied = iter(apply_sync_batch(request.user.company, request.user, valid) if valid else [])
+        except SyncKeyConflict:
+            return Response(
+                {'detail': 'A concurrent sync is storing the same operations; retry the batch.'},
+                status=status.HTTP_409_CONFLICT,
+                headers={'Retry-After': '1'},
+            )
+        results = [result if result is not None else next(applied) for result in results]
+
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+# =========================================================
+# ASYNC READ VIEWS
+# =========================================================
+# Read-only JSON endpoints polled by tills and dashboards. They use the async
+# ORM so, when served under ASGI, a slow client or a slow query does not hold
+# a worker that other tills are waiting for.
+RECENT_TRANSACTIONS_LIMIT = 20
+RECENT_TRANSACTIONS_MAX_LIMIT = 200
+
+
+def _forbidden():
+    return JsonResponse({'detail': 'Only cashiers and managers can view this.'}, status=403)
+
+
+@async_login_required
+async def product_list(request):
+    """The tenant's products in name order, in the offline cache's shape."""
+    if not is_cashier_or_manager(request.user):
+        return _forbidden()
+
+    products = (
+        Product.objects
+        .filter(tenant_id=request.user.company_id)
+        .order_by('name')
+        .values(*PRODUCT_CACHE_FIELDS)
+    )
+    return JsonResponse({'results': [product async for product in products]})
+
+
+@async_login_required
+async def product_search(request):
+    """
+    Typeahead matches for the product pickers over name, SKU and category.
+    ``in_stock=1`` keeps products with stock; ``has_outstanding=1`` keeps
+    returnables with containers out.
+    """
+    if not is_cashier_or_manager(request.user):
+        return _forbidden()
+
+    products = search_products(
+        request.user.company_id,
+        request.GET.get('q', ''),
+        in_stock=request.GET.get('in_stock') == '1',
+        has_outstanding=request.GET.get('has_outstanding') == '1',
+    )
+    return JsonResponse({'results': [product async for product in products]})
+
+
+@async_login_required
+async def sku_lookup(request, sku):
+    """Price, deposit, stock and returnability of a scanned barcode/SKU."""
+    if not is_cashier_or_manager(request.user):
+        return _forbidden()
+
+    product = await lookup_sku(request.user.company_id, sku.strip())
+    if product is None:
+        return JsonResponse({'detail': 'No product with this SKU.'}, status=404)
+    return JsonResponse(product)
+
+
+@async_login_required
+async def recent_transactions(request):
+    """Latest transactions, optionally filtered by ``?type=`` and capped by ``?limit=``."""
+    if not is_cashier_or_manager(request.user):
+        return _forbidden()
+
+    try:
+        limit = min(int(request.GET.get('limit', RECENT_TRANSACTIONS_LIMIT)), RECENT_TRANSACTIONS_MAX_LIMIT)
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'detail': 'limit must be a positive integer.'}, status=400)
+
+    transactions = Transaction.objects.filter(tenant_id=request.user.company_id)
+    transaction_type = request.GET.get('type')
+    if transaction_type:
+        if transaction_type not in dict(Transaction.TRANSACTION_TYPES):
+            return JsonResponse({'detail': f'Unknown transaction type "{transaction_type}".'}, status=400)
+        transactions = transactions.filter(transaction_type=transaction_type)
+
+    rows = transactions.order_by('-timestamp').values(
+        'id', 'product_id', 'product__name', 'quantity', 'transaction_type',
+        'timestamp', 'amount', 'deposit_amount',
+    )[:limit]
+    return JsonResponse({'results': [row async for row in rows]})
+
+
+@async_login_required
+async def sale_receipt_data(request, pk):
+    """A sale with its items, for re-displaying or printing a receipt."""
+    if not is_cashier_or_manager(request.user):
+        return _forbidden()
+
+    try:
+        receipt = await sync_to_async(build_receipt)(request.user.company_id, pk)
+    except Sale.DoesNotExist:
+        raise Http404("Sale not found.")
+
+    sale = receipt['sale']
+    return JsonResponse({
+        'id': sale.id,
+        'timestamp': sale.timestamp,
+        'cashier': sale.created_by.username if sale.created_by else None,
+        'payment_method': sale.payment_method,
+        'items': [
+            {
+                'product': item.product.name,
+                'quantity': item.quantity,
+                'price': item.price,
+                'deposit_amount': item.deposit_amount,
+                'subtotal': item.subtotal,
+            }
+            for item in receipt['items']
+        ],
+        'subtotal': receipt['subtotal'],
+        'deposit_total': receipt['deposit_total'],
+        'total_amount': receipt['total'],
+    })
+
+
+@async_login_required
+async def sale_receipt(request, pk, text=False):
+    """
+    The receipt rendered at checkout, as print-ready HTML or, for the
+    ``.txt`` URL, plain text for ESC/POS receipt printers.
+    """
+    if not is_cashier_or_manager(request.user):
+        return _forbidden()
+
+    try:
+        receipt = await sync_to_async(stored_receipt)(request.user.company_id, pk)
+    except Sale.DoesNotExist:
+        raise Http404("Sale not found.")
+
+    # Only a void changes a receipt, so clients revalidate cheaply against this
+    voided = f"{receipt.sale.voided_at:%Y%m%d%H%M%S%f}" if receipt.sale.voided_at else 'valid'
+    etag = quote_etag(f"receipt-{pk}-{voided}{'-txt' if text else ''}")
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        if text:
+            response = HttpResponse(receipt.text, content_type='text/plain; charset=utf-8')
+        else:
+            response = HttpResponse(receipt.html)
+
+    response.headers.setdefault('ETag', etag)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response